@@ -0,0 +1,178 @@
+# benchmarks/bench_fill.py
+#
+# Mede o caminho de preenchimento de fill_pdf_document com registros
+# sintéticos, sem a interface Tk:
+#   - latência por documento (mediana, p90, p95, p99, máximo)
+#   - documentos por segundo
+#   - pico de memória residente (RSS) do processo
+#   - bytes gravados por documento
+#   - com --stages, o tempo de cada etapa (template, overlay, merge, write)
+#
+# Os resultados são salvos em JSON para comparação entre commits.
+#
+# Uso: python benchmarks/bench_fill.py [--sizes 1 100 10000] [--write-mode plain]
+#                                      [--stages] [--output resultados.json]
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from pdf_filler import fill_pdf_document, load_template, FillStats
+from pdf_optimize import WRITE_MODES, WRITE_PLAIN
+
+MUNICIPIOS = ["Paulista", "Olinda", "Abreu e Lima", "Ilha de Itamaracá", "Itapissuma", "Recife"]
+PALAVRAS = ["COMÉRCIO", "SERVIÇOS", "DISTRIBUIDORA", "MERCADINHO", "FARMÁCIA", "PADARIA",
+            "CONSTRUÇÕES", "ALIMENTOS", "TRANSPORTES", "CONFECÇÕES", "AUTO PEÇAS", "NORDESTE"]
+RESPONSAVEIS = ["JOSÉ DA SILVA", "MARIA DE FÁTIMA SOUZA", "JOÃO PEREIRA", "ANA LÚCIA SANTOS"]
+
+
+def make_records(count, seed=0):
+    """Gera registros sintéticos de empresas, com nomes de tamanhos variados"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        palavras = " ".join(rng.sample(PALAVRAS, rng.randint(1, 5)))
+        records.append({
+            'cnpj': (f"{rng.randint(10, 99)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}/"
+                     f"0001-{rng.randint(10, 99)}"),
+            'razao_social': f"{palavras} {i} LTDA",
+            'telefone': f"81{rng.randint(30000000, 99999999)}",
+            'responsavel': rng.choice(RESPONSAVEIS),
+            'data_feriado': "25/12/2025",
+            'municipio': rng.choice(MUNICIPIOS),
+        })
+    return records
+
+
+def peak_rss_bytes():
+    """Pico de memória residente do processo, em bytes (None se indisponível)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KiB no Linux e em bytes no macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por interpolação linear de uma lista já ordenada"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def run_size(template_path, output_dir, count, write_mode, stages=False):
+    """Preenche 'count' registros sintéticos e devolve as métricas da rodada"""
+    records = make_records(count)
+    stats = FillStats() if stages else None
+    latencies = []
+    total_bytes = 0
+    errors = 0
+
+    start_total = time.perf_counter()
+    for data_to_fill in records:
+        start = time.perf_counter()
+        path = fill_pdf_document(template_path, output_dir, data_to_fill, write_mode, stats)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if path is None:
+            errors += 1
+            continue
+        total_bytes += os.path.getsize(path)
+        # Não acumular milhares de arquivos no disco durante a medição
+        os.remove(path)
+    elapsed = time.perf_counter() - start_total
+
+    latencies.sort()
+    run = {
+        "documents": count,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "docs_per_s": round(count / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 3),
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p90": round(percentile(latencies, 0.90), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3),
+        },
+        "bytes_per_doc": round(total_bytes / max(1, count - errors)),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+    if stats is not None:
+        run["stages"] = stats.summary()["stages"]
+    return run
+
+
+def git_revision():
+    """Commit atual do repositório, para identificar os resultados"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do preenchimento de PDFs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000],
+                        help="quantidades de registros sintéticos a medir")
+    parser.add_argument("--template", default=os.path.join(ROOT_DIR, "formulario.pdf"))
+    parser.add_argument("--write-mode", choices=WRITE_MODES, default=WRITE_PLAIN)
+    parser.add_argument("--stages", action="store_true",
+                        help="mede também o tempo de cada etapa do preenchimento")
+    parser.add_argument("--output", help="arquivo JSON de resultados (padrão: saída padrão)")
+    args = parser.parse_args()
+
+    # Carregar o template antes de medir: o custo de abertura é medido à parte
+    start = time.perf_counter()
+    load_template(args.template)
+    template_load_ms = (time.perf_counter() - start) * 1000
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "template": os.path.basename(args.template),
+        "write_mode": args.write_mode,
+        "template_load_ms": round(template_load_ms, 3),
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="bench_fill_") as output_dir:
+        for count in args.sizes:
+            run = run_size(args.template, output_dir, count, args.write_mode, args.stages)
+            results["runs"].append(run)
+            latency = run["latency_ms"]
+            print(f"{count:6d} docs  {run['docs_per_s']:8.1f} docs/s  "
+                  f"p50 {latency['p50']:7.2f} ms  p95 {latency['p95']:7.2f} ms  "
+                  f"p99 {latency['p99']:7.2f} ms  {run['bytes_per_doc']:7d} B/doc",
+                  file=sys.stderr)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# benchmarks/bench_filter.py
+#
+# Mede a latência do filtro de empresas a cada tecla digitada, simulando a
+# digitação de alguns termos letra por letra, sem a interface Tk:
+#   - legado: uma conexão sqlite3 nova por consulta, SQL montado a cada vez
+#   - índice em memória (CompanyFilter, como nas tabelas da tela), com o
+#     cache de resultados vazio no início de cada rodada
+#   - busca por relevância (FTS5) da pesquisa de uma empresa
+#   - índice em memória, alternando entre filtros já usados (municípios e
+#     termos), com o cache de resultados
+#   - busca por semelhança (trigramas) de termos com erros de digitação
+#
+# Roda sobre uma cópia do banco, para não alterar o arquivo original, ou
+# sobre um banco sintético com --synthetic N empresas (ex.: 1000000).
+#
+# Uso: python benchmarks/bench_filter.py [--db empresas.db] [--synthetic N] [--rounds 20]
+
+import argparse
+import itertools
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from company_index import CompanyFilter, FilterCache
+from company_repository import CompanyRepository
+
+# Termos digitados, letra por letra, em cada rodada
+TERMS = ("mercadinho", "farmacia", "comercio de", "paulista")
+
+# Filtros alternados pelos operadores: (razão social, município)
+REPEATED_FILTERS = (("", "Paulista"), ("", "Olinda"), ("", "Abreu e Lima"),
+                    ("mercadinho", "Paulista"), ("farmacia", None), ("comercio de", "Olinda"))
+
+# Termos com erros de digitação, para a busca por semelhança
+MISTYPED_TERMS = ("mercadino", "farmcia paulsta", "comecio de alimentos", "supermecado olinda")
+
+
+def legacy_filter(db_path, cnpj_filter, razao_social_filter, municipio=None):
+    """Reproduz a consulta antiga de filter_batch_companies"""
+    conn = sqlite3.connect(db_path)
+    try:
+        query = ("SELECT cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel, "
+                 "cidade FROM empresas WHERE 1=1")
+        params = []
+        if cnpj_filter:
+            query += " AND LOWER(cnpj) LIKE ?"
+            params.append(f"%{cnpj_filter.lower()}%")
+        if razao_social_filter:
+            query += " AND (LOWER(razao_social) LIKE ? OR LOWER(nome_fantasia) LIKE ?)"
+            params += [f"%{razao_social_filter.lower()}%"] * 2
+        if municipio:
+            query += " AND cidade = ?"
+            params.append(municipio)
+        query += " ORDER BY razao_social"
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+
+def create_synthetic_db(db_path, count, seed=0):
+    """
+    Cria um banco com 'count' empresas fictícias no esquema original.
+
+    As razões sociais combinam palavras de um vocabulário grande, com
+    frequências decrescentes (poucas palavras muito comuns, como em
+    "COMERCIO" e "LTDA", e muitas raras), como nos cadastros reais.
+    """
+    rng = random.Random(seed)
+    common = ["COMERCIO", "SERVICOS", "MERCADINHO", "FARMACIA", "PADARIA", "SÃO", "JOSÉ",
+              "DISTRIBUIDORA", "CONSTRUCOES", "ALIMENTOS", "PAULISTA", "NORDESTE", "AUTO",
+              "PECAS", "CONFECCOES", "TRANSPORTES", "MARIA", "SANTA", "LUZ", "OLINDA"]
+    syllables = ["BA", "CA", "DA", "FE", "GO", "LI", "MA", "NE", "PA", "RO", "SA", "TU",
+                 "VI", "ZE", "XA", "QUE", "LHO", "NHA", "ÇÃO", "RÊ"]
+    vocabulary = list(common)
+    while len(vocabulary) < 20000:
+        vocabulary.append("".join(rng.choices(syllables, k=rng.randint(2, 4))))
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    cities = ["Paulista", "Olinda", "Abreu e Lima", "Itapissuma"]
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE empresas (cnpj TEXT, razao_social TEXT, email TEXT, celular TEXT,
+                    nome_fantasia TEXT, telefone TEXT, endereco TEXT, numero TEXT,
+                    complemento TEXT, "bairro  " TEXT, cidade TEXT, responsavel TEXT)""")
+    def words(k):
+        return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=k))
+
+    rows = ((f"{i:014d}", words(rng.randint(2, 5)) + " LTDA", words(2), rng.choice(cities))
+            for i in range(count))
+    conn.executemany("INSERT INTO empresas (cnpj, razao_social, nome_fantasia, cidade) "
+                     "VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def keystrokes():
+    """Prefixos de cada termo, como aparecem no campo durante a digitação"""
+    for term in TERMS:
+        for i in range(1, len(term) + 1):
+            yield term[:i]
+
+
+def measure(filter_func, rounds):
+    """Latências (ms) de cada consulta, em todas as rodadas"""
+    latencies = []
+    for _ in range(rounds):
+        for text in keystrokes():
+            start = time.perf_counter()
+            filter_func("", text)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def measure_index(repository, rounds):
+    """Latências (ms) do filtro no índice em memória, a cada tecla, como em uma tabela da tela"""
+    index = repository.company_index()
+    latencies = []
+    for _ in range(rounds):
+        # Cada rodada como a primeira: sem resultados guardados
+        index.filter_cache = FilterCache()
+        company_filter = CompanyFilter(index)
+        for text in keystrokes():
+            start = time.perf_counter()
+            company_filter.search("", text)
+            latencies.append((time.perf_counter() - start) * 1000)
+    index.filter_cache = FilterCache()
+    return latencies
+
+
+def measure_repeated(repository, rounds):
+    """Latências (ms) de filtros repetidos no índice em memória, uma tabela por filtro"""
+    index = repository.company_index()
+    latencies = []
+    for _ in range(rounds):
+        for razao_social, municipio in REPEATED_FILTERS:
+            start = time.perf_counter()
+            CompanyFilter(index).search("", razao_social, municipio)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def measure_similar(repository, rounds):
+    """Latências (ms) da busca por semelhança (CompanyIndex.similar), após montar os trigramas"""
+    index = repository.company_index()
+    start = time.perf_counter()
+    index.similar(MISTYPED_TERMS[0])
+    print(f"Trigramas do vocabulário: {(time.perf_counter() - start) * 1000:.0f} ms")
+    latencies = []
+    approximate = 0
+    for _ in range(rounds):
+        for text in MISTYPED_TERMS:
+            start = time.perf_counter()
+            approximate += not index.similar(text).exact
+            latencies.append((time.perf_counter() - start) * 1000)
+    print(f"Buscas interrompidas pelo limite de tempo: {approximate} de {len(latencies)}")
+    return latencies
+
+
+def report(name, latencies):
+    print(f"{name:28s} mediana {statistics.median(latencies):7.3f} ms   "
+          f"p95 {statistics.quantiles(latencies, n=20)[-1]:7.3f} ms")
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência do filtro de empresas por tecla")
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "empresas.db"))
+    parser.add_argument("--synthetic", type=int, help="usa um banco sintético com N empresas")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_filter_") as temp_dir:
+        db_path = os.path.join(temp_dir, "empresas.db")
+        if args.synthetic:
+            create_synthetic_db(db_path, args.synthetic)
+        else:
+            shutil.copyfile(args.db, db_path)
+
+        start = time.perf_counter()
+        repository = CompanyRepository(db_path)
+        print(f"Abertura e migrações: {(time.perf_counter() - start) * 1000:.0f} ms")
+        try:
+            legacy = report("legado (conexão por consulta)",
+                            measure(lambda c, r: legacy_filter(db_path, c, r), args.rounds))
+            start = time.perf_counter()
+            repository.company_index()
+            print(f"Carga do índice em memória: {(time.perf_counter() - start) * 1000:.0f} ms")
+            current = report("índice em memória (por tecla)", measure_index(repository, args.rounds))
+            if repository.fulltext:
+                report("busca por relevância (FTS5)",
+                       measure(lambda c, r: repository.search_companies(r), args.rounds))
+            report("índice em memória (repetido)", measure_repeated(repository, args.rounds))
+            info = repository.filter_cache_info()
+            print(f"Cache de filtros: {info.hits} acertos, {info.misses} falhas, "
+                  f"{info.currsize}/{info.maxsize} resultados")
+            report("busca por semelhança", measure_similar(repository, args.rounds))
+        finally:
+            repository.close()
+
+    print(f"Redução da latência: {(1 - current / legacy) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
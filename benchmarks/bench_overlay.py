@@ -0,0 +1,91 @@
+# benchmarks/bench_overlay.py
+#
+# Compara a latência por documento da sobreposição de texto:
+#   - legado: Canvas do reportlab -> BytesIO -> PdfReader -> merge_page
+#   - atual:  content stream gerado diretamente e anexado à página
+#
+# Uso: python benchmarks/bench_overlay.py [--docs N]
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from pypdf import PdfReader
+
+from pdf_filler import load_template, _render_document
+from pdf_mapping import pdf_fields
+
+
+def render_legacy(template, data_to_fill):
+    """Reproduz o caminho antigo de fill_pdf_document (reportlab + merge_page)"""
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=letter)
+    can.setFont("Helvetica", 8)
+    for field_name, text_value in data_to_fill.items():
+        if field_name in pdf_fields and text_value:
+            field_info = pdf_fields[field_name]
+            can.drawString(field_info["x"], field_info["y"], text_value)
+    can.save()
+    packet.seek(0)
+    new_pdf = PdfReader(packet)
+
+    output, page = template.new_document()
+    page.merge_page(new_pdf.pages[0])
+    return output
+
+
+def make_record(i):
+    return {
+        'cnpj': f"{i % 10}.{i % 1000:03d}.456/0001-{i % 100:02d}",
+        'razao_social': f"EMPRESA DE TESTE NÚMERO {i} LTDA",
+        'telefone': f"81{i:08d}",
+        'responsavel': "JOSÉ DA SILVA",
+        'data_feriado': "25/12/2025",
+        'municipio': "Paulista",
+    }
+
+
+def measure(render, template, docs):
+    """Mede a latência (ms) de renderizar e serializar cada documento"""
+    latencies = []
+    for i in range(docs):
+        data = make_record(i)
+        start = time.perf_counter()
+        output = render(template, data)
+        output.write(io.BytesIO())
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da sobreposição de texto")
+    parser.add_argument("--docs", type=int, default=300, help="documentos por caminho")
+    parser.add_argument("--template", default=os.path.join(ROOT_DIR, "formulario.pdf"))
+    args = parser.parse_args()
+
+    template = load_template(args.template)
+    # Aquecimento (imports, caches do pypdf/reportlab)
+    measure(render_legacy, template, 10)
+    measure(_render_document, template, 10)
+
+    results = {}
+    for name, render in (("legado (reportlab)", render_legacy), ("content stream direto", _render_document)):
+        latencies = measure(render, template, args.docs)
+        results[name] = statistics.median(latencies)
+        print(f"{name:24s} mediana {statistics.median(latencies):7.3f} ms/doc   "
+              f"p95 {statistics.quantiles(latencies, n=20)[-1]:7.3f} ms/doc")
+
+    legacy, direct = results.values()
+    print(f"Redução da latência: {(1 - direct / legacy) * 100:.1f}% ({legacy / direct:.1f}x mais rápido)")
+
+
+if __name__ == "__main__":
+    main()
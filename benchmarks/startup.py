@@ -0,0 +1,106 @@
+# benchmarks/startup.py
+#
+# Mede o custo de abertura do programa: quanto tempo leva para importar
+# main.py (tudo o que roda antes da janela aparecer), usando o relatório
+# -X importtime do próprio Python em processos novos, sem cache quente de
+# módulos do processo atual e sem abrir a interface Tk.
+#
+# Informa a mediana do tempo total de import de main, os módulos mais caros
+# e se algum módulo da pilha de PDF (pypdf, reportlab) foi importado na
+# abertura. Com --budget-ms, termina com código 1 se o orçamento for
+# ultrapassado, para uso em verificações automáticas.
+#
+# Uso: python benchmarks/startup.py [--runs 5] [--budget-ms 150] [--output startup.json]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que não devem ser carregados antes da janela abrir
+LAZY_MODULES = ("pdf_filler", "pypdf", "reportlab")
+
+
+def parse_importtime(stderr):
+    """
+    Interpreta as linhas "import time: self [us] | cumulative | módulo".
+
+    Returns:
+        list: Tuplas (módulo, self_us, cumulative_us, profundidade).
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure_once(module):
+    """Importa o módulo em um processo novo e devolve as entradas do importtime"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    return parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de abertura (imports) do programa")
+    parser.add_argument("--module", default="main", help="módulo de entrada a medir")
+    parser.add_argument("--runs", type=int, default=5, help="processos medidos")
+    parser.add_argument("--top", type=int, default=10, help="módulos mais caros a listar")
+    parser.add_argument("--budget-ms", type=float, help="orçamento do import de entrada, em ms")
+    parser.add_argument("--output", help="arquivo JSON de resultados (opcional)")
+    args = parser.parse_args()
+
+    totals = []
+    cumulative = {}
+    for _ in range(args.runs):
+        entries = measure_once(args.module)
+        for name, _, cumulative_us, _ in entries:
+            cumulative.setdefault(name, []).append(cumulative_us)
+        total = next(c for name, _, c, depth in entries if name == args.module and depth == 0)
+        totals.append(total / 1000)
+
+    median_ms = statistics.median(totals)
+    slowest = sorted(((statistics.median(values) / 1000, name)
+                      for name, values in cumulative.items() if name != args.module),
+                     reverse=True)[:args.top]
+    eager = sorted(name for name in cumulative
+                   if name.split(".")[0] in LAZY_MODULES)
+
+    print(f"import {args.module}: mediana {median_ms:.1f} ms "
+          f"(mín {min(totals):.1f}, máx {max(totals):.1f}, {args.runs} execuções)")
+    for ms, name in slowest:
+        print(f"  {ms:8.1f} ms  {name}")
+    if eager:
+        print(f"Atenção: importados na abertura: {', '.join(eager[:5])}"
+              f"{' ...' if len(eager) > 5 else ''}")
+
+    results = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "runs_ms": [round(t, 3) for t in totals],
+        "median_ms": round(median_ms, 3),
+        "slowest": [{"module": name, "cumulative_ms": round(ms, 3)} for ms, name in slowest],
+        "eager_pdf_modules": eager,
+        "budget_ms": args.budget_ms,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        print(f"Orçamento de {args.budget_ms:.0f} ms ultrapassado", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
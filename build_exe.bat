@@ -47,7 +47,7 @@ if exist ".venv\Scripts\pyinstaller.exe" (
 echo Usando PDF: "!PDF_NAME!"
 echo Iniciando build...
 
-"%PYI%" --noconfirm --onefile --windowed --add-data "logo.png;." --add-data "empresas.db;." --add-data "cnpj_formatter.py;." --add-data "pdf_mapping.py;." --add-data "pdf_filler.py;." --add-data "!PDF_NAME!;." main.py
+"%PYI%" --noconfirm --onefile --windowed --add-data "logo.png;." --add-data "empresas.db;." --add-data "cnpj_formatter.py;." --add-data "pdf_mapping.py;." --add-data "company_repository.py;." --add-data "company_index.py;." --add-data "migrations.py;." --add-data "pdf_layout.py;." --add-data "pdf_optimize.py;." --add-data "pdf_stats.py;." --add-data "pdf_filler.py;." --add-data "virtual_tree.py;." --add-data "query_executor.py;." --add-data "!PDF_NAME!;." main.py
 
 set "RC=%ERRORLEVEL%"
 echo.
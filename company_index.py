@@ -0,0 +1,987 @@
+# company_index.py
+
+import bisect
+import collections
+import contextlib
+import functools
+import heapq
+import itertools
+import re
+import threading
+import time
+import unicodedata
+from array import array
+
+# Palavras das chaves de busca e do texto digitado
+_WORD_RE = re.compile(r"\w+")
+
+# Próximo byte diferente de zero em um bitmap (busca feita em C pelo re)
+_NONZERO_BYTE_RE = re.compile(rb"[^\x00]")
+
+# Termos presentes em pelo menos 1/_DENSE_FRACTION das linhas são guardados
+# como bitmap (um int, 1 bit por linha) em vez de uma lista de linhas; com
+# 32, o bitmap não ocupa mais memória que a lista que ele substitui
+_DENSE_FRACTION = 32
+
+# Uniões de termos raros com menos linhas que 1/_SPARSE_FRACTION do índice
+# marcam os bits um a um; as maiores passam por uma máscara de bytes
+_SPARSE_FRACTION = 256
+
+# Bytes de bitmap por bloco nas contagens acumuladas dos resultados (4096 linhas)
+_BLOCK_BYTES = 512
+
+# Cada CNPJ ocupa uma faixa fixa no texto dos CNPJs: 14 posições e quebra de linha
+_CNPJ_WIDTH = 15
+
+# Conversão de uma máscara de bytes 0/1 (invertida) em dígitos binários para int()
+_MASK_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+# Trabalho entre dois pontos de interrupção de uma busca (ver CompanyFilter):
+# palavras do vocabulário comparadas ou slots marcados/verificados
+_WORDS_PER_STEP = 20000
+_SLOTS_PER_STEP = 20000
+
+# Um CNPJ que estende o anterior é verificado só nos já encontrados quando
+# eles são menos de 1/_CNPJ_NARROW_FRACTION do índice; acima disso, a
+# varredura completa (bytearray.find, em C) sai mais barata
+_CNPJ_NARROW_FRACTION = 256
+
+# Busca por semelhança (ver CompanyIndex.similar): semelhança mínima entre
+# duas palavras (trigramas em comum / trigramas distintos das duas, como no
+# pg_trgm), palavras parecidas consideradas para cada palavra digitada e
+# palavras do texto comparadas (as seguintes são ignoradas: a quantidade de
+# combinações visitadas cresce com elas)
+_MIN_SIMILARITY = 0.3
+_SIMILAR_WORDS = 8
+_MAX_SIMILAR_TERMS = 6
+
+# Tempo máximo (s) de CompanyIndex.similar, sem a montagem dos trigramas: ela
+# roda na thread de consultas, e as releituras das tabelas esperam atrás
+# dela. Esgotado o tempo, a busca em profundidade para e valem as melhores
+# empresas já encontradas
+SIMILAR_TIME_BUDGET = 0.008
+
+# Conjuntos intermediários da busca por semelhança com mais slots que isso
+# são guardados como bitmap
+_SIMILAR_BITMAP_SLOTS = 2048
+
+# Palavras do vocabulário com mais trigramas em comum avaliadas por palavra
+# parecida pedida (as demais não chegariam à semelhança mínima)
+_TRIGRAM_CANDIDATES = 8
+
+# Na interseção de listas de slots, uma lista mais de _BISECT_FACTOR vezes
+# maior que o resultado parcial é consultada por bisect em vez de percorrida
+_BISECT_FACTOR = 8
+
+# Resultados de filtros guardados por índice (ver FilterCache)
+FILTER_CACHE_SIZE = 32
+
+# Estatísticas do cache de resultados, no formato de functools.lru_cache
+FilterCacheInfo = collections.namedtuple("FilterCacheInfo", "hits misses maxsize currsize")
+
+# Resultado de CompanyIndex.similar: exact é False se a busca parou no
+# limite de tempo (pode haver empresas de nota maior que não foram vistas)
+SimilarMatches = collections.namedtuple("SimilarMatches", "companies exact")
+
+
+@functools.lru_cache(maxsize=65536)
+def _strip_accents(word):
+    return "".join(char for char in unicodedata.normalize("NFKD", word)
+                   if not unicodedata.combining(char))
+
+
+def search_terms(text):
+    """
+    Palavras de um texto na forma das chaves de busca: minúsculas e sem acentos.
+
+    "São JOSÉ" resulta em ["sao", "jose"]. Letras sem forma sem acento são mantidas.
+    """
+    return [word if word.isascii() else _strip_accents(word)
+            for word in _WORD_RE.findall((text or "").lower())]
+
+
+def filter_key(cnpj_filter="", razao_social_filter="", municipio=None):
+    """
+    Forma normalizada de um filtro: textos que filtram as mesmas empresas
+    ("São José" e "jose  SAO") resultam na mesma chave.
+
+    Returns:
+        tuple: (dígitos do CNPJ ou None sem filtro de CNPJ, palavras
+               ordenadas sem repetição, município ou None).
+    """
+    digits = "".join(filter(str.isdigit, cnpj_filter)) if cnpj_filter else None
+    return digits, tuple(sorted(set(search_terms(razao_social_filter)))), municipio
+
+
+def _trigrams(word):
+    """Trigramas de uma palavra, com as bordas marcadas: "jose" -> "  j", " jo", "jos", "ose", "se " """
+    padded = f"  {word} "
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def _key_matches(key, words, cnpj, municipio):
+    """Indica se uma empresa (palavras de busca, CNPJ, município) atende ao filtro da chave"""
+    digits, terms, key_municipio = key
+    if key_municipio is not None and key_municipio != municipio:
+        return False
+    if digits is not None and not (digits and digits in (cnpj or "")):
+        return False
+    return all(any(term in word for word in words) for term in terms)
+
+
+def run_steps(steps):
+    """
+    Executa até o fim uma busca em etapas (ver CompanyFilter.search_steps).
+
+    Returns:
+        O valor devolvido pelo gerador.
+    """
+    try:
+        while True:
+            next(steps)
+    except StopIteration as done:
+        return done.value
+
+
+def _mask_to_bits(mask):
+    """Converte uma máscara de bytes 0/1 (um byte por linha) em bitmap (int)"""
+    if not mask:
+        return 0
+    return int(bytes(mask[::-1]).translate(_MASK_TO_DIGITS), 2)
+
+
+def _contains(slots, slot):
+    """Indica se o slot está na array de slots (em ordem crescente)"""
+    position = bisect.bisect_left(slots, slot)
+    return position < len(slots) and slots[position] == slot
+
+
+def _iter_slots(data, slot=0):
+    """Slots marcados em um bitmap (em bytes, little-endian), a partir de 'slot'"""
+    index = slot >> 3
+    byte = data[index] >> (slot & 7) << (slot & 7) if index < len(data) else 0
+    while True:
+        while byte:
+            low = byte & -byte
+            yield index * 8 + low.bit_length() - 1
+            byte ^= low
+        match = _NONZERO_BYTE_RE.search(data, index + 1)
+        if match is None:
+            return
+        index = match.start()
+        byte = data[index]
+
+
+class _Postings:
+    """
+    Linhas (slots) do índice em que cada termo aparece.
+
+    Termos raros guardam uma array de slots em ordem crescente; os
+    frequentes, um bitmap. As uniões e interseções dos filtros são feitas
+    sobre bitmaps, operações de int executadas em C.
+    """
+
+    def __init__(self):
+        self.terms = {}
+
+    def add(self, terms, slot):
+        """Registra que os termos aparecem no slot (maior que todos os já registrados)"""
+        postings = self.terms
+        for term in terms:
+            slots = postings.get(term)
+            if slots is None:
+                postings[term] = array("I", (slot,))
+            elif isinstance(slots, int):
+                postings[term] = slots | (1 << slot)
+            else:
+                slots.append(slot)
+
+    def compact(self, slot_count):
+        """Converte em bitmap os termos frequentes (ao fim da carga do índice)"""
+        threshold = max(1, slot_count // _DENSE_FRACTION)
+        for term, slots in self.terms.items():
+            if not isinstance(slots, int) and len(slots) >= threshold:
+                mask = bytearray(slot_count)
+                for slot in slots:
+                    mask[slot] = 1
+                self.terms[term] = _mask_to_bits(mask)
+
+    def bits_steps(self, terms, slot_count):
+        """
+        Bitmap das linhas que contêm qualquer um dos termos, em etapas
+        (gerador; ver CompanyFilter.search_steps).
+
+        Args:
+            terms (iterable): Termos existentes no índice.
+            slot_count (int): Quantidade de slots do índice.
+
+        Returns:
+            int: Bitmap (bit i = slot i), como valor do gerador.
+        """
+        dense = 0
+        sparse = []
+        for term in terms:
+            slots = self.terms[term]
+            if isinstance(slots, int):
+                dense |= slots
+            else:
+                sparse.append(slots)
+        total = sum(map(len, sparse))
+        if not total:
+            return dense
+        if total < slot_count // _SPARSE_FRACTION:
+            packed = bytearray((slot_count + 7) // 8)
+            for slots in sparse:
+                for slot in slots:
+                    packed[slot >> 3] |= 1 << (slot & 7)
+            return dense | int.from_bytes(packed, "little")
+        mask = bytearray(slot_count)
+        marked = 0
+        for slots in sparse:
+            for slot in slots:
+                mask[slot] = 1
+            marked += len(slots)
+            if marked >= _SLOTS_PER_STEP:
+                marked = 0
+                yield
+        return dense | _mask_to_bits(mask)
+
+
+class _WordTrigrams:
+    """
+    Trigramas das palavras do vocabulário do índice, para achar as palavras
+    parecidas com uma palavra digitada (ver CompanyIndex.similar).
+
+    Palavras parecidas compartilham a maior parte dos trigramas, mesmo com
+    uma letra trocada, faltando ou sobrando ("jsoe", "joze" e "josé" ->
+    "jose"), e um trecho inicial compartilha os da parte digitada ("merca"
+    -> "mercadinho").
+    """
+
+    def __init__(self):
+        self.words = []
+        self.sizes = array("H")
+        self.grams = {}
+
+    def update(self, vocabulary):
+        """Indexa as palavras novas do vocabulário (as já indexadas vêm antes, na mesma ordem)"""
+        grams = self.grams
+        for word in itertools.islice(vocabulary, len(self.words), None):
+            word_id = len(self.words)
+            self.words.append(word)
+            word_grams = _trigrams(word)
+            self.sizes.append(len(word_grams))
+            for gram in word_grams:
+                ids = grams.get(gram)
+                if ids is None:
+                    grams[gram] = array("I", (word_id,))
+                else:
+                    ids.append(word_id)
+
+    def similar(self, term, limit):
+        """
+        Palavras do vocabulário parecidas com o termo.
+
+        Returns:
+            list: Até 'limit' pares (semelhança, palavra), da mais parecida
+                  para a menos parecida.
+        """
+        term_grams = _trigrams(term)
+        shared = collections.Counter()
+        for gram in term_grams:
+            ids = self.grams.get(gram)
+            if ids is not None:
+                shared.update(ids)
+        size = len(term_grams)
+        scored = []
+        for word_id, count in shared.most_common(limit * _TRIGRAM_CANDIDATES):
+            similarity = count / (size + self.sizes[word_id] - count)
+            if similarity >= _MIN_SIMILARITY:
+                scored.append((similarity, self.words[word_id]))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return scored[:limit]
+
+
+class _SimilarSearch:
+    """
+    Busca em profundidade das empresas de maior nota em CompanyIndex.similar.
+
+    Os conjuntos de slots intermediários são None (todos), um bitmap (int,
+    só palavras frequentes) ou uma lista de slots em ordem; as palavras
+    de cada ramo são escolhidas das mais parecidas para as menos, e as
+    palavras do texto com menos empresas vêm primeiro, para que os
+    conjuntos fiquem pequenos logo.
+
+    Args:
+        index (CompanyIndex): Índice pesquisado.
+        options (list): Para cada palavra do texto, pares (semelhança, palavra
+                        do vocabulário), do mais parecido para o menos.
+        limit (int): Quantidade de empresas procuradas.
+        deadline (float): time.perf_counter() em que a busca para (None = sem limite).
+    """
+
+    def __init__(self, index, options, limit, deadline=None):
+        self.index = index
+        self.postings = index._words.terms
+        self.byte_count = (len(index._ids) + 7) // 8
+        self.options = sorted(options, key=lambda similar: sum(map(self._size, (w for _, w in similar))))
+        self.limit = limit
+        # Maior nota que as palavras do texto a partir de cada posição ainda podem somar
+        self.bounds = list(itertools.accumulate(
+            (similar[0][0] for similar in reversed(self.options)), initial=0))[::-1]
+        # Conversões feitas nesta busca, por palavra: bitmap em bytes
+        # (frequentes) ou set de slots (pouco frequentes)
+        self.views = {}
+        self.alive = index._alive.to_bytes(self.byte_count, "little")
+        self.scores = {}
+        self.top = []
+        self.deadline = deadline
+        # Passa a False se a busca parar no limite de tempo
+        self.exact = True
+
+    def _size(self, word):
+        slots = self.postings[word]
+        return slots.bit_count() if isinstance(slots, int) else len(slots)
+
+    def _view(self, word):
+        """Bitmap de uma palavra frequente em bytes (convertido uma vez por busca)"""
+        view = self.views.get(word)
+        if view is None:
+            view = self.views[word] = self.postings[word].to_bytes(self.byte_count, "little")
+        return view
+
+    def _set(self, word):
+        """Slots de uma palavra pouco frequente em um set (montado uma vez por busca)"""
+        slots = self.views.get(word)
+        if slots is None:
+            slots = self.views[word] = set(self.postings[word])
+        return slots
+
+    def _contains(self, word, slot):
+        slots = self.postings[word]
+        if isinstance(slots, int):
+            return self._view(word)[slot >> 3] >> (slot & 7) & 1
+        return _contains(slots, slot)
+
+    def _threshold(self):
+        """Menor nota entre as 'limit' melhores já encontradas (0 enquanto faltam)"""
+        return self.top[0] if len(self.top) >= self.limit else 0
+
+    def run(self):
+        """
+        Returns:
+            list: Até 'limit' pares (slot, soma das semelhanças), da maior
+                  nota para a menor e, nos empates, na ordem da listagem.
+        """
+        self._visit(0, None, 0)
+        ranked = sorted(self.scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:self.limit]
+
+    def _visit(self, position, slots, score):
+        if score + self.bounds[position] <= self._threshold() or not self.exact:
+            return
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.exact = False
+            return
+        if position == len(self.options):
+            if slots is not None:
+                self._collect(slots, score)
+            return
+        node = {}
+        for similarity, word in self.options[position]:
+            narrowed = self._intersect(slots, word, node)
+            if narrowed:
+                self._visit(position + 1, narrowed, score + similarity)
+        # Nenhuma palavra parecida com esta palavra do texto
+        self._visit(position + 1, slots, score)
+
+    def _intersect(self, slots, word, node):
+        """
+        Slots do conjunto que contêm a palavra. Listas grandes viram bitmap,
+        para que as interseções seguintes com palavras frequentes sejam
+        feitas em C.
+
+        Args:
+            node (dict): Conversões do conjunto já feitas (bitmap em bytes).
+        """
+        other = self.postings[word]
+        if slots is None:
+            return other
+        if isinstance(slots, int):
+            if isinstance(other, int):
+                return slots & other
+            if "view" not in node:
+                node["view"] = slots.to_bytes(self.byte_count, "little")
+            view = node["view"]
+            narrowed = [slot for slot in other if view[slot >> 3] >> (slot & 7) & 1]
+        elif isinstance(other, int):
+            view = self._view(word)
+            narrowed = [slot for slot in slots if view[slot >> 3] >> (slot & 7) & 1]
+        elif len(slots) * _BISECT_FACTOR < len(other):
+            narrowed = [slot for slot in slots if _contains(other, slot)]
+        else:
+            narrowed = sorted(self._set(word).intersection(slots))
+        if len(narrowed) < _SIMILAR_BITMAP_SLOTS:
+            return narrowed
+        packed = bytearray(self.byte_count)
+        for slot in narrowed:
+            packed[slot >> 3] |= 1 << (slot & 7)
+        return int.from_bytes(packed, "little")
+
+    def _collect(self, slots, score):
+        """
+        Registra a nota exata dos primeiros slots ativos do conjunto de uma
+        combinação completa; para ao achar 'limit' com a nota da combinação
+        (os de nota maior pertencem a outra combinação).
+        """
+        if isinstance(slots, int):
+            slots = _iter_slots(slots.to_bytes(self.byte_count, "little"))
+        alive = self.alive
+        found = 0
+        for slot in slots:
+            if not alive[slot >> 3] >> (slot & 7) & 1 or slot in self.scores:
+                continue
+            exact = sum(next((similarity for similarity, word in similar if self._contains(word, slot)), 0)
+                        for similar in self.options)
+            self.scores[slot] = exact
+            if len(self.top) < self.limit:
+                heapq.heappush(self.top, exact)
+            elif exact > self.top[0]:
+                heapq.heapreplace(self.top, exact)
+            if exact <= score + 1e-9:
+                found += 1
+                if found >= self.limit:
+                    return
+
+
+class CompanyMatches:
+    """
+    Resultado de um filtro do índice, na ordem da listagem.
+
+    Guarda o bitmap das linhas encontradas e contagens acumuladas por
+    bloco, de modo que a quantidade e qualquer página (a partir de uma
+    posição) saem sem montar a lista completa das linhas.
+
+    Args:
+        bits (int): Bitmap dos slots encontrados na parte ordenada do índice.
+        base_count (int): Slots da parte ordenada do índice.
+        extra (list): Slots encontrados entre os acrescentados depois da carga,
+                      em ordem, como pares (âncora, slot): a âncora é o slot da
+                      parte ordenada antes do qual a linha aparece.
+    """
+
+    def __init__(self, bits, base_count, extra=()):
+        self._base_count = base_count
+        self._data = bits.to_bytes((base_count + 7) // 8, "little")
+        self._blocks = list(itertools.accumulate(
+            (int.from_bytes(self._data[start:start + _BLOCK_BYTES], "little").bit_count()
+             for start in range(0, len(self._data), _BLOCK_BYTES)),
+            initial=0))
+        base_matches = self._blocks[-1]
+        # Posição de cada linha acrescentada na listagem final
+        self._extra_slots = [slot for _, slot in extra]
+        self._extra_positions = [index + self._rank(anchor)
+                                 for index, (anchor, _) in enumerate(extra)]
+        self.count = base_matches + len(self._extra_slots)
+
+    def __contains__(self, slot):
+        if slot < self._base_count:
+            return bool(self._data[slot >> 3] >> (slot & 7) & 1)
+        return slot in self._extra_slots
+
+    def _rank(self, slot):
+        """Quantidade de slots encontrados, na parte ordenada, antes de 'slot'"""
+        index = slot >> 3
+        if index >= len(self._data):
+            return self._blocks[-1]
+        block = index // _BLOCK_BYTES
+        start = block * _BLOCK_BYTES
+        partial = self._data[index] & ((1 << (slot & 7)) - 1)
+        return (self._blocks[block] + int.from_bytes(self._data[start:index], "little").bit_count()
+                + partial.bit_count())
+
+    def _select(self, rank):
+        """Slot, na parte ordenada, do encontrado de número 'rank' (a partir de 0)"""
+        block = bisect.bisect_right(self._blocks, rank) - 1
+        remaining = rank - self._blocks[block]
+        index = block * _BLOCK_BYTES
+        while True:
+            byte = self._data[index]
+            count = byte.bit_count()
+            if remaining < count:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        if not remaining:
+                            return index * 8 + bit
+                        remaining -= 1
+            remaining -= count
+            index += 1
+
+    def slots(self, offset, limit):
+        """
+        Slots de uma página da listagem.
+
+        Args:
+            offset (int): Posição da primeira linha da página.
+            limit (int): Quantidade máxima de linhas.
+
+        Returns:
+            list: Slots do índice, em ordem.
+        """
+        end = min(self.count, offset + max(0, limit))
+        if offset >= end:
+            return []
+        extra = bisect.bisect_left(self._extra_positions, offset)
+        base_rank = offset - extra
+        base = _iter_slots(self._data, self._select(base_rank)) if base_rank < self._blocks[-1] else iter(())
+        result = []
+        for position in range(offset, end):
+            if extra < len(self._extra_positions) and self._extra_positions[extra] == position:
+                result.append(self._extra_slots[extra])
+                extra += 1
+            else:
+                result.append(next(base))
+        return result
+
+    def all_slots(self):
+        """Todos os slots encontrados, em ordem"""
+        result = list(_iter_slots(self._data))
+        for position, slot in zip(self._extra_positions, self._extra_slots):
+            result.insert(position, slot)
+        return result
+
+
+class FilterCache:
+    """
+    Cache LRU dos resultados de filtros de um CompanyIndex, pela chave
+    normalizada do filtro (ver filter_key).
+
+    Os operadores alternam entre os mesmos filtros (municípios, nomes
+    frequentes): repetir um deles devolve o resultado guardado sem refazer
+    a busca. Uma alteração do índice descarta só os resultados afetados
+    por ela (ver changing); os demais continuam valendo.
+
+    As buscas podem rodar em uma thread de trabalho enquanto o índice é
+    alterado na thread da interface: um resultado calculado durante uma
+    alteração não é guardado.
+
+    Args:
+        maxsize (int): Quantidade máxima de resultados guardados.
+    """
+
+    def __init__(self, maxsize=FILTER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Muda no início e no fim de cada alteração do índice
+        self._generation = 0
+        self._changing = False
+
+    def get(self, key):
+        """
+        Resultado guardado de um filtro.
+
+        Returns:
+            tuple: (CompanyMatches ou None, geração atual, a ser passada a put).
+        """
+        with self._lock:
+            matches = self._entries.get(key)
+            if matches is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return matches, self._generation
+
+    def put(self, key, matches, generation):
+        """Guarda um resultado, se o índice não mudou desde o get correspondente"""
+        with self._lock:
+            if self._changing or generation != self._generation:
+                return
+            self._entries[key] = matches
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    @contextlib.contextmanager
+    def changing(self, affects):
+        """
+        Delimita uma alteração do índice; ao fim, descarta os resultados afetados.
+
+        Args:
+            affects (callable): affects(chave, resultado) indica se o
+                                resultado guardado deixa de valer.
+        """
+        with self._lock:
+            self._changing = True
+            self._generation += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._changing = False
+                self._generation += 1
+                for key in [key for key, matches in self._entries.items() if affects(key, matches)]:
+                    del self._entries[key]
+
+    def info(self):
+        """Acertos, falhas, tamanho máximo e tamanho atual (FilterCacheInfo)"""
+        with self._lock:
+            return FilterCacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+class CompanyIndex:
+    """
+    Índice em memória das empresas, compartilhado pelas tabelas da tela.
+
+    Cada empresa ocupa um slot; na carga, os slots seguem a ordem da
+    listagem (razao_social, id). As chaves de busca já normalizadas
+    (minúsculas, sem acentos) ficam em estruturas compactas:
+
+      - vocabulário de palavras da razão social e do nome fantasia, com os
+        slots de cada palavra (ver _Postings);
+      - município de cada slot, no mesmo formato;
+      - texto de largura fixa com os dígitos dos CNPJs;
+      - bitmap dos slots ativos (empresas removidas ou alteradas saem dele).
+
+    Um filtro combina bitmaps em vez de percorrer as empresas, então não
+    consulta o banco e o custo depende mais das palavras encontradas do que
+    do tamanho do cadastro.
+
+    Empresas incluídas ou alteradas depois da carga ganham um slot novo no
+    fim, com uma âncora: o slot da parte ordenada antes do qual aparecem na
+    listagem. Elas são intercaladas nos resultados (ver CompanyMatches).
+
+    Os resultados dos filtros mais recentes ficam em filter_cache. A busca
+    por semelhança (similar) usa também os trigramas do vocabulário,
+    montados no primeiro uso.
+    """
+
+    def __init__(self):
+        self._ids = array("q")
+        self._slots = {}
+        self._words = _Postings()
+        self._municipios = _Postings()
+        self._cnpjs = bytearray()
+        self._alive = 0
+        self._base_count = 0
+        # Slots acrescentados depois da carga: (âncora, razao_social, id, slot), em ordem
+        self._extra = []
+        # Muda a cada alteração do índice (ver CompanyFilter)
+        self.version = 0
+        self.filter_cache = FilterCache()
+        self._trigrams = None
+
+    def __len__(self):
+        return len(self._slots)
+
+    def load(self, rows):
+        """
+        Carrega o índice, substituindo o conteúdo anterior.
+
+        Args:
+            rows (iterable): Tuplas (id, cnpj, razao_social, nome_fantasia,
+                             município), na ordem da listagem.
+        """
+        version = self.version
+        self.__init__()
+        self.version = version + 1
+        for row in rows:
+            self._append(*row)
+        slot_count = len(self._ids)
+        self._words.compact(slot_count)
+        self._municipios.compact(slot_count)
+        self._alive = (1 << slot_count) - 1
+        self._base_count = slot_count
+
+    def _append(self, company_id, cnpj, razao_social, nome_fantasia, municipio):
+        """Acrescenta uma empresa em um slot novo e devolve o slot"""
+        slot = len(self._ids)
+        self._ids.append(company_id)
+        self._slots[company_id] = slot
+        self._words.add(set(search_terms(f"{razao_social} {nome_fantasia}")), slot)
+        if municipio:
+            self._municipios.add((municipio,), slot)
+        self._cnpjs += (cnpj or "").rjust(_CNPJ_WIDTH - 1).encode("ascii")[-(_CNPJ_WIDTH - 1):] + b"\n"
+        return slot
+
+    def add(self, company_id, cnpj, razao_social, nome_fantasia, municipio, predecessors):
+        """
+        Inclui (ou substitui) uma empresa depois da carga.
+
+        Args:
+            company_id (int): id da empresa.
+            cnpj (str): CNPJ, apenas dígitos.
+            razao_social (str): Razão social, como gravada.
+            nome_fantasia (str): Nome fantasia.
+            municipio (str): Município (vazio/None = sem município).
+            predecessors (iterable): ids das empresas que vêm antes desta na
+                                     listagem, da mais próxima para a mais
+                                     distante; a primeira da parte ordenada do
+                                     índice define a posição.
+        """
+        old_slot = self._slots.get(company_id)
+        words = set(search_terms(f"{razao_social} {nome_fantasia}"))
+
+        def affects(key, matches):
+            # Resultados com a versão anterior ou que passam a incluir a nova
+            return (old_slot is not None and old_slot in matches) or \
+                _key_matches(key, words, cnpj, municipio)
+
+        anchor = 0
+        for predecessor in predecessors:
+            slot = self._slots.get(predecessor)
+            if slot is not None and slot < self._base_count:
+                anchor = slot + 1
+                break
+        with self.filter_cache.changing(affects):
+            self._remove(company_id)
+            slot = self._append(company_id, cnpj, razao_social, nome_fantasia, municipio)
+            self._alive |= 1 << slot
+            bisect.insort(self._extra, (anchor, razao_social, company_id, slot))
+            self.version += 1
+
+    def remove(self, company_id):
+        """Retira uma empresa do índice (nada acontece se ela não estiver nele)"""
+        slot = self._slots.get(company_id)
+        if slot is None:
+            return
+        with self.filter_cache.changing(lambda key, matches: slot in matches):
+            self._remove(company_id)
+
+    def _remove(self, company_id):
+        slot = self._slots.pop(company_id, None)
+        if slot is None:
+            return
+        self._alive &= ~(1 << slot)
+        if slot >= self._base_count:
+            self._extra = [entry for entry in self._extra if entry[3] != slot]
+        self.version += 1
+
+    def company_ids(self, slots):
+        """ids das empresas dos slots informados"""
+        return [self._ids[slot] for slot in slots]
+
+    def search(self, cnpj_filter="", razao_social_filter="", municipio=None):
+        """
+        Filtra as empresas de uma só vez (ver CompanyFilter).
+
+        Returns:
+            CompanyMatches: Empresas encontradas, na ordem da listagem.
+        """
+        return CompanyFilter(self).search(cnpj_filter, razao_social_filter, municipio)
+
+    def similar(self, text, limit=10, budget=SIMILAR_TIME_BUDGET):
+        """
+        Empresas cuja razão social ou nome fantasia mais se parecem com o
+        texto, tolerando erros de digitação, acentos e palavras faltando ou
+        sobrando.
+
+        Cada palavra do texto (até _MAX_SIMILAR_TERMS; as demais são
+        ignoradas) é comparada às do vocabulário por trigramas, e as
+        _SIMILAR_WORDS mais parecidas entre as que mais compartilham
+        trigramas com ela são as suas palavras parecidas. A nota de uma
+        empresa é a soma, para cada palavra do texto, da semelhança da
+        palavra parecida que a empresa contém (a maior, se houver mais de
+        uma), dividida pela quantidade de palavras comparadas.
+
+        As combinações de palavras parecidas (uma ou nenhuma por palavra do
+        texto) são percorridas em profundidade, intersectando as empresas
+        de cada uma; um ramo sem empresas ou que não pode superar as
+        'limit' melhores notas já encontradas é abandonado. Nenhum ramo que
+        possa superá-las é cortado, então, terminada a busca, as empresas
+        devolvidas são exatamente as de maior nota. O custo depende pouco do
+        tamanho do cadastro, mas cresce com a quantidade de palavras do
+        texto: se a chamada passar de 'budget' segundos (sem contar a
+        montagem dos trigramas, feita no primeiro uso), a busca para e
+        devolve as melhores empresas já encontradas, marcadas como
+        aproximadas.
+
+        Args:
+            text (str): Texto digitado.
+            limit (int): Quantidade máxima de empresas.
+            budget (float): Tempo máximo da chamada, em segundos (None =
+                            sem limite).
+
+        Returns:
+            SimilarMatches: companies são pares (id da empresa, nota entre 0
+                            e 1), da maior nota para a menor; exact indica se
+                            a busca terminou dentro do tempo.
+        """
+        if self._trigrams is None:
+            self._trigrams = _WordTrigrams()
+        vocabulary = self._words.terms
+        if len(vocabulary) > len(self._trigrams.words):
+            # Cópia das chaves: o vocabulário pode crescer em outra thread
+            self._trigrams.update(list(vocabulary))
+        # O tempo conta a partir daqui: a montagem dos trigramas é feita uma vez
+        deadline = None if budget is None else time.perf_counter() + budget
+        terms = list(dict.fromkeys(search_terms(text)))[:_MAX_SIMILAR_TERMS]
+        # Palavras parecidas com cada palavra do texto: pares (semelhança, palavra)
+        options = [similar for similar in (self._trigrams.similar(term, _SIMILAR_WORDS) for term in terms)
+                   if similar]
+        if not options:
+            return SimilarMatches([], True)
+        search = _SimilarSearch(self, options, limit, deadline)
+        ranked = search.run()
+        return SimilarMatches([(self._ids[slot], min(1.0, score / len(terms))) for slot, score in ranked],
+                              search.exact)
+
+    def _matches(self, bits):
+        """Resultado (CompanyMatches) de um bitmap de slots, intercalando os acrescentados"""
+        bits &= self._alive
+        base_count = self._base_count
+        extra_bits = bits >> base_count
+        extra = [(anchor, slot) for anchor, _, _, slot in self._extra
+                 if extra_bits >> (slot - base_count) & 1]
+        return CompanyMatches(bits & ((1 << base_count) - 1), base_count, extra)
+
+
+class CompanyFilter:
+    """
+    Filtro incremental e interrompível das empresas do índice (um por tabela).
+
+    Cada palavra digitada precisa aparecer, como trecho de alguma palavra,
+    na razão social ou no nome fantasia, sem diferenciar maiúsculas e
+    acentos; os dígitos do filtro de CNPJ precisam aparecer em sequência no
+    CNPJ.
+
+    A busca (search_steps) é um gerador que devolve o controle a cada parte
+    do trabalho: quem a executa pode intercalá-la com os eventos da
+    interface e abandoná-la (close) assim que o filtro mudar de novo.
+
+    Os bitmaps do último filtro ficam guardados, e o filtro seguinte calcula
+    só o que mudou, a partir deles:
+      - palavra repetida: bitmap reaproveitado;
+      - palavra que estende uma anterior ("merc" -> "merca"): compara só as
+        palavras do vocabulário encontradas para a anterior;
+      - CNPJ que estende o anterior: verifica só os CNPJs encontrados antes.
+
+    Um filtro já usado recentemente, por esta ou por outra tabela, sai
+    pronto do cache de resultados do índice (ver FilterCache).
+
+    Args:
+        index (CompanyIndex): Índice filtrado.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._version = index.version
+        # Último filtro: {palavra: (palavras do vocabulário, bitmap)},
+        # (dígitos do CNPJ, bitmap) e (município, bitmap)
+        self._terms = {}
+        self._cnpj = None
+        self._municipio = None
+
+    def search(self, cnpj_filter="", razao_social_filter="", municipio=None):
+        """
+        Filtra as empresas de uma só vez.
+
+        Returns:
+            CompanyMatches: Empresas encontradas, na ordem da listagem.
+        """
+        return run_steps(self.search_steps(cnpj_filter, razao_social_filter, municipio))
+
+    def search_steps(self, cnpj_filter="", razao_social_filter="", municipio=None):
+        """
+        Filtra as empresas em etapas (gerador).
+
+        Args:
+            cnpj_filter (str): Trecho do CNPJ (vazio = sem filtro).
+            razao_social_filter (str): Texto da razão social ou do nome fantasia.
+            municipio (str): Município exato (None = todos).
+
+        Returns:
+            CompanyMatches: Empresas encontradas, como valor do gerador.
+        """
+        index = self.index
+        key = filter_key(cnpj_filter, razao_social_filter, municipio)
+        cached, generation = index.filter_cache.get(key)
+        if cached is not None:
+            return cached
+        if self._version != index.version:
+            # Índice alterado: os bitmaps guardados não têm os slots novos
+            self._terms, self._cnpj, self._municipio = {}, None, None
+            self._version = index.version
+        slot_count = len(index._ids)
+        bits = index._alive
+
+        if municipio is not None:
+            if self._municipio is None or self._municipio[0] != municipio:
+                municipio_bits = 0
+                if municipio in index._municipios.terms:
+                    municipio_bits = yield from index._municipios.bits_steps((municipio,), slot_count)
+                self._municipio = (municipio, municipio_bits)
+            bits &= self._municipio[1]
+
+        terms = {}
+        for term in search_terms(razao_social_filter):
+            if not bits:
+                break
+            if term not in terms:
+                terms[term] = yield from self._term_steps(term, slot_count)
+            bits &= terms[term][1]
+        self._terms = terms
+
+        digits = "".join(filter(str.isdigit, cnpj_filter or ""))
+        if cnpj_filter and bits:
+            if self._cnpj is None or self._cnpj[0] != digits:
+                cnpj_bits = yield from self._cnpj_steps(digits, slot_count)
+                self._cnpj = (digits, cnpj_bits)
+            bits &= self._cnpj[1]
+        matches = index._matches(bits)
+        index.filter_cache.put(key, matches, generation)
+        return matches
+
+    def _term_steps(self, term, slot_count):
+        """Palavras do vocabulário que contêm o termo e o bitmap delas (em etapas)"""
+        cached = self._terms.get(term)
+        if cached is not None:
+            return cached
+        # A palavra anterior mais longa contida no termo limita a comparação
+        previous = max((known for known in self._terms if known in term), key=len, default=None)
+        if previous is not None:
+            candidates = self._terms[previous][0]
+        else:
+            candidates = list(self.index._words.terms)
+        words = []
+        for start in range(0, len(candidates), _WORDS_PER_STEP):
+            words += [word for word in candidates[start:start + _WORDS_PER_STEP] if term in word]
+            yield
+        term_bits = yield from self.index._words.bits_steps(words, slot_count)
+        return words, term_bits
+
+    def _cnpj_steps(self, digits, slot_count):
+        """Bitmap dos slots cujo CNPJ contém os dígitos informados (em etapas)"""
+        if not digits:
+            return 0
+        cnpjs = self.index._cnpjs
+        needle = digits.encode("ascii")
+        previous = self._cnpj
+        if previous is not None and previous[0] in digits and \
+                previous[1].bit_count() < slot_count // _CNPJ_NARROW_FRACTION:
+            # Estende o CNPJ anterior: só os encontrados antes podem conter os dígitos
+            packed = bytearray((slot_count + 7) // 8)
+            candidates = previous[1].to_bytes(len(packed), "little")
+            for count, slot in enumerate(_iter_slots(candidates), 1):
+                start = slot * _CNPJ_WIDTH
+                if needle in cnpjs[start:start + _CNPJ_WIDTH]:
+                    packed[slot >> 3] |= 1 << (slot & 7)
+                if not count % _SLOTS_PER_STEP:
+                    yield
+            return int.from_bytes(packed, "little")
+        mask = bytearray(slot_count)
+        find = cnpjs.find
+        position = find(needle)
+        count = 0
+        while position >= 0:
+            slot = position // _CNPJ_WIDTH
+            mask[slot] = 1
+            # Continua no CNPJ seguinte: um slot basta uma vez
+            position = find(needle, (slot + 1) * _CNPJ_WIDTH)
+            count += 1
+            if not count % _SLOTS_PER_STEP:
+                yield
+        return _mask_to_bits(mask)
@@ -0,0 +1,717 @@
+# company_repository.py
+
+import ctypes
+import os
+import re
+import sqlite3
+import threading
+
+from company_index import CompanyIndex, CompanyFilter, SimilarMatches, run_steps
+from migrations import (migrate, fts5_available, normalize_cnpj, display_cnpj, clean_number,
+                        clean_text, create_fulltext_triggers, drop_fulltext_triggers)
+
+# Banco de dados padrão das empresas
+DEFAULT_DB_PATH = "empresas.db"
+
+# Colunas exibidas nas tabelas, na ordem usada pela interface. Os valores
+# já estão limpos e formatados no banco (ver migrations), então as linhas
+# vão direto para a tela
+_DISPLAY_COLUMNS = ("cnpj_formatado", "razao_social", "nome_fantasia", "telefone", "endereco",
+                    "responsavel", "cidade")
+
+COMPANY_COLUMNS = ", ".join(_DISPLAY_COLUMNS[:-1]) + ", COALESCE(cidade, '')"
+
+# As mesmas colunas qualificadas, para as consultas com junção ao índice FTS
+_QUALIFIED_COLUMNS = (", ".join(f"empresas.{column}" for column in _DISPLAY_COLUMNS[:-1])
+                      + ", COALESCE(empresas.cidade, '')")
+
+# Palavras do texto digitado, como o tokenizador unicode61 as separa
+_WORD_RE = re.compile(r"\w+")
+
+# Consultas fixas: o texto de cada uma nunca muda, então o sqlite3 reaproveita
+# o statement já preparado no cache da conexão em todas as chamadas
+# Municípios e contagens vêm da tabela municipios (ver migrations), sem
+# percorrer as empresas
+_SQL_MUNICIPIOS = "SELECT nome, empresas FROM municipios WHERE empresas > 0 ORDER BY nome"
+
+_SQL_MUNICIPIO_NAMES = "SELECT nome FROM municipios"
+
+_SQL_MUNICIPIO_COUNT = "SELECT empresas FROM municipios WHERE nome = ?"
+
+_SQL_COMPANY_COUNT = "SELECT COUNT(*) FROM empresas"
+
+# Busca por relevância (bm25), com a razão social pesando mais que o nome fantasia
+_SQL_SEARCH_FULLTEXT = f"""
+    SELECT {_QUALIFIED_COLUMNS}
+    FROM empresas_fts
+    JOIN empresas ON empresas.rowid = empresas_fts.rowid
+    WHERE empresas_fts MATCH ?
+    ORDER BY bm25(empresas_fts, 2.0, 1.0)
+    LIMIT ?
+"""
+
+_SQL_SEARCH = f"""
+    SELECT {COMPANY_COLUMNS}
+    FROM empresas
+    WHERE (?3 <> '' AND cnpj LIKE ?1)
+       OR UPPER(razao_social) LIKE UPPER(?2)
+       OR UPPER(nome_fantasia) LIKE UPPER(?2)
+    ORDER BY
+        CASE
+            WHEN UPPER(razao_social) = UPPER(?4) THEN 2
+            WHEN UPPER(nome_fantasia) = UPPER(?4) THEN 3
+            ELSE 4
+        END
+    LIMIT 1
+"""
+
+# Buscas pelo CNPJ exato usam o índice UNIQUE de cnpj (apenas dígitos, ver migrations)
+_SQL_BY_CNPJ = f"SELECT {COMPANY_COLUMNS} FROM empresas WHERE cnpj = ?"
+
+# ?2: id de uma empresa a desconsiderar (a que está sendo editada), ou NULL
+_SQL_CNPJ_EXISTS = "SELECT 1 FROM empresas WHERE cnpj = ?1 AND id IS NOT ?2"
+
+_SQL_INSERT = """
+    INSERT INTO empresas (cnpj, cnpj_formatado, razao_social, nome_fantasia, telefone, endereco,
+                          responsavel)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_UPDATE = """
+    UPDATE empresas
+    SET cnpj = ?, cnpj_formatado = ?, razao_social = ?, nome_fantasia = ?, telefone = ?,
+        endereco = ?, responsavel = ?
+    WHERE id = ?
+"""
+
+_SQL_DELETE = "DELETE FROM empresas WHERE id = ?"
+
+# Importação em massa (ver receita_import): os dados novos prevalecem, mas um
+# campo vazio no arquivo não apaga o que já estava cadastrado
+_IMPORT_COLUMNS = ("cnpj", "cnpj_formatado", "nome_fantasia", "telefone", "celular", "email",
+                   "endereco", "numero", "complemento", "bairro", "cidade")
+
+_SQL_UPSERT = f"""
+    INSERT INTO empresas ({", ".join(_IMPORT_COLUMNS)})
+    VALUES ({", ".join("?" * len(_IMPORT_COLUMNS))})
+    ON CONFLICT(cnpj) DO UPDATE SET
+        {", ".join(f"{column} = COALESCE(NULLIF(excluded.{column}, ''), {column})"
+                   for column in _IMPORT_COLUMNS[1:])}
+"""
+
+# Razão social de todos os estabelecimentos (matriz e filiais) de um CNPJ
+# básico: as 8 primeiras posições, por faixa no índice UNIQUE de cnpj
+_SQL_SET_RAZAO_SOCIAL = """
+    UPDATE empresas SET razao_social = ?1
+    WHERE cnpj BETWEEN ?2 || '000000' AND ?2 || '999999' AND razao_social <> ?1
+"""
+
+# Chaves (CNPJ ou CNPJ básico) do lote em gravação, para atualizar o índice
+# FTS de todas as empresas do lote com uma única consulta
+_SQL_CREATE_BATCH_KEYS = "CREATE TEMP TABLE IF NOT EXISTS lote_chaves (chave TEXT PRIMARY KEY)"
+
+_SQL_CLEAR_BATCH_KEYS = "DELETE FROM temp.lote_chaves"
+
+_SQL_INSERT_BATCH_KEY = "INSERT OR IGNORE INTO temp.lote_chaves (chave) VALUES (?)"
+
+_JOIN_BY_CNPJ = "empresas.cnpj = lote_chaves.chave"
+
+_JOIN_BY_CNPJ_BASICO = ("empresas.cnpj BETWEEN lote_chaves.chave || '000000' "
+                        "AND lote_chaves.chave || '999999'")
+
+_SQL_FTS_DELETE_BATCH = """
+    INSERT INTO empresas_fts(empresas_fts, rowid, razao_social, nome_fantasia)
+    SELECT 'delete', empresas.id, empresas.razao_social, empresas.nome_fantasia
+    FROM temp.lote_chaves JOIN empresas ON {join}
+"""
+
+_SQL_FTS_INSERT_BATCH = """
+    INSERT INTO empresas_fts(rowid, razao_social, nome_fantasia)
+    SELECT empresas.id, empresas.razao_social, empresas.nome_fantasia
+    FROM temp.lote_chaves JOIN empresas ON {join}
+"""
+
+# Índice em memória (ver company_index): empresas na ordem da listagem, pelo
+# índice de razao_social da migração 6
+_INDEX_COLUMNS = "id, cnpj, razao_social, nome_fantasia, cidade"
+
+_SQL_INDEX_ROWS = f"SELECT {_INDEX_COLUMNS} FROM empresas ORDER BY +razao_social, id"
+
+_SQL_INDEX_ROW = f"SELECT {_INDEX_COLUMNS} FROM empresas WHERE id = ?"
+
+# Empresas antes de uma chave (razao_social, id), da mais próxima para a mais distante
+_SQL_PREDECESSORS = """
+    SELECT id FROM empresas
+    WHERE (razao_social, id) < (?, ?)
+    ORDER BY razao_social DESC, id DESC
+"""
+
+# Linhas das tabelas (ver CompanyPageSource): o id antes das colunas de exibição
+_SQL_ROWS_BY_ID = f"SELECT id, {COMPANY_COLUMNS} FROM empresas WHERE id IN ({{placeholders}})"
+
+# Quantidade máxima de parâmetros por consulta em companies_by_ids
+_IDS_PER_QUERY = 500
+
+# Sistemas de arquivos de rede (em /proc/mounts), em que o WAL não é seguro
+_NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "fuse.sshfs"}
+
+# GetDriveTypeW: unidade mapeada de rede
+_DRIVE_REMOTE = 4
+
+
+def company_values(cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel):
+    """
+    Limpa os campos de uma empresa para gravação, como na migração 4.
+
+    Returns:
+        tuple: (cnpj, cnpj_formatado, razao_social, nome_fantasia, telefone,
+               endereco, responsavel), na ordem de _SQL_INSERT.
+    """
+    return (normalize_cnpj(cnpj), display_cnpj(cnpj), clean_text(razao_social),
+            clean_text(nome_fantasia), clean_number(telefone), clean_text(endereco),
+            clean_text(responsavel))
+
+
+def on_network_share(path):
+    """
+    Indica se o arquivo está em uma pasta de rede (caminho UNC ou unidade
+    mapeada no Windows; NFS, SMB etc. no Linux). Na dúvida, False.
+    """
+    path = os.path.abspath(path)
+    if os.name == "nt":
+        if path.startswith("\\\\"):
+            return True
+        drive = os.path.splitdrive(path)[0] + "\\"
+        return ctypes.windll.kernel32.GetDriveTypeW(drive) == _DRIVE_REMOTE
+    try:
+        with open("/proc/mounts", encoding="utf-8") as mounts:
+            entries = [line.split()[1:3] for line in mounts]
+    except OSError:
+        return False
+    # O ponto de montagem mais específico que contém o arquivo
+    fstype = None
+    best = ""
+    for mount_point, mount_type in entries:
+        mount_point = mount_point.replace("\\040", " ")
+        if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) \
+                and len(mount_point) >= len(best):
+            best, fstype = mount_point, mount_type
+    return fstype in _NETWORK_FILESYSTEMS
+
+
+def fulltext_query(text):
+    """
+    Converte o texto digitado em uma expressão MATCH do FTS5.
+
+    Cada palavra vira uma busca por prefixo e todas precisam aparecer:
+    "sao pau" resulta em '"sao"* "pau"*'.
+
+    Returns:
+        str: Expressão MATCH, ou None se o texto não tiver palavras.
+    """
+    words = _WORD_RE.findall(text or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class CompanyRepository:
+    """
+    Acesso ao cadastro de empresas por meio de uma única conexão SQLite.
+
+    A conexão fica aberta durante toda a execução do programa, com:
+      - journal em modo WAL (leituras não bloqueiam gravações), exceto em
+        pastas de rede (ver journal_mode);
+      - cache de páginas maior que o padrão;
+      - leitura do arquivo por mmap;
+      - cache de statements preparados.
+
+    Ao abrir, aplica as migrações pendentes do esquema (ver migrations).
+    O índice em memória das empresas (ver company_index) é carregado no
+    primeiro uso e acompanha as gravações feitas pelo repositório.
+    Todas as operações são serializadas por um lock, de modo que o
+    repositório pode ser usado também a partir de threads de trabalho.
+
+    Args:
+        db_path (str): Caminho do banco de dados.
+        cache_size_kib (int): Tamanho do cache de páginas, em KiB.
+        mmap_size (int): Bytes do arquivo mapeados em memória.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, cache_size_kib=16384, mmap_size=64 * 1024 * 1024):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=128)
+        self._configure(cache_size_kib, mmap_size)
+        migrate(self.conn)
+        # Índice de texto completo disponível (ver migrations); sem ele, LIKE
+        self.fulltext = fts5_available(self.conn) and self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'empresas_fts'").fetchone() is not None
+        self._index = None
+
+    def _configure(self, cache_size_kib, mmap_size):
+        """Aplica os PRAGMAs de desempenho da conexão"""
+        # O WAL depende de memória compartilhada entre os processos, que não
+        # funciona em pastas de rede: lá o banco fica no journal padrão (o
+        # modo WAL é gravado no arquivo, então é desfeito se já estiver ativo)
+        wanted = "delete" if on_network_share(self.db_path) else "wal"
+        try:
+            # O SQLite não falha ao recusar um modo: devolve o que ficou valendo
+            mode = self.conn.execute(f"PRAGMA journal_mode={wanted}").fetchone()[0]
+        except sqlite3.Error:
+            # Ex.: banco aberto por outro processo ao sair do WAL
+            mode = self.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.journal_mode = mode.lower()
+        if self.journal_mode == "wal":
+            # Seguro com WAL; no journal padrão, mantém-se o FULL
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA cache_size=-{int(cache_size_kib)}")
+        self.conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+
+    def close(self):
+        """Fecha a conexão"""
+        with self._lock:
+            self.conn.close()
+
+    # Consultas
+
+    def list_municipios(self):
+        """Retorna a lista de municípios com empresas, em ordem alfabética"""
+        return list(self.municipio_counts())
+
+    def municipio_counts(self):
+        """
+        Quantidade de empresas de cada município, mantida pelos triggers.
+
+        Returns:
+            dict: {nome do município: quantidade}, em ordem alfabética.
+        """
+        with self._lock:
+            return dict(self.conn.execute(_SQL_MUNICIPIOS).fetchall())
+
+    def municipio_names(self):
+        """Nomes de todos os municípios cadastrados, inclusive os sem empresas"""
+        with self._lock:
+            return [nome for nome, in self.conn.execute(_SQL_MUNICIPIO_NAMES)]
+
+    def count_companies(self, municipio=None):
+        """Quantidade de empresas de um município (None = todas)"""
+        with self._lock:
+            if municipio is None:
+                return self.conn.execute(_SQL_COMPANY_COUNT).fetchone()[0]
+            row = self.conn.execute(_SQL_MUNICIPIO_COUNT, (municipio,)).fetchone()
+            return row[0] if row else 0
+
+    def search_companies(self, search_term, limit=10):
+        """
+        Pesquisa empresas pela razão social/nome fantasia, das mais relevantes
+        para as menos relevantes (bm25), usando o índice de texto completo.
+
+        Returns:
+            list: Linhas das empresas (colunas de COMPANY_COLUMNS);
+                  vazia se não houver índice FTS ou palavras no termo.
+        """
+        match = fulltext_query(search_term) if self.fulltext else None
+        if match is None:
+            return []
+        with self._lock:
+            return self.conn.execute(_SQL_SEARCH_FULLTEXT, (match, limit)).fetchall()
+
+    def find_company(self, search_term):
+        """
+        Pesquisa uma empresa pelo CNPJ (parcial) ou pela razão social/nome fantasia.
+
+        A preferência é para a coincidência exata de CNPJ, depois para o
+        resultado mais relevante da busca de texto completo e, por fim, para
+        a busca por trecho (LIKE) no CNPJ, na razão social e no nome
+        fantasia. Termos sem dígitos não são comparados ao CNPJ (um padrão
+        vazio coincidiria com todas as empresas).
+
+        Returns:
+            tuple: Linha da empresa (colunas de COMPANY_COLUMNS) ou None.
+        """
+        search_term_clean = "".join(filter(str.isdigit, search_term))
+        with self._lock:
+            if search_term_clean:
+                # Coincidência exata de CNPJ: uma consulta ao índice
+                row = self.conn.execute(_SQL_BY_CNPJ, (search_term_clean,)).fetchone()
+                if row is not None:
+                    return row
+            ranked = self.search_companies(search_term, limit=1)
+            if ranked:
+                return ranked[0]
+            return self.conn.execute(_SQL_SEARCH, (
+                f"%{search_term_clean}%", f"%{search_term}%", search_term_clean, search_term,
+            )).fetchone()
+
+    def find_companies(self, search_term, limit=10):
+        """
+        Pesquisa as empresas mais parecidas com o termo, para o usuário
+        escolher entre elas.
+
+        Um CNPJ completo encontrado é devolvido sozinho. Caso contrário, a
+        razão social e o nome fantasia são comparados ao termo por trigramas
+        (ver CompanyIndex.similar), tolerando erros de digitação; se nenhuma
+        palavra for parecida, ou se o termo não tiver letras (CNPJ parcial),
+        vale a busca de find_company.
+
+        Args:
+            search_term (str): CNPJ (parcial) ou razão social/nome fantasia.
+            limit (int): Quantidade máxima de empresas.
+
+        Returns:
+            SimilarMatches: companies são pares (semelhança entre 0 e 1, ou
+                            None se a empresa não veio da busca por
+                            semelhança; linha da empresa com as colunas de
+                            COMPANY_COLUMNS), da mais parecida para a menos;
+                            exact é False se a busca por semelhança parou no
+                            limite de tempo.
+        """
+        search_term_clean = "".join(filter(str.isdigit, search_term))
+        if search_term_clean:
+            with self._lock:
+                row = self.conn.execute(_SQL_BY_CNPJ, (search_term_clean,)).fetchone()
+            if row is not None:
+                return SimilarMatches([(1.0, row)], True)
+        # Termo só com dígitos e pontuação: CNPJ parcial, buscado por trecho
+        if any(char.isalpha() for char in search_term):
+            ranked, exact = self.company_index().similar(search_term, limit)
+            if ranked:
+                rows = {row[0]: row[1:] for row in self.companies_by_ids(company_id for company_id, _ in ranked)}
+                return SimilarMatches([(score, rows[company_id]) for company_id, score in ranked
+                                       if company_id in rows], exact)
+        row = self.find_company(search_term)
+        return SimilarMatches([] if row is None else [(None, row)], True)
+
+    def cnpj_exists(self, cnpj_clean, except_id=None):
+        """
+        Verifica se já existe empresa com o CNPJ (apenas dígitos) informado.
+
+        Args:
+            except_id (int): Id de uma empresa a desconsiderar (a que está
+                             sendo editada).
+        """
+        with self._lock:
+            return self.conn.execute(_SQL_CNPJ_EXISTS, (cnpj_clean, except_id)).fetchone() is not None
+
+    def companies_by_ids(self, ids):
+        """
+        Linhas das empresas com os ids informados, em qualquer ordem.
+
+        Returns:
+            list: Tuplas (id, cnpj formatado, razao_social, nome_fantasia,
+                  telefone, endereco, responsavel, cidade); ids inexistentes
+                  são ignorados.
+        """
+        ids = list(ids)
+        rows = []
+        with self._lock:
+            for start in range(0, len(ids), _IDS_PER_QUERY):
+                chunk = ids[start:start + _IDS_PER_QUERY]
+                sql = _SQL_ROWS_BY_ID.format(placeholders=", ".join("?" * len(chunk)))
+                rows += self.conn.execute(sql, chunk).fetchall()
+        return rows
+
+    # Índice em memória
+
+    def company_index(self):
+        """
+        Índice em memória das empresas, carregado na primeira chamada (ou na
+        primeira depois de uma importação em massa).
+
+        Returns:
+            CompanyIndex: Índice compartilhado por todas as listagens.
+        """
+        with self._lock:
+            if self._index is None:
+                index = CompanyIndex()
+                index.load(self.conn.execute(_SQL_INDEX_ROWS))
+                self._index = index
+            return self._index
+
+    def filter_cache_info(self):
+        """
+        Estatísticas do cache de resultados dos filtros do índice em memória
+        (ver company_index.FilterCache). As gravações do repositório
+        descartam só os resultados afetados por elas.
+
+        Returns:
+            FilterCacheInfo: (hits, misses, maxsize, currsize).
+        """
+        return self.company_index().filter_cache.info()
+
+    def _index_company(self, company_id):
+        """Atualiza uma empresa no índice em memória, se ele já estiver carregado"""
+        if self._index is None or company_id is None:
+            return
+        row = self.conn.execute(_SQL_INDEX_ROW, (company_id,)).fetchone()
+        if row is None:
+            self._index.remove(company_id)
+            return
+        predecessors = self.conn.execute(_SQL_PREDECESSORS, (row[2], row[0]))
+        try:
+            self._index.add(*row, (predecessor for predecessor, in predecessors))
+        finally:
+            predecessors.close()
+
+    # Gravações (cada uma em sua própria transação)
+
+    def add_company(self, cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel):
+        """
+        Insere uma nova empresa.
+
+        Raises:
+            sqlite3.IntegrityError: Se já existir empresa com o mesmo CNPJ.
+        """
+        values = company_values(cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel)
+        with self._lock:
+            with self.conn:
+                company_id = self.conn.execute(_SQL_INSERT, values).lastrowid
+            self._index_company(company_id)
+
+    def update_company(self, company_id, cnpj, razao_social, nome_fantasia, telefone, endereco,
+                       responsavel):
+        """
+        Atualiza a empresa com o id informado (o das linhas das tabelas).
+
+        Returns:
+            bool: False se a empresa não existir mais.
+
+        Raises:
+            sqlite3.IntegrityError: Se o novo CNPJ já pertencer a outra empresa.
+        """
+        values = company_values(cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel)
+        with self._lock:
+            with self.conn:
+                updated = self.conn.execute(_SQL_UPDATE, values + (company_id,)).rowcount
+            self._index_company(company_id)
+        return updated > 0
+
+    def delete_company(self, company_id):
+        """
+        Remove a empresa com o id informado (o das linhas das tabelas).
+
+        Returns:
+            bool: False se a empresa não existir mais.
+        """
+        with self._lock:
+            with self.conn:
+                deleted = self.conn.execute(_SQL_DELETE, (company_id,)).rowcount
+            if self._index is not None and deleted:
+                self._index.remove(company_id)
+        return deleted > 0
+
+    # Importação em massa
+
+    def _write_batch(self, statement, rows, keys, join):
+        """
+        Executa uma gravação em massa em uma única transação.
+
+        Os triggers do índice FTS atualizam o índice linha a linha, o que
+        domina o custo de lotes grandes. Aqui eles são removidos durante o
+        lote: as entradas das empresas afetadas (localizadas pelas chaves e
+        pela junção 'join') saem do índice antes da gravação e voltam,
+        atualizadas, depois dela; os triggers são recriados na mesma
+        transação, então nenhuma outra gravação ocorre sem eles. O índice em
+        memória é descartado e recarregado no próximo uso.
+
+        Returns:
+            int: Quantidade de linhas gravadas.
+        """
+        with self._lock, self.conn:
+            self._index = None
+            if not self.fulltext:
+                return self.conn.executemany(statement, rows).rowcount
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute(_SQL_CREATE_BATCH_KEYS)
+            self.conn.execute(_SQL_CLEAR_BATCH_KEYS)
+            self.conn.executemany(_SQL_INSERT_BATCH_KEY, ((key,) for key in keys))
+            drop_fulltext_triggers(self.conn)
+            self.conn.execute(_SQL_FTS_DELETE_BATCH.format(join=join))
+            count = self.conn.executemany(statement, rows).rowcount
+            self.conn.execute(_SQL_FTS_INSERT_BATCH.format(join=join))
+            create_fulltext_triggers(self.conn)
+            return count
+
+    def upsert_companies(self, rows):
+        """
+        Insere ou atualiza (pelo CNPJ) um lote de empresas em uma única transação.
+
+        Args:
+            rows (list): Tuplas (cnpj, cnpj_formatado, nome_fantasia, telefone,
+                         celular, email, endereco, numero, complemento,
+                         bairro, cidade), já limpas.
+
+        Returns:
+            int: Quantidade de linhas inseridas ou atualizadas.
+        """
+        return self._write_batch(_SQL_UPSERT, rows, (row[0] for row in rows), _JOIN_BY_CNPJ)
+
+    def set_razao_social(self, pairs):
+        """
+        Grava a razão social dos estabelecimentos de cada CNPJ básico, em uma
+        única transação.
+
+        Args:
+            pairs (list): Tuplas (razao_social, cnpj_basico de 8 dígitos).
+
+        Returns:
+            int: Quantidade de empresas alteradas.
+        """
+        return self._write_batch(_SQL_SET_RAZAO_SOCIAL, pairs, (pair[1] for pair in pairs),
+                                 _JOIN_BY_CNPJ_BASICO)
+
+
+class CompanyListing:
+    """
+    Resultado de uma releitura de CompanyPageSource: as empresas que atendem
+    aos filtros, lidas por páginas.
+
+    É uma fotografia: não muda quando o filtro muda de novo, então pode ser
+    montada e paginada em uma thread de trabalho enquanto a tela continua
+    mostrando a listagem anterior.
+
+    A paginação é por posição, não por chave (razao_social, id): cada linha
+    traz sua posição na listagem, e a página seguinte ou anterior começa na
+    posição vizinha. Como a listagem não muda, a posição não se desloca; o
+    slot de cada posição sai do bitmap do filtro (CompanyMatches.slots),
+    sem percorrer as empresas anteriores.
+
+    Args:
+        repository (CompanyRepository): Repositório de onde as linhas são lidas.
+        index (CompanyIndex): Índice em que o filtro foi aplicado.
+        matches (CompanyMatches): Resultado do filtro.
+    """
+
+    def __init__(self, repository, index, matches):
+        self.repository = repository
+        self.index = index
+        self.matches = matches
+
+    def count(self):
+        """Quantidade de empresas que atendem aos filtros"""
+        return self.matches.count
+
+    def page(self, limit, after=None, before=None, offset=0):
+        """
+        Lê uma página da listagem, sempre em ordem crescente.
+
+        Args:
+            limit (int): Quantidade máxima de linhas.
+            after (tuple): Linha (devolvida por page) logo depois da qual a
+                           página começa; vale a posição na última coluna.
+            before (tuple): Linha logo antes da qual a página termina (idem).
+            offset (int): Posição da primeira linha, quando não há 'after' nem 'before'.
+
+        Returns:
+            list: Tuplas (id, cnpj formatado, razao_social, nome_fantasia,
+                  telefone, endereco, responsavel, cidade, posição).
+        """
+        if after is not None:
+            offset = after[-1] + 1
+        elif before is not None:
+            offset = max(0, before[-1] - limit)
+            limit = before[-1] - offset
+        ids = self.index.company_ids(self.matches.slots(offset, limit))
+        rows = {row[0]: row for row in self.repository.companies_by_ids(ids)}
+        # Empresas removidas do banco por fora do repositório ficam de fora
+        return [rows[company_id] + (position,)
+                for position, company_id in enumerate(ids, offset) if company_id in rows]
+
+    def ids(self):
+        """ids de todas as empresas que atendem aos filtros"""
+        return self.index.company_ids(self.matches.all_slots())
+
+
+class CompanyPageSource:
+    """
+    Fonte de dados paginada de uma tabela de empresas, com os filtros da tela.
+
+    Os filtros são aplicados ao índice em memória do repositório (ver
+    company_index), compartilhado pelas tabelas, sem consultar o banco; só
+    as linhas de cada página exibida são lidas dele, pelo id. A listagem
+    segue a ordem de (razao_social, id) e cada linha traz sua posição,
+    usada para pedir a página seguinte ou a anterior.
+
+    Cada fonte tem o seu CompanyFilter: um filtro que estende o anterior
+    reaproveita o resultado dele. A releitura pode ser feita em etapas
+    (reload_steps), inclusive em uma thread de trabalho, e abandonada
+    quando o filtro muda de novo; ela devolve uma nova CompanyListing, que
+    só passa a valer com apply(). Até lá, as páginas continuam vindo da
+    listagem anterior, a que está na tela.
+
+    Args:
+        repository (CompanyRepository): Repositório de onde as linhas são lidas.
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        self._filters = ("", "", None)
+        self._filter = None
+        self._listing = None
+
+    def set_filters(self, cnpj_filter="", razao_social_filter="", municipio=None):
+        """
+        Define os filtros da listagem (vazio/None = sem filtro), aplicados na
+        próxima releitura.
+
+        Args:
+            cnpj_filter (str): Trecho do CNPJ.
+            razao_social_filter (str): Palavras (ou trechos) da razão social ou do nome fantasia.
+            municipio (str): Município exato.
+        """
+        self._filters = (cnpj_filter or "", razao_social_filter or "", municipio)
+
+    def reload(self):
+        """Relê a listagem com os filtros atuais (ex.: após gravações no cadastro)"""
+        self.apply(run_steps(self.reload_steps()))
+
+    def reload_steps(self):
+        """
+        Relê a listagem em etapas (gerador): cada next() faz uma parte do
+        filtro e, ao fim, o gerador devolve a nova CompanyListing.
+
+        Apenas uma releitura da mesma fonte deve estar em andamento por vez.
+        """
+        filters = self._filters
+        index = self.repository.company_index()
+        if self._filter is None or self._filter.index is not index:
+            # Índice recarregado (ex.: após uma importação em massa)
+            self._filter = CompanyFilter(index)
+        matches = yield from self._filter.search_steps(*filters)
+        return CompanyListing(self.repository, index, matches)
+
+    def apply(self, listing):
+        """Passa a paginar a listagem devolvida por reload_steps"""
+        self._listing = listing
+
+    def _ensure_loaded(self):
+        """Carrega a listagem na primeira leitura"""
+        if self._listing is None:
+            self.reload()
+
+    def count(self):
+        """Quantidade de empresas que atendem aos filtros"""
+        self._ensure_loaded()
+        return self._listing.count()
+
+    def page(self, limit, after=None, before=None, offset=0):
+        """Lê uma página da listagem atual, por posição (ver CompanyListing.page)"""
+        self._ensure_loaded()
+        return self._listing.page(limit, after, before, offset)
+
+    def ids(self):
+        """ids de todas as empresas que atendem aos filtros"""
+        self._ensure_loaded()
+        return self._listing.ids()
+
+    def rows_by_ids(self, ids):
+        """
+        Linhas das empresas com os ids informados, em ordem de (razao_social, id).
+
+        Empresas removidas depois de selecionadas são ignoradas.
+        """
+        rows = self.repository.companies_by_ids(ids)
+        rows.sort(key=lambda row: (row[2], row[0]))
+        return rows
@@ -2,12 +2,55 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import sqlite3
 import os
+import logging
+import multiprocessing
+import threading
 from datetime import datetime
 
-# Importar a função de preenchimento e o mapeamento
-from pdf_filler import fill_pdf_document
+# Importar o mapeamento e a formatação de CNPJ
 from pdf_mapping import pdf_fields
 from cnpj_formatter import format_cnpj, validate_cnpj_format, clean_cnpj
+from company_repository import CompanyRepository, CompanyPageSource
+from virtual_tree import VirtualTreeview, SELECTION_EVENT
+from query_executor import QueryExecutor
+
+# Template do formulário a preencher
+TEMPLATE_PDF = "formulario.pdf"
+
+# Opção do filtro de município que exibe todas as empresas
+TODOS_MUNICIPIOS = "Todos os municípios"
+
+# Arquivo com o traceback dos erros inesperados: no executável (--windowed)
+# não há console para o stderr
+LOG_FILE = "erros.log"
+
+logger = logging.getLogger(__name__)
+
+
+def load_pdf_filler():
+    """
+    Importa o módulo pdf_filler sob demanda.
+
+    pdf_filler carrega pypdf e reportlab, que respondem pela maior parte do
+    tempo de abertura do programa e só são necessários ao preencher. O
+    import é feito na primeira chamada (ou pelo aquecimento em segundo
+    plano) e as chamadas seguintes apenas devolvem o módulo já carregado.
+
+    Returns:
+        module: O módulo pdf_filler.
+    """
+    import pdf_filler
+    return pdf_filler
+
+
+def _warm_up_pdf_filler():
+    """Importa a pilha de PDF e analisa o template em segundo plano"""
+    try:
+        load_pdf_filler().load_template(TEMPLATE_PDF)
+    except Exception:
+        # Erros (template ausente, etc.) são informados ao preencher
+        pass
+
 
 class PDFillerApp:
     def __init__(self, master):
@@ -172,19 +215,44 @@ class PDFillerApp:
         # Nova variável para filtro de município
         self.batch_filter_municipio_var = tk.StringVar()
 
+        # Formato de saída do lote: um PDF por empresa, um único PDF ou um ZIP
+        self.batch_output_mode_var = tk.StringVar(value="individual")
+
+        # Gravar os PDFs do lote otimizados (streams comprimidos, object streams)
+        self.batch_optimize_var = tk.BooleanVar(value=True)
+
         # Variável para controlar se estamos editando uma empresa existente
         self.editing_company_id = None
 
+        # Conexão única com o banco, mantida aberta enquanto a janela existir.
+        # Se o banco não abrir, a janela abre mesmo assim, sem as funções que
+        # dependem dele (ver disable_database_widgets)
+        try:
+            self.repository = CompanyRepository()
+        except sqlite3.Error as e:
+            self.repository = None
+            self.show_error("Erro ao abrir o banco de dados", e)
+        master.bind("<Destroy>", self.on_destroy, add="+")
+
+        # Consultas ao banco rodam em segundo plano, sem travar a janela
+        self.executor = QueryExecutor(master)
+
         # Criar notebook (abas)
         self.notebook = ttk.Notebook(master)
         self.notebook.pack(fill="both", expand=True, padx=10, pady=10)
 
+        # Widgets que consultam ou alteram o banco
+        self.database_widgets = []
+
         # Criar as abas
         self.create_individual_tab()
         self.create_batch_tab()
         
         # Carregar dados das empresas
-        self.load_companies()
+        if self.repository is None:
+            self.disable_database_widgets()
+        else:
+            self.load_companies()
 
     def create_individual_tab(self):
         """Cria a aba de preenchimento individual"""
@@ -234,9 +302,10 @@ class PDFillerApp:
         search_entry.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
         
         # Botão de pesquisa
-        search_button = ttk.Button(search_frame, text="Pesquisar e Preencher", 
-                                 command=self.search_and_fill_company, style="Search.TButton")
-        search_button.grid(row=0, column=2, padx=10, pady=5)
+        self.search_button = ttk.Button(search_frame, text="Pesquisar e Preencher", 
+                                        command=self.search_and_fill_company, style="Search.TButton")
+        self.search_button.grid(row=0, column=2, padx=10, pady=5)
+        self.database_widgets += [search_entry, self.search_button]
 
         # Bind Enter key para pesquisa
         search_entry.bind('<Return>', lambda event: self.search_and_fill_company())
@@ -285,14 +354,12 @@ class PDFillerApp:
         buttons_frame = tk.Frame(crud_frame, bg=self.colors['light_gray'])
         buttons_frame.pack(pady=10)
 
-        ttk.Button(buttons_frame, text="Adicionar Empresa", 
-                  command=self.add_company, style="Add.TButton").pack(side="left", padx=5)
-        
-        ttk.Button(buttons_frame, text="Atualizar Empresa", 
-                  command=self.update_company, style="Update.TButton").pack(side="left", padx=5)
-        
-        ttk.Button(buttons_frame, text="Deletar Empresa", 
-                  command=self.delete_company, style="Delete.TButton").pack(side="left", padx=5)
+        for text, command, style in (("Adicionar Empresa", self.add_company, "Add.TButton"),
+                                     ("Atualizar Empresa", self.update_company, "Update.TButton"),
+                                     ("Deletar Empresa", self.delete_company, "Delete.TButton")):
+            button = ttk.Button(buttons_frame, text=text, command=command, style=style)
+            button.pack(side="left", padx=5)
+            self.database_widgets.append(button)
 
         # Frame para seleção de arquivos
         file_frame = ttk.LabelFrame(scrollable_frame, text="Seleção de Arquivos")
@@ -312,9 +379,10 @@ class PDFillerApp:
         table_frame = ttk.LabelFrame(individual_frame, text="Empresas Cadastradas")
         table_frame.pack(padx=10, pady=10, fill="both", expand=True)
         
-        # Criar a tabela (Treeview)
+        # Criar a tabela (Treeview virtual: só as linhas visíveis são lidas do banco)
         columns = ("CNPJ", "Razão Social", "Nome Fantasia", "Telefone", "Endereço", "Responsável")
-        self.tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        self.tree = VirtualTreeview(table_frame, CompanyPageSource(self.repository), columns,
+                                    self.executor, height=15, on_error=self.show_load_error)
         
         # Configurar cabeçalhos
         for col in columns:
@@ -326,22 +394,15 @@ class PDFillerApp:
             elif col == "Nome Fantasia":
                 self.tree.column(col, width=120, minwidth=100)
 
-        # Scrollbars para a tabela
-        v_scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
-        h_scrollbar = ttk.Scrollbar(table_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-
-        # Posicionar tabela e scrollbars
-        self.tree.grid(row=0, column=0, sticky="nsew")
-        v_scrollbar.grid(row=0, column=1, sticky="ns")
-        h_scrollbar.grid(row=1, column=0, sticky="ew")
+        # Posicionar tabela (com suas próprias barras de rolagem)
+        self.tree.grid(row=0, column=0, columnspan=2, sticky="nsew")
 
         # Configurar expansão do grid
         table_frame.grid_rowconfigure(0, weight=1)
         table_frame.grid_columnconfigure(0, weight=1)
 
         # Bind para seleção de linha
-        self.tree.bind("<<TreeviewSelect>>", self.on_company_select)
+        self.tree.bind(SELECTION_EVENT, self.on_company_select)
 
         # Frame para filtros
         filter_frame = ttk.Frame(table_frame)
@@ -358,11 +419,14 @@ class PDFillerApp:
         self.filter_razao_social_var.trace("w", self.filter_companies)
         filter_razao_social_entry = ttk.Entry(filter_frame, textvariable=self.filter_razao_social_var, width=30)
         filter_razao_social_entry.pack(side="left", padx=5)
+        self.database_widgets += [filter_cnpj_entry, filter_razao_social_entry]
 
     def create_batch_tab(self):
         """Cria a aba de preenchimento em lote com scrollbox"""
         # Frame para a aba de lote
         batch_frame = ttk.Frame(self.notebook)
+        # A aba inteira depende do banco (ver disable_database_widgets)
+        self.batch_frame = batch_frame
         self.notebook.add(batch_frame, text="Preenchimento em Lote")
 
         # Cabeçalho
@@ -448,7 +512,8 @@ class PDFillerApp:
         self.municipality_status_label.grid(row=1, column=0, columnspan=4, sticky="w", padx=10, pady=2)
         
         # Carregar municípios no combobox
-        self.load_municipios()
+        if self.repository is not None:
+            self.load_municipios()
 
         # Frame para seleção de diretório de saída
         batch_file_frame = ttk.LabelFrame(batch_scrollable_frame, text="Local para Salvar")
@@ -460,13 +525,30 @@ class PDFillerApp:
         ttk.Entry(batch_file_frame, textvariable=self.batch_output_dir_path, width=50, state="readonly").grid(row=0, column=1, padx=10, pady=5, sticky="ew")
         ttk.Button(batch_file_frame, text="Selecionar Pasta", command=self.select_batch_output_dir).grid(row=0, column=2, padx=10, pady=5)
 
+        # Formato de saída
+        ttk.Label(batch_file_frame, text="Formato:").grid(row=1, column=0, sticky="w", padx=10, pady=5)
+        output_mode_frame = ttk.Frame(batch_file_frame)
+        output_mode_frame.grid(row=1, column=1, columnspan=2, sticky="w", padx=10, pady=5)
+        ttk.Radiobutton(output_mode_frame, text="Um PDF por empresa", value="individual",
+                        variable=self.batch_output_mode_var).pack(side="left", padx=5)
+        ttk.Radiobutton(output_mode_frame, text="PDF único com todas as empresas", value="merged",
+                        variable=self.batch_output_mode_var).pack(side="left", padx=5)
+        ttk.Radiobutton(output_mode_frame, text="Arquivo ZIP", value="zip",
+                        variable=self.batch_output_mode_var).pack(side="left", padx=5)
+
+        # Otimização do tamanho dos arquivos
+        ttk.Checkbutton(batch_file_frame, text="Otimizar tamanho dos PDFs (compressão e object streams)",
+                        variable=self.batch_optimize_var).grid(row=2, column=1, columnspan=2, sticky="w", padx=10, pady=5)
+
         # Frame para a tabela de empresas no modo lote
         batch_table_frame = ttk.LabelFrame(batch_scrollable_frame, text="Empresas Cadastradas (Selecione para Preencher)")
         batch_table_frame.pack(padx=10, pady=10, fill="both", expand=True)
 
-        # Criar a tabela (Treeview) para seleção em lote
+        # Criar a tabela (Treeview virtual) para seleção em lote
         columns = ("CNPJ", "Razão Social", "Nome Fantasia", "Telefone", "Endereço", "Responsável", "Município")
-        self.batch_tree = ttk.Treeview(batch_table_frame, columns=columns, show="headings", height=8, selectmode="extended")
+        self.batch_tree = VirtualTreeview(batch_table_frame, CompanyPageSource(self.repository), columns,
+                                          self.executor, height=8, selectmode="extended",
+                                          on_error=self.show_load_error)
         
         # Configurar cabeçalhos
         for col in columns:
@@ -480,15 +562,8 @@ class PDFillerApp:
             elif col == "Município":
                 self.batch_tree.column(col, width=120, minwidth=100)
 
-        # Scrollbars para a tabela de lote
-        batch_v_scrollbar = ttk.Scrollbar(batch_table_frame, orient="vertical", command=self.batch_tree.yview)
-        batch_h_scrollbar = ttk.Scrollbar(batch_table_frame, orient="horizontal", command=self.batch_tree.xview)
-        self.batch_tree.configure(yscrollcommand=batch_v_scrollbar.set, xscrollcommand=batch_h_scrollbar.set)
-
-        # Posicionar tabela e scrollbars
-        self.batch_tree.grid(row=0, column=0, sticky="nsew")
-        batch_v_scrollbar.grid(row=0, column=1, sticky="ns")
-        batch_h_scrollbar.grid(row=1, column=0, sticky="ew")
+        # Posicionar tabela (com suas próprias barras de rolagem)
+        self.batch_tree.grid(row=0, column=0, columnspan=2, sticky="nsew")
 
         # Configurar expansão do grid
         batch_table_frame.grid_rowconfigure(0, weight=1)
@@ -533,19 +608,14 @@ class PDFillerApp:
     def load_municipios(self):
         """Carrega os municípios únicos do banco de dados no combobox"""
         try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT DISTINCT cidade FROM empresas WHERE cidade IS NOT NULL ORDER BY cidade")
-            municipios = [row[0] for row in cursor.fetchall()]
+            municipios = self.repository.list_municipios()
             
             # Adicionar opção "Todos os municípios" no início
-            municipios.insert(0, "Todos os municípios")
+            municipios.insert(0, TODOS_MUNICIPIOS)
             
             self.municipio_combobox['values'] = municipios
-            self.municipio_combobox.set("Todos os municípios")  # Valor padrão
-            
-            conn.close()
+            self.municipio_combobox.set(TODOS_MUNICIPIOS)  # Valor padrão
+            self.update_municipality_status()
             
         except sqlite3.Error as e:
             messagebox.showerror("Erro", f"Erro ao carregar municípios: {e}")
@@ -559,84 +629,60 @@ class PDFillerApp:
             return
         
         # Atualizar o label de status
-        if municipio_selecionado == "Todos os municípios":
-            self.municipality_status_label.config(text="Filtro: Todos os municípios")
-        else:
-            self.municipality_status_label.config(text=f"Filtro ativo: {municipio_selecionado}")
+        total_empresas = self.update_municipality_status()
         
         # Aplicar o filtro
         self.load_batch_companies()
         
         # Mostrar mensagem de confirmação
-        if municipio_selecionado == "Todos os municípios":
+        if municipio_selecionado == TODOS_MUNICIPIOS:
             messagebox.showinfo("Filtro Aplicado", "Exibindo empresas de todos os municípios.")
         else:
-            # Contar quantas empresas foram filtradas
-            total_empresas = len(self.batch_tree.get_children())
             messagebox.showinfo("Filtro Aplicado", 
                               f"Filtro aplicado para o município: {municipio_selecionado}\n"
                               f"Total de empresas encontradas: {total_empresas}")
 
+    def update_municipality_status(self):
+        """
+        Atualiza o label do filtro de município com a quantidade de empresas.
+
+        A contagem vem da tabela municipios, sem percorrer as empresas.
+
+        Returns:
+            int: Quantidade de empresas do filtro selecionado.
+        """
+        municipio = self.selected_municipio()
+        try:
+            total_empresas = self.repository.count_companies(municipio)
+        except sqlite3.Error:
+            total_empresas = 0
+        if municipio is None:
+            self.municipality_status_label.config(
+                text=f"Filtro: Todos os municípios ({total_empresas} empresas)")
+        else:
+            self.municipality_status_label.config(
+                text=f"Filtro ativo: {municipio} ({total_empresas} empresas)")
+        return total_empresas
+
     def clear_municipality_filter(self):
         """Limpa o filtro de município"""
-        self.municipio_combobox.set("Todos os municípios")
-        self.batch_filter_municipio_var.set("Todos os municípios")
-        self.municipality_status_label.config(text="Filtro: Todos os municípios")
+        self.municipio_combobox.set(TODOS_MUNICIPIOS)
+        self.batch_filter_municipio_var.set(TODOS_MUNICIPIOS)
+        self.update_municipality_status()
         self.load_batch_companies()
         messagebox.showinfo("Filtro Limpo", "Filtro de município removido. Exibindo todas as empresas.")
 
     def load_batch_companies(self):
         """Carrega as empresas do banco de dados na tabela de lote, aplicando filtro de município"""
-        try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
-            
-            # Construir query com filtro de município
-            municipio_selecionado = self.batch_filter_municipio_var.get()
-            
-            if municipio_selecionado and municipio_selecionado != "Todos os municípios":
-                cursor.execute("""
-                    SELECT cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel, cidade
-                    FROM empresas 
-                    WHERE cidade = ?
-                    ORDER BY razao_social
-                """, (municipio_selecionado,))
-            else:
-                cursor.execute("""
-                    SELECT cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel, cidade
-                    FROM empresas 
-                    ORDER BY razao_social
-                """)
-            
-            companies = cursor.fetchall()
-            
-            # Limpar tabela de lote existente
-            for item in self.batch_tree.get_children():
-                self.batch_tree.delete(item)
-            
-            # Adicionar empresas na tabela de lote
-            for company in companies:
-                cnpj = str(company[0]).replace('.0', '') if company[0] else ''
-                cnpj_formatted = format_cnpj(cnpj) if cnpj else ''
-                
-                razao_social = company[1] or ''
-                nome_fantasia = company[2] or ''
-                telefone = str(company[3]).replace(".0", "") if company[3] else ""
-                endereco = company[4] or ""
-                responsavel = company[5] or ""
-                municipio = company[6] or ""
-                
-                self.batch_tree.insert("", "end", values=(
-                    cnpj_formatted, razao_social, nome_fantasia, 
-                    telefone, endereco, responsavel, municipio
-                ))
-            
-            conn.close()
-            
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro", f"Erro ao carregar empresas: {e}")
+        self.filter_batch_companies()
+
+    def selected_municipio(self):
+        """Município escolhido no filtro do lote, ou None para todos"""
+        municipio_selecionado = self.batch_filter_municipio_var.get()
+        if municipio_selecionado and municipio_selecionado != TODOS_MUNICIPIOS:
+            return municipio_selecionado
+        return None
 
-    # Métodos CRUD para empresas
     def add_company(self):
         """Adiciona uma nova empresa ao banco de dados"""
         # Validar campos obrigatórios
@@ -653,44 +699,36 @@ class PDFillerApp:
             return
         
         try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
-            
             # Verificar se o CNPJ já existe
             cnpj_clean = clean_cnpj(cnpj)
-            cursor.execute("SELECT cnpj FROM empresas WHERE REPLACE(REPLACE(REPLACE(cnpj, '.', ''), '/', ''), '-', '') = ?", (cnpj_clean,))
-            if cursor.fetchone():
+            if self.repository.cnpj_exists(cnpj_clean):
                 messagebox.showerror("Erro", "CNPJ já cadastrado!")
-                conn.close()
                 return
             
             # Inserir nova empresa (adaptado para a estrutura real da tabela)
-            cursor.execute("""
-                INSERT INTO empresas (cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
+            self.repository.add_company(
                 cnpj,
                 razao_social,
                 self.nome_fantasia_var.get().strip(),
                 self.telefone_var.get().strip(),
                 self.endereco_var.get().strip(),
                 self.responsavel_var.get().strip()
-            ))
-            
-            conn.commit()
-            conn.close()
+            )
             
             messagebox.showinfo("Sucesso", "Empresa adicionada com sucesso!")
             self.load_companies()
             self.clear_fields()
             
+        except sqlite3.IntegrityError:
+            # O índice UNIQUE de cnpj rejeita CNPJs duplicados
+            messagebox.showerror("Erro", "CNPJ já cadastrado!")
         except sqlite3.Error as e:
             messagebox.showerror("Erro", f"Erro ao adicionar empresa: {e}")
 
     def update_company(self):
         """Atualiza uma empresa existente no banco de dados"""
         # Verificar se uma empresa está selecionada
-        selection = self.tree.selection()
+        selection = self.tree.selected_rows()
         if not selection:
             messagebox.showwarning("Aviso", "Selecione uma empresa na tabela para atualizar!")
             return
@@ -709,60 +747,51 @@ class PDFillerApp:
             return
         
         try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
+            # Empresa selecionada, pelo id (coluna 0): o CNPJ exibido pode não
+            # ter todos os dígitos do gravado
+            company_id = selection[0][0]
             
-            # Obter CNPJ original da empresa selecionada
-            item = self.tree.item(selection[0])
-            original_cnpj = item['values'][0]
-            original_cnpj_clean = clean_cnpj(original_cnpj)
-            
-            # Se o CNPJ foi alterado, verificar se o novo CNPJ já existe
-            cnpj_clean = clean_cnpj(cnpj)
-            if cnpj_clean != original_cnpj_clean:
-                cursor.execute("SELECT cnpj FROM empresas WHERE REPLACE(REPLACE(REPLACE(cnpj, '.', ''), '/', ''), '-', '') = ?", (cnpj_clean,))
-                if cursor.fetchone():
-                    messagebox.showerror("Erro", "CNPJ já cadastrado para outra empresa!")
-                    conn.close()
-                    return
+            # Verificar se o CNPJ já pertence a outra empresa
+            if self.repository.cnpj_exists(clean_cnpj(cnpj), except_id=company_id):
+                messagebox.showerror("Erro", "CNPJ já cadastrado para outra empresa!")
+                return
             
             # Atualizar empresa (adaptado para a estrutura real da tabela)
-            cursor.execute("""
-                UPDATE empresas 
-                SET cnpj = ?, razao_social = ?, nome_fantasia = ?, telefone = ?, endereco = ?, responsavel = ?
-                WHERE REPLACE(REPLACE(REPLACE(cnpj, ".", ""), "/", ""), "-", "") = ?
-            """, (
+            updated = self.repository.update_company(
+                company_id,
                 cnpj,
                 razao_social,
                 self.nome_fantasia_var.get().strip(),
                 self.telefone_var.get().strip(),
                 self.endereco_var.get().strip(),
-                self.responsavel_var.get().strip(),
-                original_cnpj_clean
-            ))
-            
-            conn.commit()
-            conn.close()
+                self.responsavel_var.get().strip()
+            )
+            if not updated:
+                messagebox.showerror("Erro", "Empresa não encontrada: ela pode ter sido removida.")
+                self.load_companies()
+                return
             
             messagebox.showinfo("Sucesso", "Empresa atualizada com sucesso!")
             self.load_companies()
             self.clear_fields()
             
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Erro", "CNPJ já cadastrado para outra empresa!")
         except sqlite3.Error as e:
             messagebox.showerror("Erro", f"Erro ao atualizar empresa: {e}")
 
     def delete_company(self):
         """Deleta uma empresa do banco de dados"""
         # Verificar se uma empresa está selecionada
-        selection = self.tree.selection()
+        selection = self.tree.selected_rows()
         if not selection:
             messagebox.showwarning("Aviso", "Selecione uma empresa na tabela para deletar!")
             return
         
-        # Obter dados da empresa selecionada
-        item = self.tree.item(selection[0])
-        cnpj = item['values'][0]
-        razao_social = item['values'][1]
+        # Obter dados da empresa selecionada (coluna 0 é o id)
+        company_id = selection[0][0]
+        cnpj = selection[0][1]
+        razao_social = selection[0][2]
         
         # Confirmar exclusão
         if not messagebox.askyesno("Confirmar Exclusão", 
@@ -770,15 +799,11 @@ class PDFillerApp:
             return
         
         try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
-            
             # Deletar empresa
-            cnpj_clean = clean_cnpj(cnpj)
-            cursor.execute("DELETE FROM empresas WHERE REPLACE(REPLACE(REPLACE(cnpj, '.', ''), '/', ''), '-', '') = ?", (cnpj_clean,))
-            
-            conn.commit()
-            conn.close()
+            if not self.repository.delete_company(company_id):
+                messagebox.showerror("Erro", "Empresa não encontrada: ela pode ter sido removida.")
+                self.load_companies()
+                return
             
             messagebox.showinfo("Sucesso", "Empresa deletada com sucesso!")
             self.load_companies()
@@ -805,19 +830,20 @@ class PDFillerApp:
             self.batch_output_dir_path.set(directory)
 
     def select_all_companies(self):
-        """Seleciona todas as empresas na tabela de lote"""
-        for item in self.batch_tree.get_children():
-            self.batch_tree.selection_add(item)
+        """Seleciona todas as empresas na tabela de lote (inclusive as fora da área visível)"""
+        try:
+            self.batch_tree.select_all()
+        except sqlite3.Error as e:
+            messagebox.showerror("Erro", f"Erro ao selecionar empresas: {e}")
 
     def deselect_all_companies(self):
         """Desmarca todas as empresas na tabela de lote"""
-        self.batch_tree.selection_remove(self.batch_tree.selection())
+        self.batch_tree.clear_selection()
 
     def fill_batch_pdfs(self):
         """Preenche PDFs em lote para as empresas selecionadas"""
         # Validar seleção
-        selected_items = self.batch_tree.selection()
-        if not selected_items:
+        if not self.batch_tree.selected:
             messagebox.showwarning("Aviso", "Selecione pelo menos uma empresa para preencher!")
             return
 
@@ -834,16 +860,16 @@ class PDFillerApp:
             return
 
         # Verificar se o template existe
-        template_path = "formulario.pdf"
+        template_path = TEMPLATE_PDF
         if not os.path.exists(template_path):
             messagebox.showerror("Erro", f"Arquivo template não encontrado: {template_path}")
             return
 
         try:
-            # Coletar dados das empresas selecionadas
+            # Coletar dados das empresas selecionadas (linhas: id e colunas da tabela)
             empresas_selecionadas = []
-            for item in selected_items:
-                values = self.batch_tree.item(item)['values']
+            for row in self.batch_tree.selected_rows():
+                values = row[1:]
                 empresa_data = {
                     'cnpj': values[0],
                     'razao_social': values[1],
@@ -857,6 +883,9 @@ class PDFillerApp:
 
             total_empresas = len(empresas_selecionadas)
             sucessos = 0
+            ignorados = 0
+            bytes_gravados = 0
+            bytes_economizados = 0
             erros = []
 
             # Criar janela de progresso
@@ -885,47 +914,67 @@ class PDFillerApp:
             status_label = tk.Label(progress_window, text="Iniciando...", font=("Arial", 10))
             status_label.pack(pady=5)
 
-            # Processar cada empresa selecionada
-            for i, empresa_data in enumerate(empresas_selecionadas):
-                cnpj_formatted = empresa_data['cnpj']
-                razao_social = empresa_data['razao_social']
-                nome_fantasia = empresa_data['nome_fantasia']
-                telefone = empresa_data['telefone']
-                endereco = empresa_data['endereco']
-                responsavel = empresa_data['responsavel']
-                
-                # Atualizar interface
+            # Preparar dados para preenchimento
+            registros = []
+            for empresa_data in empresas_selecionadas:
+                # O Treeview devolve valores numéricos como int; converter para texto
+                registros.append({
+                    'cnpj': str(empresa_data['cnpj']),
+                    'razao_social': str(empresa_data['razao_social'] or ''),
+                    'nome_fantasia': str(empresa_data['nome_fantasia'] or ''),
+                    'telefone': str(empresa_data['telefone'] or ''),
+                    'endereco': str(empresa_data['endereco'] or ''),
+                    'responsavel': str(empresa_data['responsavel'] or ''),
+                    'data_feriado': data_feriado
+                })
+
+            def atualizar_progresso(i, razao_social):
                 progress_label.config(text=f"Processando empresa {i+1} de {total_empresas}")
                 status_label.config(text=f"Empresa: {razao_social[:40]}...")
                 progress_bar['value'] = i + 1
                 progress_window.update()
 
+            modo_saida = self.batch_output_mode_var.get()
+            pdf_filler = load_pdf_filler()
+            write_mode = (pdf_filler.WRITE_COMPACT if self.batch_optimize_var.get()
+                          else pdf_filler.WRITE_PLAIN)
+            # Tempos por etapa de cada PDF, para o relatório do lote
+            estatisticas = pdf_filler.FillStats()
+            data_arquivo = data_feriado.replace('/', '-').replace('\\', '-')
+            nome_lote = os.path.join(output_dir, f"feriado preenchido - lote {data_arquivo}")
+
+            if modo_saida == "merged":
+                # Um único PDF com uma página por empresa
+                output_path = f"{nome_lote}.pdf"
                 try:
-                    # Preparar dados para preenchimento
-                    data = {
-                        'cnpj': cnpj_formatted,
-                        'razao_social': razao_social or '',
-                        'nome_fantasia': nome_fantasia or '',
-                        'telefone': telefone or '',
-                        'endereco': endereco or '',
-                        'responsavel': responsavel or '',
-                        'data_feriado': data_feriado
-                    }
-
-                    # Nome do arquivo de saída
-                    nome_arquivo_limpo = razao_social.replace('/', '_').replace('\\', '_')
-                    nome_arquivo = f"{nome_arquivo_limpo[:50]}.pdf"
-                    output_path = os.path.join(output_dir, nome_arquivo)
-
-                    # Preencher PDF
-                    if os.path.exists(template_path):
-                        fill_pdf_document(template_path, output_dir, data)
+                    pdf_filler.fill_pdf_merged(template_path, output_path, registros,
+                                               lambda i, data: atualizar_progresso(i, data['razao_social']),
+                                               write_mode=write_mode, stats=estatisticas)
+                    sucessos = total_empresas
+                    bytes_gravados = os.path.getsize(output_path)
+                except Exception as e:
+                    erros.append(f"PDF único: {str(e)}")
+            else:
+                # Processar as empresas em paralelo, atualizando a interface a cada resultado;
+                # no modo ZIP cada PDF é gravado direto no arquivo à medida que fica pronto
+                zip_path = f"{nome_lote}.zip" if modo_saida == "zip" else None
+                resultados = pdf_filler.fill_pdf_batch(template_path, output_dir, registros,
+                                                       zip_path=zip_path, write_mode=write_mode,
+                                                       stats=estatisticas)
+                for i, resultado in enumerate(resultados):
+                    razao_social = resultado.data['razao_social']
+
+                    if resultado.skipped:
+                        ignorados += 1
+                    elif resultado.error is None:
                         sucessos += 1
+                        bytes_gravados += resultado.size
+                        bytes_economizados += resultado.saved
                     else:
-                        erros.append(f"{razao_social}: Arquivo template não encontrado")
+                        erros.append(f"{razao_social}: {resultado.error}")
 
-                except Exception as e:
-                    erros.append(f"{razao_social}: {str(e)}")
+                    # Atualizar interface
+                    atualizar_progresso(i, razao_social)
 
             # Fechar janela de progresso
             progress_window.destroy()
@@ -934,6 +983,23 @@ class PDFillerApp:
             relatorio = f"Processamento concluído!\n\n"
             relatorio += f"Total de empresas selecionadas: {total_empresas}\n"
             relatorio += f"PDFs criados com sucesso: {sucessos}\n"
+            if ignorados:
+                relatorio += f"PDFs sem alterações (mantidos): {ignorados}\n"
+            if bytes_gravados:
+                relatorio += f"Tamanho gerado: {bytes_gravados / (1024 * 1024):.2f} MB\n"
+            if bytes_economizados:
+                relatorio += (f"Economia com a otimização: {bytes_economizados / (1024 * 1024):.2f} MB "
+                              f"({bytes_economizados * 100 / (bytes_gravados + bytes_economizados):.1f}%)\n")
+            etapas = estatisticas.summary()["stages"]
+            if etapas and estatisticas.documents:
+                nomes_etapas = (("template", "modelo"), ("overlay", "textos"),
+                                ("merge", "montagem"), ("write", "gravação"))
+                detalhes = ", ".join(
+                    f"{nome} {etapas[etapa]['total_ms'] / estatisticas.documents:.1f} ms"
+                    for etapa, nome in nomes_etapas if etapa in etapas)
+                relatorio += (f"Tempo médio por PDF: "
+                              f"{estatisticas.total() * 1000 / estatisticas.documents:.1f} ms "
+                              f"({detalhes})\n")
             relatorio += f"Erros: {len(erros)}\n\n"
 
             if erros:
@@ -949,67 +1015,133 @@ class PDFillerApp:
             messagebox.showerror("Erro", f"Erro durante o processamento: {e}")
 
     def search_and_fill_company(self):
-        """Pesquisa empresa e preenche campos automaticamente"""
+        """
+        Pesquisa empresa e preenche campos automaticamente.
+
+        A pesquisa roda em segundo plano; enquanto isso o botão mostra
+        "Pesquisando…", e uma nova pesquisa descarta a anterior.
+        """
         search_term = self.search_term_var.get().strip()
         
         if not search_term:
             messagebox.showwarning("Aviso", "Por favor, digite um CNPJ ou razão social para pesquisar.")
             return
         
-        try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
-            
-            # Remover caracteres especiais do CNPJ se for numérico
-            search_term_clean = ''.join(filter(str.isdigit, search_term))
-            
-            # Pesquisar por CNPJ (exato) ou razão social/nome fantasia (parcial)
-            cursor.execute("""
-                SELECT cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel
-                FROM empresas 
-                WHERE REPLACE(REPLACE(REPLACE(cnpj, ".", ""), "/", ""), "-", "") LIKE ? 
-                   OR UPPER(razao_social) LIKE UPPER(?) 
-                   OR UPPER(nome_fantasia) LIKE UPPER(?)
-                ORDER BY 
-                    CASE 
-                        WHEN REPLACE(REPLACE(REPLACE(cnpj, ".", ""), "/", ""), "-", "") = ? THEN 1
-                        WHEN UPPER(razao_social) = UPPER(?) THEN 2
-                        WHEN UPPER(nome_fantasia) = UPPER(?) THEN 3
-                        ELSE 4
-                    END
-                LIMIT 1
-            """, (f'%{search_term_clean}%', f'%{search_term}%', f'%{search_term}%', 
-                  search_term_clean, search_term, search_term))
-            
-            result = cursor.fetchone()
-            
-            if result:
-                # Preencher os campos com os dados encontrados
-                cnpj = str(result[0]).replace('.0', '') if result[0] else ''
-                cnpj_formatted = format_cnpj(cnpj) if cnpj else ''
-                
-                self.cnpj_var.set(cnpj_formatted)
-                self.razao_social_var.set(result[1] or '')
-                self.nome_fantasia_var.set(result[2] or '')
-                self.telefone_var.set(str(result[3]).replace('.0', '') if result[3] else '')
-                self.endereco_var.set(result[4] or '')
-                self.responsavel_var.set(result[5] or '')
-                
-                messagebox.showinfo("Empresa Encontrada", f"Dados da empresa '{result[1]}' foram preenchidos automaticamente!")
-            else:
-                messagebox.showwarning("Não Encontrado", "Nenhuma empresa encontrada com os critérios informados.")
-            
-            conn.close()
-            
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro", f"Erro ao pesquisar empresa: {e}")
+        # Pesquisar por CNPJ (exato) ou razão social/nome fantasia (por semelhança)
+        self.search_button.config(text="Pesquisando…", state="disabled")
+        self.executor.submit("search_and_fill_company",
+                             lambda: self.repository.find_companies(search_term),
+                             self.show_found_companies, self.show_search_error)
+
+    def show_found_companies(self, found):
+        """
+        Trata o resultado de search_and_fill_company: uma empresa é preenchida
+        direto; várias (ou uma de uma busca interrompida) são mostradas em
+        uma lista para o usuário escolher.
+        """
+        self.search_button.config(text="Pesquisar e Preencher", state="normal")
+        results, exact = found
+        if not results:
+            messagebox.showwarning("Não Encontrado", "Nenhuma empresa encontrada com os critérios informados.")
+        elif len(results) == 1 and exact:
+            self.fill_found_company(results[0][1])
+        else:
+            self.show_company_choices(results, exact)
+
+    def fill_found_company(self, result):
+        """Preenche os campos com a linha da empresa encontrada"""
+        # Preencher os campos com os dados encontrados (já formatados no banco)
+        self.cnpj_var.set(result[0])
+        self.razao_social_var.set(result[1])
+        self.nome_fantasia_var.set(result[2])
+        self.telefone_var.set(result[3])
+        self.endereco_var.set(result[4])
+        self.responsavel_var.set(result[5])
+        
+        messagebox.showinfo("Empresa Encontrada", f"Dados da empresa '{result[1]}' foram preenchidos automaticamente!")
+
+    def show_company_choices(self, results, exact=True):
+        """
+        Mostra as empresas encontradas, da mais parecida para a menos, para o
+        usuário escolher qual preencher (duplo clique, Enter ou "Preencher").
+
+        Args:
+            results (list): Pares (semelhança ou None, linha da empresa), como
+                            devolvidos por CompanyRepository.find_companies.
+            exact (bool): False se a busca parou no limite de tempo.
+        """
+        choices_window = tk.Toplevel(self.master)
+        choices_window.title("Selecionar Empresa")
+        choices_window.geometry("800x320")
+        choices_window.transient(self.master)
+        choices_window.grab_set()
+
+        # Centralizar janela
+        choices_window.update_idletasks()
+        x = (choices_window.winfo_screenwidth() // 2) - (800 // 2)
+        y = (choices_window.winfo_screenheight() // 2) - (320 // 2)
+        choices_window.geometry(f"800x320+{x}+{y}")
+
+        message = f"{len(results)} empresas parecidas com a pesquisa. Selecione uma:"
+        if not exact:
+            message += ("\nResultado aproximado (pesquisa interrompida pelo tempo): "
+                        "pode haver empresas mais parecidas; use menos palavras ou mais específicas.")
+        ttk.Label(choices_window, text=message,
+                  font=("Arial", 11)).pack(anchor="w", padx=10, pady=(10, 5))
+
+        table_frame = ttk.Frame(choices_window)
+        table_frame.pack(fill="both", expand=True, padx=10)
+        columns = ("Semelhança", "CNPJ", "Razão Social", "Nome Fantasia", "Município")
+        choices_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=8, selectmode="browse")
+        for col in columns:
+            choices_tree.heading(col, text=col)
+        choices_tree.column("Semelhança", width=90, minwidth=80, anchor="center")
+        choices_tree.column("CNPJ", width=140, minwidth=120)
+        choices_tree.column("Razão Social", width=240, minwidth=150)
+        choices_tree.column("Nome Fantasia", width=180, minwidth=120)
+        choices_tree.column("Município", width=120, minwidth=100)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=choices_tree.yview)
+        choices_tree.configure(yscrollcommand=scrollbar.set)
+        choices_tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        rows = {}
+        for score, row in results:
+            similarity = "" if score is None else f"{score:.0%}"
+            item = choices_tree.insert("", "end", values=(similarity, row[0], row[1], row[2] or "", row[6] or ""))
+            rows[item] = row
+        first = choices_tree.get_children()[0]
+        choices_tree.selection_set(first)
+        choices_tree.focus(first)
+        choices_tree.focus_set()
+
+        def choose(event=None):
+            selection = choices_tree.selection()
+            if not selection:
+                return
+            row = rows[selection[0]]
+            choices_window.destroy()
+            self.fill_found_company(row)
+
+        choices_tree.bind("<Double-1>", choose)
+        choices_tree.bind("<Return>", choose)
+        choices_window.bind("<Escape>", lambda event: choices_window.destroy())
+
+        button_frame = ttk.Frame(choices_window)
+        button_frame.pack(fill="x", padx=10, pady=10)
+        ttk.Button(button_frame, text="Cancelar", command=choices_window.destroy).pack(side="right", padx=5)
+        ttk.Button(button_frame, text="Preencher", command=choose).pack(side="right", padx=5)
+
+    def show_search_error(self, error):
+        """Mostra o erro de search_and_fill_company"""
+        self.search_button.config(text="Pesquisar e Preencher", state="normal")
+        self.show_error("Erro ao pesquisar empresa", error)
 
     def on_company_select(self, event):
         """Manipula a seleção de uma empresa na tabela"""
-        selection = self.tree.selection()
+        selection = self.tree.selected_rows()
         if selection:
-            item = self.tree.item(selection[0])
-            values = item['values']
+            values = selection[0][1:]
             
             # Preencher os campos com os dados da empresa selecionada
             self.cnpj_var.set(values[0])
@@ -1019,159 +1151,76 @@ class PDFillerApp:
             self.endereco_var.set(values[4])
             self.responsavel_var.set(values[5])
 
+    def disable_database_widgets(self):
+        """
+        Desativa o que depende do banco quando ele não pôde ser aberto.
+
+        A aba de lote fica inteira desativada; na aba individual, a pesquisa,
+        o cadastro e os filtros da tabela. O preenchimento manual do PDF
+        continua disponível.
+        """
+        for widget in self.database_widgets:
+            widget.state(["disabled"])
+        self.notebook.tab(self.batch_frame, state="disabled")
+
     def load_companies(self):
-        """Carrega as empresas do banco de dados na tabela"""
-        # Limpar tabela
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel FROM empresas ORDER BY razao_social")
-            companies = cursor.fetchall()
-            
-            # Adicionar empresas na tabela
-            for company in companies:
-                cnpj = str(company[0]).replace('.0', '') if company[0] else ''
-                cnpj_formatted = format_cnpj(cnpj) if cnpj else ''
-                
-                razao_social = company[1] or ''
-                nome_fantasia = company[2] or ''
-                telefone = str(company[3]).replace(".0", "") if company[3] else ""
-                endereco = company[4] or ""
-                responsavel = company[5] or ""
-                
-                self.tree.insert("", "end", values=(
-                    cnpj_formatted, razao_social, nome_fantasia, 
-                    telefone, endereco, responsavel
-                ))
-            
-            conn.close()
-            
-            # Também carregar na tabela de lote
-            self.load_batch_companies()
-            
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro", f"Erro ao carregar empresas: {e}")
+        """
+        Recarrega as duas tabelas após gravações no cadastro.
+
+        As tabelas são virtuais: apenas as linhas visíveis são lidas do banco,
+        mantendo a posição, os filtros e a seleção de cada uma. A releitura
+        roda em segundo plano; erros chegam a show_load_error.
+        """
+        self.tree.refresh()
+        self.batch_tree.refresh()
+
+    def show_load_error(self, error):
+        """Mostra o erro de uma releitura das tabelas de empresas"""
+        self.show_error("Erro ao carregar empresas", error)
+
+    def show_error(self, message, error):
+        """
+        Mostra um erro vindo de uma tarefa em segundo plano (ver QueryExecutor)
+        ou de um callback do Tk, e grava o traceback em LOG_FILE.
+
+        Args:
+            message (str): Descrição do que falhou.
+            error (BaseException): Exceção ocorrida.
+        """
+        logger.error(message, exc_info=(type(error), error, error.__traceback__))
+        if isinstance(error, sqlite3.Error):
+            messagebox.showerror("Erro", f"{message}: {error}")
+        else:
+            messagebox.showerror("Erro", f"{message}: {type(error).__name__}: {error}\n\n"
+                                         f"Detalhes em {os.path.abspath(LOG_FILE)}")
+
+    def report_callback_exception(self, exc_type, exc_value, exc_traceback):
+        """Substitui o tratamento padrão do Tk, que só escreve no stderr"""
+        self.show_error("Erro inesperado", exc_value.with_traceback(exc_traceback))
 
     def filter_companies(self, *args):
-        """Filtra as empresas na tabela individual"""
-        cnpj_filter = self.filter_cnpj_var.get().lower()
-        razao_social_filter = self.filter_razao_social_var.get().lower()
-        
-        # Limpar tabela
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
-            
-            # Construir query com filtros
-            query = """
-                SELECT cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel
-                FROM empresas 
-                WHERE 1=1
-            """
-            params = []
-            
-            if cnpj_filter:
-                query += " AND LOWER(cnpj) LIKE ?"
-                params.append(f'%{cnpj_filter}%')
-            
-            if razao_social_filter:
-                query += " AND (LOWER(razao_social) LIKE ? OR LOWER(nome_fantasia) LIKE ?)"
-                params.append(f'%{razao_social_filter}%')
-                params.append(f'%{razao_social_filter}%')
-            
-            query += " ORDER BY razao_social"
-            
-            cursor.execute(query, params)
-            companies = cursor.fetchall()
-            
-            # Adicionar empresas filtradas na tabela
-            for company in companies:
-                cnpj = str(company[0]).replace('.0', '') if company[0] else ''
-                cnpj_formatted = format_cnpj(cnpj) if cnpj else ''
-                
-                razao_social = company[1] or ''
-                nome_fantasia = company[2] or ''
-                telefone = str(company[3]).replace(".0", "") if company[3] else ""
-                endereco = company[4] or ""
-                responsavel = company[5] or ""
-                
-                self.tree.insert("", "end", values=(
-                    cnpj_formatted, razao_social, nome_fantasia, 
-                    telefone, endereco, responsavel
-                ))
-            
-            conn.close()
-            
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro", f"Erro ao filtrar empresas: {e}")
+        """
+        Filtra as empresas na tabela individual.
+
+        Chamado a cada tecla digitada nos filtros: a busca é adiada até a
+        digitação parar e roda em segundo plano (ver VirtualTreeview.refresh_later).
+        """
+        self.tree.source.set_filters(self.filter_cnpj_var.get(), self.filter_razao_social_var.get())
+        self.tree.refresh_later()
 
     def filter_batch_companies(self, *args):
-        """Filtra as empresas na tabela de lote"""
-        cnpj_filter = self.batch_filter_cnpj_var.get().lower()
-        razao_social_filter = self.batch_filter_razao_social_var.get().lower()
-        municipio_filter = self.batch_filter_municipio_var.get()
-        
-        # Limpar tabela
-        for item in self.batch_tree.get_children():
-            self.batch_tree.delete(item)
-        
-        try:
-            conn = sqlite3.connect('empresas.db')
-            cursor = conn.cursor()
-            
-            # Construir query com filtros
-            query = """
-                SELECT cnpj, razao_social, nome_fantasia, telefone, endereco, responsavel, cidade
-                FROM empresas 
-                WHERE 1=1
-            """
-            params = []
-            
-            if cnpj_filter:
-                query += " AND LOWER(cnpj) LIKE ?"
-                params.append(f'%{cnpj_filter}%')
-            
-            if razao_social_filter:
-                query += " AND (LOWER(razao_social) LIKE ? OR LOWER(nome_fantasia) LIKE ?)"
-                params.append(f'%{razao_social_filter}%')
-                params.append(f'%{razao_social_filter}%')
-            
-            if municipio_filter and municipio_filter != "Todos os municípios":
-                query += " AND cidade = ?"
-                params.append(municipio_filter)
-            
-            query += " ORDER BY razao_social"
-            
-            cursor.execute(query, params)
-            companies = cursor.fetchall()
-            
-            # Adicionar empresas filtradas na tabela
-            for company in companies:
-                cnpj = str(company[0]).replace('.0', '') if company[0] else ''
-                cnpj_formatted = format_cnpj(cnpj) if cnpj else ''
-                
-                razao_social = company[1] or ''
-                nome_fantasia = company[2] or ''
-                telefone = str(company[3]).replace(".0", "") if company[3] else ""
-                endereco = company[4] or ""
-                responsavel = company[5] or ""
-                municipio = company[6] or ""
-                
-                self.batch_tree.insert("", "end", values=(
-                    cnpj_formatted, razao_social, nome_fantasia, 
-                    telefone, endereco, responsavel, municipio
-                ))
-            
-            conn.close()
-            
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro", f"Erro ao filtrar empresas: {e}")
+        """Filtra as empresas na tabela de lote (como filter_companies)"""
+        self.batch_tree.source.set_filters(self.batch_filter_cnpj_var.get(),
+                                           self.batch_filter_razao_social_var.get(),
+                                           self.selected_municipio())
+        self.batch_tree.refresh_later()
+
+    def on_destroy(self, event):
+        """Fecha a conexão com o banco quando a janela principal é destruída"""
+        if event.widget is self.master:
+            self.executor.close()
+            if self.repository is not None:
+                self.repository.close()
 
     def format_cnpj_on_type(self, event):
         """Formata o CNPJ enquanto o usuário digita"""
@@ -1213,7 +1262,7 @@ class PDFillerApp:
             return
         
         # Verificar se o template existe
-        template_path = "formulario.pdf"
+        template_path = TEMPLATE_PDF
         if not os.path.exists(template_path):
             messagebox.showerror("Erro", f"Arquivo template não encontrado: {template_path}")
             return
@@ -1231,7 +1280,7 @@ class PDFillerApp:
             }
             
             # Preencher PDF
-            fill_pdf_document(template_path, output_dir, data)
+            load_pdf_filler().fill_pdf_document(template_path, output_dir, data)
             
             messagebox.showinfo("Sucesso", f"PDF preenchido com sucesso!\nSalvo em: {output_dir}")
             
@@ -1239,8 +1288,16 @@ class PDFillerApp:
             messagebox.showerror("Erro", f"Erro ao preencher PDF: {e}")
 
 def main():
+    # Necessário para o pool de processos no executável gerado pelo PyInstaller
+    multiprocessing.freeze_support()
+    handler = logging.FileHandler(LOG_FILE, encoding="utf-8", delay=True)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.getLogger().addHandler(handler)
     root = tk.Tk()
     app = PDFillerApp(root)
+    root.report_callback_exception = app.report_callback_exception
+    # Com a janela já desenhada, carregar pypdf/reportlab em segundo plano
+    root.after_idle(lambda: threading.Thread(target=_warm_up_pdf_filler, daemon=True).start())
     root.mainloop()
 
 if __name__ == "__main__":
@@ -5,7 +5,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('logo.png', '.'), ('empresas.db', '.'), ('cnpj_formatter.py', '.'), ('pdf_mapping.py', '.'), ('pdf_filler.py', '.'), ('formulario.pdf', '.')],
+    datas=[('logo.png', '.'), ('empresas.db', '.'), ('cnpj_formatter.py', '.'), ('pdf_mapping.py', '.'), ('company_repository.py', '.'), ('company_index.py', '.'), ('migrations.py', '.'), ('pdf_layout.py', '.'), ('pdf_optimize.py', '.'), ('pdf_stats.py', '.'), ('pdf_filler.py', '.'), ('virtual_tree.py', '.'), ('query_executor.py', '.'), ('formulario.pdf', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,456 @@
+# migrations.py
+
+import sqlite3
+import unicodedata
+
+from cnpj_formatter import format_cnpj
+
+
+def _number_text(value):
+    """Texto de um número, sem o ".0" dos valores gravados como float (8132242689.0)"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        value = f"{value:.0f}"
+    text = str(value).strip()
+    return text[:-2] if text.endswith(".0") else text
+
+
+def clean_number(value):
+    """
+    Reduz um número (telefone, CNPJ, número do endereço) aos seus dígitos.
+
+    Aceita também valores gravados como float pela planilha de origem
+    (8132242689.0 ou "8132242689.0"), sem transformar o ".0" em um dígito.
+
+    Returns:
+        str: Apenas os dígitos ('' se não houver nenhum).
+    """
+    return "".join(filter(str.isdigit, _number_text(value)))
+
+
+def normalize_cnpj(value):
+    """
+    CNPJ apenas com dígitos, como gravado na coluna empresas.cnpj.
+
+    A quantidade de dígitos não é alterada: o formulário usa a máscara
+    X.XXX.XXX/YYYY-ZZ (13 dígitos) e o cadastro tem também CPFs (11).
+
+    Returns:
+        str: Os dígitos do CNPJ, ou None se não houver nenhum.
+    """
+    return clean_number(value) or None
+
+
+def display_cnpj(value):
+    """
+    CNPJ como exibido nas tabelas, gravado em empresas.cnpj_formatado.
+
+    Returns:
+        str: O CNPJ formatado por format_cnpj, ou o valor como digitado se
+             não tiver 14 dígitos ('' se vazio).
+    """
+    return format_cnpj(_number_text(value))
+
+
+def clean_text(value):
+    """Texto sem espaços nas pontas; None vira ''"""
+    return str(value).strip() if value is not None else ""
+
+
+def municipio_key(name):
+    """
+    Nome de município para comparação, sem acentos, maiúsculas ou espaços
+    extras: "ILHA DE ITAMARACA" (Receita) e "Ilha de Itamaracá" coincidem.
+    """
+    text = unicodedata.normalize("NFKD", clean_text(name))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.casefold().split())
+
+
+def _digits_sql(column):
+    """Expressão SQL que reduz um CNPJ aos seus dígitos (remove . / - e espaços)"""
+    return (f"NULLIF(REPLACE(REPLACE(REPLACE(REPLACE({column}, '.', ''), '/', ''), '-', ''), "
+            f"' ', ''), '')")
+
+
+def _migration_001_cnpj_digits(conn):
+    """
+    Coluna cnpj_digits: o CNPJ apenas com dígitos, com índice UNIQUE.
+
+    Substitui as comparações com REPLACE(cnpj, ...) em cada linha por uma
+    busca no índice e faz o próprio banco rejeitar CNPJs duplicados. Os
+    triggers mantêm a coluna atualizada em qualquer gravação de cnpj.
+    """
+    conn.execute("ALTER TABLE empresas ADD COLUMN cnpj_digits TEXT")
+    conn.execute(f"UPDATE empresas SET cnpj_digits = {_digits_sql('cnpj')}")
+    conn.execute("CREATE UNIQUE INDEX idx_empresas_cnpj_digits ON empresas(cnpj_digits)")
+    conn.execute(f"""
+        CREATE TRIGGER empresas_cnpj_digits_insert AFTER INSERT ON empresas
+        BEGIN
+            UPDATE empresas SET cnpj_digits = {_digits_sql('NEW.cnpj')}
+            WHERE rowid = NEW.rowid;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER empresas_cnpj_digits_update AFTER UPDATE OF cnpj ON empresas
+        BEGIN
+            UPDATE empresas SET cnpj_digits = {_digits_sql('NEW.cnpj')}
+            WHERE rowid = NEW.rowid;
+        END
+    """)
+
+
+def fts5_available(conn):
+    """Verifica se o SQLite em uso foi compilado com o módulo FTS5"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# Triggers de sincronia do índice FTS (ver create_fulltext_triggers)
+FULLTEXT_TRIGGERS = ("empresas_fts_insert", "empresas_fts_delete", "empresas_fts_update")
+
+
+def drop_fulltext_triggers(conn):
+    """
+    Remove os triggers de sincronia do índice FTS.
+
+    Usado pelas gravações em massa, que atualizam o índice de uma só vez e
+    recriam os triggers na mesma transação (ver CompanyRepository).
+    """
+    for name in FULLTEXT_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_fulltext_triggers(conn):
+    """Triggers que mantêm empresas_fts em sincronia com a tabela empresas"""
+    conn.execute("""
+        CREATE TRIGGER empresas_fts_insert AFTER INSERT ON empresas
+        BEGIN
+            INSERT INTO empresas_fts(rowid, razao_social, nome_fantasia)
+            VALUES (NEW.rowid, NEW.razao_social, NEW.nome_fantasia);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER empresas_fts_delete AFTER DELETE ON empresas
+        BEGIN
+            INSERT INTO empresas_fts(empresas_fts, rowid, razao_social, nome_fantasia)
+            VALUES ('delete', OLD.rowid, OLD.razao_social, OLD.nome_fantasia);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER empresas_fts_update AFTER UPDATE OF razao_social, nome_fantasia ON empresas
+        BEGIN
+            INSERT INTO empresas_fts(empresas_fts, rowid, razao_social, nome_fantasia)
+            VALUES ('delete', OLD.rowid, OLD.razao_social, OLD.nome_fantasia);
+            INSERT INTO empresas_fts(rowid, razao_social, nome_fantasia)
+            VALUES (NEW.rowid, NEW.razao_social, NEW.nome_fantasia);
+        END
+    """)
+
+
+def _migration_002_fulltext(conn):
+    """
+    Índice de texto completo (FTS5) sobre razão social e nome fantasia.
+
+    A tabela empresas_fts usa a própria tabela empresas como conteúdo
+    (content='empresas'), guardando apenas o índice. O tokenizador
+    unicode61 com remove_diacritics 2 ignora maiúsculas e acentos ("sao"
+    encontra "SÃO") e os índices de prefixo de 2 e 3 caracteres aceleram
+    as buscas enquanto o usuário digita. Os triggers mantêm o índice em
+    sincronia com inserções, alterações e exclusões.
+
+    Sem FTS5 no SQLite em uso, nada é criado e as buscas continuam por LIKE.
+    """
+    if not fts5_available(conn):
+        return
+    # O índice referencia empresas.rowid; se um VACUUM renumerar as linhas,
+    # INSERT INTO empresas_fts(empresas_fts) VALUES('rebuild') o reconstrói
+    conn.execute("""
+        CREATE VIRTUAL TABLE empresas_fts USING fts5(
+            razao_social, nome_fantasia,
+            content='empresas', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    conn.execute("INSERT INTO empresas_fts(empresas_fts) VALUES('rebuild')")
+    create_fulltext_triggers(conn)
+
+
+def _create_municipio_link_triggers(conn):
+    """Triggers que vinculam cada empresa ao seu município, criando-o se for novo"""
+    # NOT EXISTS em vez de INSERT OR IGNORE: a cláusula ON CONFLICT da
+    # instrução que dispara o trigger (um upsert, por exemplo) prevaleceria
+    # sobre o OR IGNORE
+    for event in ("INSERT", "UPDATE OF cidade"):
+        name = "insert" if event == "INSERT" else "update"
+        conn.execute(f"""
+            CREATE TRIGGER empresas_municipio_{name} AFTER {event} ON empresas
+            BEGIN
+                INSERT INTO municipios (nome)
+                SELECT TRIM(NEW.cidade)
+                WHERE TRIM(NEW.cidade) <> ''
+                  AND NOT EXISTS (SELECT 1 FROM municipios WHERE nome = TRIM(NEW.cidade));
+                UPDATE empresas
+                SET municipio_id = (SELECT id FROM municipios WHERE nome = TRIM(NEW.cidade)),
+                    cidade = (SELECT nome FROM municipios WHERE nome = TRIM(NEW.cidade))
+                WHERE rowid = NEW.rowid;
+            END
+        """)
+
+
+def _create_municipio_triggers(conn):
+    """Triggers que vinculam cada empresa ao seu município e mantêm as contagens"""
+    _create_municipio_link_triggers(conn)
+
+    # Contagens: acompanham as mudanças de municipio_id
+    conn.execute("""
+        CREATE TRIGGER municipios_count_insert AFTER INSERT ON empresas
+        WHEN NEW.municipio_id IS NOT NULL
+        BEGIN
+            UPDATE municipios SET empresas = empresas + 1 WHERE id = NEW.municipio_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER municipios_count_delete AFTER DELETE ON empresas
+        WHEN OLD.municipio_id IS NOT NULL
+        BEGIN
+            UPDATE municipios SET empresas = empresas - 1 WHERE id = OLD.municipio_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER municipios_count_update AFTER UPDATE OF municipio_id ON empresas
+        WHEN OLD.municipio_id IS NOT NEW.municipio_id
+        BEGIN
+            UPDATE municipios SET empresas = empresas - 1 WHERE id = OLD.municipio_id;
+            UPDATE municipios SET empresas = empresas + 1 WHERE id = NEW.municipio_id;
+        END
+    """)
+
+
+def _migration_003_municipios(conn):
+    """
+    Tabela municipios, normalizada, com a contagem de empresas de cada um.
+
+    Os nomes vêm de empresas.cidade sem espaços nas pontas e sem distinção
+    de maiúsculas ("Recife " e "Recife" viram um único município); a
+    coluna cidade das empresas passa a usar o nome normalizado. Cada
+    empresa aponta para seu município por municipio_id (indexado) e os
+    triggers mantêm o vínculo e as contagens em qualquer gravação.
+    """
+    conn.execute("""
+        CREATE TABLE municipios (
+            id INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            empresas INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("ALTER TABLE empresas ADD COLUMN municipio_id INTEGER REFERENCES municipios(id)")
+    conn.execute("""
+        INSERT OR IGNORE INTO municipios (nome)
+        SELECT TRIM(cidade) FROM empresas WHERE TRIM(cidade) <> '' ORDER BY rowid
+    """)
+    conn.execute("""
+        UPDATE empresas
+        SET municipio_id = (SELECT id FROM municipios WHERE nome = TRIM(empresas.cidade))
+        WHERE TRIM(cidade) <> ''
+    """)
+    conn.execute("""
+        UPDATE empresas
+        SET cidade = CASE WHEN municipio_id IS NULL THEN NULL
+                          ELSE (SELECT nome FROM municipios WHERE id = empresas.municipio_id) END
+    """)
+    conn.execute("CREATE INDEX idx_empresas_municipio ON empresas(municipio_id)")
+    conn.execute("""
+        UPDATE municipios
+        SET empresas = (SELECT COUNT(*) FROM empresas WHERE municipio_id = municipios.id)
+    """)
+
+    _create_municipio_triggers(conn)
+
+
+def _clean_company_row(row):
+    """Limpa uma linha da tabela empresas antiga para a tabela da migração 4"""
+    (rowid, cnpj, razao_social, email, celular, nome_fantasia, telefone, endereco, numero,
+     complemento, bairro, cidade, responsavel, municipio_id) = row
+    return (rowid, normalize_cnpj(cnpj), display_cnpj(cnpj), clean_text(razao_social),
+            clean_text(nome_fantasia), clean_number(telefone), clean_number(celular),
+            clean_text(email), clean_text(endereco), clean_number(numero),
+            clean_text(complemento), clean_text(bairro), cidade, clean_text(responsavel),
+            municipio_id)
+
+
+def _migration_004_clean_columns(conn):
+    """
+    Reescreve a tabela empresas com colunas tipadas, limpas e prontas para exibição.
+
+    - cnpj guarda apenas os dígitos (ver normalize_cnpj) e cnpj_formatado,
+      o CNPJ como aparece na tela (ver display_cnpj); o índice UNIQUE passa de cnpj_digits,
+      que deixa de existir, para cnpj;
+    - telefone, celular e numero guardam apenas dígitos, sem o ".0" dos
+      valores que vieram como float;
+    - a coluna "bairro  " (com espaços no nome) vira bairro;
+    - os textos ficam sem espaços nas pontas e NULL vira ''.
+
+    Assim a limpeza roda uma única vez, aqui e em cada gravação, e não a
+    cada carregamento das tabelas. A coluna id (INTEGER PRIMARY KEY)
+    preserva o rowid de cada empresa, de modo que o índice FTS e os
+    vínculos com municipios continuam válidos; índices e triggers da
+    tabela antiga são recriados.
+    """
+    conn.execute("""
+        CREATE TABLE empresas_nova (
+            id INTEGER PRIMARY KEY,
+            cnpj TEXT,
+            cnpj_formatado TEXT NOT NULL DEFAULT '',
+            razao_social TEXT NOT NULL DEFAULT '',
+            nome_fantasia TEXT NOT NULL DEFAULT '',
+            telefone TEXT NOT NULL DEFAULT '',
+            celular TEXT NOT NULL DEFAULT '',
+            email TEXT NOT NULL DEFAULT '',
+            endereco TEXT NOT NULL DEFAULT '',
+            numero TEXT NOT NULL DEFAULT '',
+            complemento TEXT NOT NULL DEFAULT '',
+            bairro TEXT NOT NULL DEFAULT '',
+            cidade TEXT,
+            responsavel TEXT NOT NULL DEFAULT '',
+            municipio_id INTEGER REFERENCES municipios(id)
+        )
+    """)
+    rows = conn.execute("""
+        SELECT rowid, cnpj, razao_social, email, celular, nome_fantasia, telefone, endereco,
+               numero, complemento, "bairro  ", cidade, responsavel, municipio_id
+        FROM empresas
+    """)
+    conn.executemany("""
+        INSERT INTO empresas_nova (id, cnpj, cnpj_formatado, razao_social, nome_fantasia,
+                                   telefone, celular, email, endereco, numero, complemento,
+                                   bairro, cidade, responsavel, municipio_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (_clean_company_row(row) for row in rows))
+
+    # Os triggers e índices da tabela antiga são removidos junto com ela
+    conn.execute("DROP TABLE empresas")
+    conn.execute("ALTER TABLE empresas_nova RENAME TO empresas")
+    conn.execute("CREATE UNIQUE INDEX idx_empresas_cnpj ON empresas(cnpj)")
+    conn.execute("CREATE INDEX idx_empresas_municipio ON empresas(municipio_id)")
+    _create_municipio_triggers(conn)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'empresas_fts'").fetchone():
+        # Os rowids foram preservados, mas os textos limpos mudam os tokens
+        conn.execute("INSERT INTO empresas_fts(empresas_fts) VALUES('rebuild')")
+        create_fulltext_triggers(conn)
+
+
+def _migration_005_municipio_link_triggers(conn):
+    """
+    Recria os triggers de vínculo com o município sem INSERT OR IGNORE.
+
+    Disparados por um upsert (INSERT ... ON CONFLICT DO UPDATE, usado na
+    importação em massa), os triggers antigos falhavam com UNIQUE em
+    municipios.nome, porque a cláusula de conflito da instrução externa
+    prevalece sobre a do trigger.
+    """
+    conn.execute("DROP TRIGGER empresas_municipio_insert")
+    conn.execute("DROP TRIGGER empresas_municipio_update")
+    _create_municipio_link_triggers(conn)
+
+
+def _migration_006_razao_social_index(conn):
+    """
+    Índice por razao_social, para localizar uma empresa gravada no índice
+    em memória (CompanyRepository._index_company): os ids que a precedem
+    na ordem de (razao_social, id) são lidos desse índice, sem ordenar o
+    cadastro inteiro.
+
+    Bancos migrados por uma versão anterior desta migração têm também
+    idx_empresas_municipio em (municipio_id, razao_social); ele continua
+    servindo às buscas por municipio_id (triggers de contagem e migração
+    007), como o índice original.
+    """
+    conn.execute("CREATE INDEX idx_empresas_razao_social ON empresas(razao_social)")
+
+
+def _migration_007_merge_municipios(conn):
+    """
+    Junta os municípios cujos nomes diferem só por acentos ou maiúsculas.
+
+    A importação da Receita gravava os nomes como vêm no arquivo (em
+    maiúsculas, sem acentos), criando 'ILHA DE ITAMARACA' ao lado de
+    'Ilha de Itamaracá'. Fica o nome cadastrado primeiro (menor id); as
+    empresas dos demais passam para ele pelos triggers de vínculo, que
+    também corrigem as contagens.
+    """
+    kept = {}
+    merged = []
+    for municipio_id, nome in conn.execute("SELECT id, nome FROM municipios ORDER BY id"):
+        key = municipio_key(nome)
+        if key in kept:
+            merged.append((kept[key], municipio_id))
+        else:
+            kept[key] = nome
+    for nome, municipio_id in merged:
+        conn.execute("UPDATE empresas SET cidade = ? WHERE municipio_id = ?", (nome, municipio_id))
+        conn.execute("DELETE FROM municipios WHERE id = ?", (municipio_id,))
+
+
+# Migrações em ordem; a versão do banco (PRAGMA user_version) é a quantidade
+# de migrações já aplicadas. Novas migrações entram sempre no final.
+MIGRATIONS = [
+    _migration_001_cnpj_digits,
+    _migration_002_fulltext,
+    _migration_003_municipios,
+    _migration_004_clean_columns,
+    _migration_005_municipio_link_triggers,
+    _migration_006_razao_social_index,
+    _migration_007_merge_municipios,
+]
+
+
+def schema_version(conn):
+    """Versão atual do esquema do banco"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Aplica as migrações pendentes, cada uma em sua própria transação.
+
+    Se uma migração falhar, com qualquer exceção, suas alterações são
+    desfeitas, a versão do banco permanece na última migração concluída e
+    o erro é propagado.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de empresas.
+
+    Returns:
+        int: Versão do esquema após as migrações.
+    """
+    version = schema_version(conn)
+    if version >= len(MIGRATIONS):
+        return version
+
+    isolation_level = conn.isolation_level
+    # Controle manual das transações: o sqlite3 não abre transação para DDL
+    conn.isolation_level = None
+    try:
+        for number in range(version, len(MIGRATIONS)):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                MIGRATIONS[number](conn)
+                conn.execute(f"PRAGMA user_version = {number + 1}")
+                conn.execute("COMMIT")
+            except BaseException:
+                # Qualquer falha (inclusive KeyboardInterrupt ou um erro de
+                # programação na migração) desfaz a transação; o SQLite pode
+                # já tê-la desfeito sozinho em alguns erros (ex.: disco cheio)
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+    return schema_version(conn)
@@ -1,68 +1,824 @@
-
-# pdf_filler.py
-
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from pypdf import PdfReader, PdfWriter
-import io
-import os
-
-# Importa o mapeamento dos campos do PDF
-from pdf_mapping import pdf_fields
-
-def fill_pdf_document(input_pdf_path, output_dir_path, data_to_fill):
-    """
-    Preenche um documento PDF com os dados fornecidos.
-
-    Args:
-        input_pdf_path (str): Caminho completo para o arquivo PDF de entrada.
-        output_dir_path (str): Caminho do diretório onde o PDF preenchido será salvo.
-        data_to_fill (dict): Dicionário com os dados a serem preenchidos nos campos do PDF.
-                              As chaves devem corresponder aos nomes dos campos em pdf_fields.
-    Returns:
-        str: Caminho completo do PDF preenchido, se bem-sucedido.
-        None: Se ocorrer um erro.
-    """
-    try:
-        # Criar um novo PDF em memória para sobrepor o texto
-        packet = io.BytesIO()
-        can = canvas.Canvas(packet, pagesize=letter)
-
-        # Definir a fonte e o tamanho
-        can.setFont("Helvetica", 8) # Ajuste o tamanho da fonte conforme necessário
-
-        # Preencher os campos com os dados
-        for field_name, text_value in data_to_fill.items():
-            if field_name in pdf_fields and text_value:
-                field_info = pdf_fields[field_name]
-                x = field_info["x"]
-                y = field_info["y"]
-                can.drawString(x, y, text_value)
-
-        can.save()
-
-        # Mover para o início do stream
-        packet.seek(0)
-        new_pdf = PdfReader(packet)
-
-        # Ler o PDF original
-        existing_pdf = PdfReader(open(input_pdf_path, "rb"))
-        output = PdfWriter()
-
-        # Adicionar a primeira página do PDF original
-        page = existing_pdf.pages[0]
-        page.merge_page(new_pdf.pages[0])
-        output.add_page(page)
-
-        # Salvar o PDF preenchido
-        output_pdf_path_full = os.path.join(output_dir_path, f"feriado preenchido para {data_to_fill.get('razao_social', 'empresa')}.pdf")
-        with open(output_pdf_path_full, "wb") as outputStream:
-            output.write(outputStream)
-
-        return output_pdf_path_full
-
-    except Exception as e:
-        print(f"Erro ao preencher o PDF: {e}")
-        return None
-
-
+# pdf_filler.py
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (ArrayObject, ByteStringObject, DecodedStreamObject,
+                           DictionaryObject, IndirectObject, NameObject)
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import hashlib
+import io
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import zipfile
+
+# Importa o layout compilado a partir do mapeamento dos campos do PDF
+from pdf_layout import default_layout
+from pdf_optimize import (WRITE_PLAIN, WRITE_COMPRESSED, WRITE_COMPACT, compress_streams,
+                          deduplicate_objects, write_document)
+from pdf_stats import (FillStats, StageTimer, STAGE_TEMPLATE, STAGE_OVERLAY, STAGE_MERGE,
+                       STAGE_WRITE)
+
+
+class PdfTemplate:
+    """
+    Template PDF já analisado, pronto para gerar cópias baratas da página.
+
+    O arquivo é lido e analisado uma única vez; a página, seus recursos e
+    fontes ficam resolvidos em memória e são apenas clonados a cada documento.
+    """
+
+    def __init__(self, path, data=None, digest=None):
+        self.path = path
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        self.data = data
+        # O hash identifica sempre o arquivo original, mesmo na versão otimizada
+        self.digest = digest or hashlib.sha256(self.data).hexdigest()
+        self.reader = PdfReader(io.BytesIO(self.data))
+        self.page = self.reader.pages[0]
+        # Resolver todos os objetos da página (conteúdo, recursos, fontes)
+        _resolve_tree(self.page)
+        self.optimization_saved = 0
+        self._optimized = None
+
+    def optimized(self):
+        """
+        Retorna uma versão do template com streams comprimidos e objetos
+        duplicados removidos, calculada uma única vez.
+
+        A deduplicação é cara e o resultado é o mesmo para todos os
+        documentos, por isso é feita no template e não a cada gravação.
+        """
+        if self._optimized is None:
+            plain = io.BytesIO()
+            self.new_document()[0].write(plain)
+
+            output, _ = self.new_document()
+            compress_streams(output)
+            deduplicate_objects(output)
+            buffer = io.BytesIO()
+            output.write(buffer)
+
+            template = PdfTemplate(self.path, buffer.getvalue(), self.digest)
+            # Economia por documento obtida só com a otimização do template
+            optimized = io.BytesIO()
+            template.new_document()[0].write(optimized)
+            template.optimization_saved = plain.tell() - optimized.tell()
+            self._optimized = template
+        return self._optimized
+
+    def new_document(self):
+        """
+        Cria um novo documento com uma cópia da página do template.
+
+        Returns:
+            tuple: (PdfWriter, PageObject) - o writer e a página copiada, que
+                   pode ser modificada sem afetar o template em cache.
+        """
+        output = PdfWriter()
+        page = output.add_page(self.page)
+        return output, page
+
+    def add_form_xobject(self, output):
+        """
+        Adiciona o conteúdo da página do template ao writer como um Form XObject.
+
+        Args:
+            output (PdfWriter): Documento que receberá o XObject.
+
+        Returns:
+            IndirectObject: Referência ao XObject, para ser desenhado com 'Do'.
+        """
+        form = DecodedStreamObject()
+        form.set_data(self.page.get_contents().get_data())
+        form.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): self.page.mediabox.clone(output),
+            NameObject("/Resources"): self.page["/Resources"].clone(output),
+        })
+        return output._add_object(form.flate_encode())
+
+    def add_blank_page(self, output):
+        """Adiciona ao writer uma página vazia com as dimensões da página do template"""
+        page = output.add_blank_page(self.page.mediabox.width, self.page.mediabox.height)
+        for key in ("/MediaBox", "/CropBox", "/Rotate"):
+            if key in self.page:
+                page[NameObject(key)] = self.page[key].clone(output)
+        return page
+
+
+def _resolve_tree(obj, seen=None):
+    """Percorre o objeto resolvendo referências indiretas para o cache do leitor"""
+    if seen is None:
+        seen = set()
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in seen:
+            return
+        seen.add(key)
+        obj = obj.get_object()
+    if isinstance(obj, DictionaryObject):
+        for key, value in obj.items():
+            if key != "/Parent":
+                _resolve_tree(value, seen)
+    elif isinstance(obj, ArrayObject):
+        for value in obj:
+            _resolve_tree(value, seen)
+
+
+# Cache de templates por (caminho absoluto, data de modificação)
+_template_cache = {}
+_template_cache_lock = threading.Lock()
+
+
+def load_template(template_path):
+    """
+    Retorna o template analisado, reutilizando o cache enquanto o arquivo não mudar.
+
+    Args:
+        template_path (str): Caminho para o PDF de template.
+
+    Returns:
+        PdfTemplate: Template pronto para gerar documentos.
+    """
+    path = os.path.abspath(template_path)
+    key = (path, os.stat(path).st_mtime_ns)
+    with _template_cache_lock:
+        template = _template_cache.get(key)
+        if template is None:
+            template = PdfTemplate(path)
+            # Descartar versões antigas do mesmo arquivo
+            for old_key in [k for k in _template_cache if k[0] == path]:
+                del _template_cache[old_key]
+            _template_cache[key] = template
+    return template
+
+
+def output_filename(data_to_fill):
+    """
+    Monta o nome do arquivo de saída para uma empresa.
+
+    Args:
+        data_to_fill (dict): Dados da empresa (usa a chave 'razao_social').
+
+    Returns:
+        str: Nome do arquivo PDF, sem caracteres de separador de diretório.
+    """
+    razao_social = data_to_fill.get('razao_social') or 'empresa'
+    razao_social = razao_social.replace('/', '_').replace('\\', '_')
+    return f"feriado preenchido para {razao_social}.pdf"
+
+
+# Fonte usada nos textos sobrepostos (Helvetica padrão, codificação WinAnsi)
+OVERLAY_FONT_NAME = "/FillerHelvetica"
+
+
+def _overlay_font():
+    """Cria o dicionário da fonte Type1 padrão usada nos textos sobrepostos"""
+    return DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+    })
+
+
+def _pdf_string(text):
+    """Codifica o texto como string literal PDF em WinAnsi (cp1252)"""
+    data = text.encode("cp1252", errors="replace")
+    data = data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"(" + data + b")"
+
+
+def _overlay_content(data_to_fill):
+    """
+    Monta diretamente o content stream que desenha os textos dos campos.
+
+    Cada valor é posicionado pelo layout compilado de pdf_fields, que reduz
+    ou quebra o texto para caber na caixa do campo, sem passar por um PDF
+    intermediário.
+    """
+    parts = []
+    font_name = OVERLAY_FONT_NAME.encode()
+    for field_name, text_value in data_to_fill.items():
+        if field_name in default_layout and text_value:
+            for size, x, y, line in default_layout.place(field_name, str(text_value)):
+                parts.append(b"BT %s %g Tf 1 0 0 1 %g %g Tm %s Tj ET\n" % (
+                    font_name, size, x, y, _pdf_string(line)))
+    return b"".join(parts)
+
+
+def _add_stream(output, data):
+    """Adiciona um content stream ao writer e retorna sua referência"""
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return output._add_object(stream)
+
+
+def _append_overlay(output, page, overlay):
+    """Acrescenta o content stream dos textos ao final do conteúdo da página"""
+    # Registrar a fonte nos recursos da página (cópia exclusiva deste documento)
+    resources = page[NameObject("/Resources")].get_object()
+    if "/Font" not in resources:
+        resources[NameObject("/Font")] = DictionaryObject()
+    fonts = resources["/Font"].get_object()
+    fonts[NameObject(OVERLAY_FONT_NAME)] = output._add_object(_overlay_font())
+
+    # Isolar o estado gráfico do template entre q/Q e desenhar os textos depois
+    contents = page.get(NameObject("/Contents"))
+    if contents is None:
+        existing = []
+    elif isinstance(contents.get_object(), ArrayObject):
+        existing = list(contents.get_object())
+    else:
+        existing = [contents]
+    page[NameObject("/Contents")] = ArrayObject(
+        [_add_stream(output, b"q\n")] + existing +
+        [_add_stream(output, b"\nQ\n" + overlay)])
+
+
+def document_hash(template, data_to_fill, write_mode=WRITE_PLAIN):
+    """
+    Calcula o hash de conteúdo de um documento.
+
+    O hash cobre os bytes do template, o layout dos campos, os dados da
+    empresa, a data do feriado e o modo de gravação; entradas iguais sempre
+    geram o mesmo hash.
+
+    Args:
+        template (PdfTemplate): Template em uso.
+        data_to_fill (dict): Dados da empresa.
+        write_mode (str): Modo de gravação (ver pdf_optimize).
+
+    Returns:
+        str: Hash SHA-256 em hexadecimal.
+    """
+    description = {
+        "template": template.digest,
+        "layout": default_layout.fingerprint,
+        "data": {key: str(value) for key, value in data_to_fill.items()},
+        "data_feriado": str(data_to_fill.get("data_feriado", "")),
+        "write_mode": write_mode,
+    }
+    return hashlib.sha256(
+        json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _set_document_id(output, content_hash):
+    """
+    Torna a saída determinística: o /ID do PDF vem do hash do conteúdo e
+    nenhuma data de criação/modificação é gravada nos metadados.
+    """
+    document_id = ByteStringObject(bytes.fromhex(content_hash)[:16])
+    output._ID = ArrayObject([document_id, document_id])
+    output.add_metadata({"/Producer": "pypdf"})
+
+
+def _render_document(template, data_to_fill, write_mode=WRITE_PLAIN, timer=None):
+    """
+    Gera o documento preenchido em memória a partir do template em cache.
+
+    Se 'timer' (StageTimer) for informado, marca as etapas template,
+    overlay e merge.
+    """
+    content_hash = document_hash(template, data_to_fill, write_mode)
+    if write_mode != WRITE_PLAIN:
+        template = template.optimized()
+
+    # Obter uma cópia da página do template (analisado apenas uma vez)
+    output, page = template.new_document()
+    if timer is not None:
+        timer.mark(STAGE_TEMPLATE)
+
+    overlay = _overlay_content(data_to_fill)
+    if timer is not None:
+        timer.mark(STAGE_OVERLAY)
+
+    _append_overlay(output, page, overlay)
+    _set_document_id(output, content_hash)
+    if timer is not None:
+        timer.mark(STAGE_MERGE)
+    return output
+
+
+def _write_output(template, output, stream, write_mode=WRITE_PLAIN, timer=None):
+    """
+    Grava o documento gerado no modo escolhido.
+
+    Returns:
+        tuple: (bytes gravados, bytes economizados em relação à gravação padrão).
+    """
+    # O template otimizado já foi deduplicado uma única vez
+    size, saved = write_document(output, stream, write_mode, deduplicate=False)
+    if write_mode != WRITE_PLAIN:
+        saved += template.optimized().optimization_saved
+    if timer is not None:
+        timer.mark(STAGE_WRITE)
+    return size, saved
+
+
+# Prefixo dos arquivos temporários gravados no diretório de saída antes do rename
+TEMP_FILE_PREFIX = ".preenchendo-"
+
+
+def _default_file_mode():
+    """Permissões de um arquivo novo criado com open() (0o666 menos a umask do processo)"""
+    # A umask só pode ser lida trocando-a; feito uma vez, na importação do módulo
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# mkstemp cria o temporário com 0o600, e o rename mantém essas permissões:
+# sem ajustá-las, outros usuários de uma pasta compartilhada não leriam os PDFs
+_FILE_MODE = _default_file_mode()
+
+
+@contextmanager
+def _atomic_output(path):
+    """
+    Abre um arquivo temporário no mesmo diretório de 'path' e, ao final do
+    bloco, renomeia-o para o nome definitivo.
+
+    Se o bloco falhar, o temporário é removido; se o processo for
+    interrompido, sobra no máximo um temporário oculto, nunca um PDF
+    pela metade com o nome final.
+    """
+    directory, filename = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(prefix=TEMP_FILE_PREFIX, suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            yield stream
+        os.chmod(temp_path, _FILE_MODE)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def remove_stale_temp_files(output_dir_path):
+    """Remove os temporários deixados por uma execução interrompida"""
+    try:
+        names = os.listdir(output_dir_path)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(TEMP_FILE_PREFIX) and name.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(output_dir_path, name))
+            except OSError:
+                pass
+
+
+def _fill_to_file(template, output_dir_path, data_to_fill, write_mode=WRITE_PLAIN, timer=None):
+    """Preenche e salva um documento, retornando (caminho, bytes gravados, bytes economizados)"""
+    output = _render_document(template, data_to_fill, write_mode, timer)
+
+    # Salvar o PDF preenchido
+    output_pdf_path_full = os.path.join(output_dir_path, output_filename(data_to_fill))
+    with _atomic_output(output_pdf_path_full) as outputStream:
+        size, saved = _write_output(template, output, outputStream, write_mode, timer)
+
+    return output_pdf_path_full, size, saved
+
+
+def _render_bytes(template, data_to_fill, write_mode=WRITE_PLAIN, timer=None):
+    """Gera o documento preenchido e devolve (bytes do PDF, bytes economizados)"""
+    output = _render_document(template, data_to_fill, write_mode, timer)
+    buffer = io.BytesIO()
+    _, saved = _write_output(template, output, buffer, write_mode, timer)
+    return buffer.getvalue(), saved
+
+
+def iter_filled_pdfs(template, records, key=output_filename, write_mode=WRITE_PLAIN,
+                     stats=None):
+    """
+    Gera os PDFs preenchidos em memória, um documento por vez.
+
+    Os registros são consumidos sob demanda e cada PDF só é gerado quando o
+    anterior já foi entregue, de modo que a memória usada não depende do
+    tamanho do lote. O chamador decide o destino dos bytes (entrada de ZIP,
+    resposta HTTP, armazenamento de arquivo, etc.) sem arquivos temporários.
+
+    Args:
+        template (str | PdfTemplate): Caminho do PDF de template ou template já carregado.
+        records (iterable): Dicionários com os dados de cada empresa; pode ser
+                            um gerador (por exemplo, um cursor do banco).
+        key (callable): Função que recebe o registro e devolve sua chave.
+                        Padrão: o nome de arquivo usado por fill_pdf_document.
+        write_mode (str): Modo de gravação: WRITE_PLAIN, WRITE_COMPRESSED ou
+                          WRITE_COMPACT (ver pdf_optimize).
+        stats (FillStats): Recebe os tempos por etapa de cada documento (opcional).
+
+    Yields:
+        tuple: (chave do registro, bytes do PDF preenchido).
+    """
+    if not isinstance(template, PdfTemplate):
+        template = load_template(template)
+
+    for data_to_fill in records:
+        timer = StageTimer() if stats is not None else None
+        content, _ = _render_bytes(template, data_to_fill, write_mode, timer)
+        record_key = key(data_to_fill)
+        if timer is not None:
+            stats.add(timer.durations, record_key)
+        yield record_key, content
+
+
+def fill_pdf_document(input_pdf_path, output_dir_path, data_to_fill, write_mode=WRITE_PLAIN,
+                      stats=None):
+    """
+    Preenche um documento PDF com os dados fornecidos.
+
+    Args:
+        input_pdf_path (str): Caminho completo para o arquivo PDF de entrada.
+        output_dir_path (str): Caminho do diretório onde o PDF preenchido será salvo.
+        data_to_fill (dict): Dicionário com os dados a serem preenchidos nos campos do PDF.
+                              As chaves devem corresponder aos nomes dos campos em pdf_fields.
+        write_mode (str): Modo de gravação: WRITE_PLAIN, WRITE_COMPRESSED ou
+                          WRITE_COMPACT (ver pdf_optimize).
+        stats (FillStats): Recebe os tempos por etapa do documento (opcional).
+    Returns:
+        str: Caminho completo do PDF preenchido, se bem-sucedido.
+        None: Se ocorrer um erro.
+    """
+    try:
+        timer = StageTimer() if stats is not None else None
+        template = load_template(input_pdf_path)
+        path = _fill_to_file(template, output_dir_path, data_to_fill, write_mode, timer)[0]
+        if timer is not None:
+            stats.add(timer.durations, os.path.basename(path))
+        return path
+
+    except Exception as e:
+        print(f"Erro ao preencher o PDF: {e}")
+        return None
+
+
+# Resultado do preenchimento de um registro no lote; 'skipped' indica que o
+# PDF já existia com o mesmo conteúdo e não foi gerado novamente, 'size' e
+# 'saved' são os bytes gravados e os economizados pelo modo de gravação e
+# 'timings' traz a duração de cada etapa quando o lote é medido
+FillResult = namedtuple("FillResult",
+                        ["index", "data", "path", "error", "skipped", "size", "saved",
+                         "timings"],
+                        defaults=(False, 0, 0, None))
+
+# Nome do manifesto mantido no diretório de saída do lote
+MANIFEST_FILENAME = ".manifesto-feriados.json"
+
+
+class BatchManifest:
+    """
+    Manifesto do diretório de saída: hash do conteúdo -> arquivo gerado.
+
+    Permite pular, em uma nova execução do lote, os registros cujo PDF já
+    existe com exatamente o mesmo conteúdo (mesmo template, layout, dados e
+    data do feriado).
+    """
+
+    def __init__(self, output_dir_path):
+        self.output_dir_path = output_dir_path
+        self.path = os.path.join(output_dir_path, MANIFEST_FILENAME)
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            # Manifesto ausente ou corrompido: tudo será gerado novamente
+            self.entries = {}
+        self._hash_by_file = {filename: content_hash
+                              for content_hash, filename in self.entries.items()}
+
+    def is_current(self, content_hash, filename):
+        """Verifica se o arquivo já foi gerado com este conteúdo e ainda existe"""
+        return (self.entries.get(content_hash) == filename and
+                os.path.exists(os.path.join(self.output_dir_path, filename)))
+
+    def record(self, content_hash, filename):
+        """Registra o arquivo gerado, descartando o hash antigo do mesmo arquivo"""
+        old_hash = self._hash_by_file.get(filename)
+        if old_hash is not None and old_hash != content_hash:
+            self.entries.pop(old_hash, None)
+        self.entries[content_hash] = filename
+        self._hash_by_file[filename] = content_hash
+
+    def save(self):
+        """Grava o manifesto de forma atômica (arquivo temporário + rename, ver _atomic_output)"""
+        content = json.dumps({"version": 1, "entries": self.entries}, ensure_ascii=False,
+                             indent=0, sort_keys=True)
+        with _atomic_output(self.path) as stream:
+            stream.write(content.encode("utf-8"))
+
+
+def _unique_archive_name(used_names, filename):
+    """Evita entradas duplicadas no ZIP quando duas empresas têm o mesmo nome"""
+    name = filename
+    base, ext = os.path.splitext(filename)
+    counter = 2
+    while name in used_names:
+        name = f"{base} ({counter}){ext}"
+        counter += 1
+    used_names.add(name)
+    return name
+
+
+def _init_batch_worker(template_path):
+    """Inicializa o processo de trabalho carregando o template uma única vez"""
+    load_template(template_path)
+
+
+def _render_batch_record(template_path, write_mode, timed, index, data_to_fill):
+    """Gera um registro do lote em memória, devolvendo (resultado, bytes do PDF)"""
+    try:
+        timer = StageTimer() if timed else None
+        content, saved = _render_bytes(load_template(template_path), data_to_fill,
+                                       write_mode, timer)
+        return FillResult(index, data_to_fill, None, None, False, len(content), saved,
+                          timer.durations if timer is not None else None), content
+    except Exception as e:
+        return FillResult(index, data_to_fill, None, str(e)), None
+
+
+def _map_records(func, template_path, indexed_records, workers, *args):
+    """
+    Executa func(template_path, *args, index, data) para cada par (index, data),
+    em um pool de processos, devolvendo os resultados à medida que ficam prontos.
+    """
+    # Lotes pequenos ou um único processo: evitar o custo de subir o pool
+    if workers == 1:
+        for index, data_to_fill in indexed_records:
+            yield func(template_path, *args, index, data_to_fill)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_batch_worker,
+                             initargs=(template_path,)) as executor:
+        # Manter um número limitado de tarefas pendentes
+        pending = set()
+        max_pending = workers * 4
+        for index, data_to_fill in indexed_records:
+            pending.add(executor.submit(func, template_path, *args, index, data_to_fill))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+
+def _fill_batch_zip(template_path, zip_path, records, workers, write_mode, timed):
+    """Grava cada PDF do lote diretamente como uma entrada do arquivo ZIP"""
+    used_names = set()
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        if workers == 1:
+            # No mesmo processo o PDF é escrito direto na entrada, sem buffer
+            template = load_template(template_path)
+            for index, data_to_fill in enumerate(records):
+                try:
+                    timer = StageTimer() if timed else None
+                    output = _render_document(template, data_to_fill, write_mode, timer)
+                    name = _unique_archive_name(used_names, output_filename(data_to_fill))
+                    with archive.open(name, "w") as entry:
+                        size, saved = _write_output(template, output, entry, write_mode, timer)
+                    yield FillResult(index, data_to_fill, name, None, False, size, saved,
+                                     timer.durations if timer is not None else None)
+                except Exception as e:
+                    yield FillResult(index, data_to_fill, None, str(e))
+            return
+
+        # Com o pool, cada processo devolve apenas o PDF de um registro por vez
+        for result, content in _map_records(_render_batch_record, template_path,
+                                            enumerate(records), workers, write_mode, timed):
+            if result.error is None:
+                name = _unique_archive_name(used_names, output_filename(result.data))
+                archive.writestr(name, content)
+                result = result._replace(path=name)
+            yield result
+
+
+# Documentos gerados aguardando gravação: limita a memória usada pelo lote
+WRITE_QUEUE_SIZE = 8
+
+# Marca de fim da fila de gravação
+_END_OF_QUEUE = object()
+
+
+def _write_worker(jobs, done):
+    """Thread de gravação: grava cada documento da fila de forma atômica"""
+    while True:
+        job = jobs.get()
+        if job is _END_OF_QUEUE:
+            return
+        result, content = job
+        try:
+            start = time.perf_counter()
+            with _atomic_output(result.path) as stream:
+                stream.write(content)
+            if result.timings is not None:
+                timings = dict(result.timings)
+                timings[STAGE_WRITE] = (timings.get(STAGE_WRITE, 0.0) +
+                                        time.perf_counter() - start)
+                result = result._replace(timings=timings)
+            done.put(result)
+        except Exception as e:
+            done.put(result._replace(path=None, error=str(e), size=0, saved=0))
+
+
+def _pipeline_writes(template_path, output_dir_path, indexed_records, workers, write_mode,
+                     timed):
+    """
+    Gera os documentos em memória e os grava no diretório em uma thread separada.
+
+    A geração (no processo atual ou no pool) e a gravação em disco acontecem
+    ao mesmo tempo; a fila limitada entre as duas faz a geração esperar
+    quando o disco não acompanha, mantendo a memória sob controle.
+    """
+    jobs = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    done = queue.Queue()
+    writer = threading.Thread(target=_write_worker, args=(jobs, done), daemon=True)
+    writer.start()
+    try:
+        for result, content in _map_records(_render_batch_record, template_path,
+                                            indexed_records, workers, write_mode, timed):
+            if result.error is not None:
+                yield result
+                continue
+            path = os.path.join(output_dir_path, output_filename(result.data))
+            jobs.put((result._replace(path=path), content))
+
+            # Entregar os documentos que já foram gravados
+            while True:
+                try:
+                    yield done.get_nowait()
+                except queue.Empty:
+                    break
+    finally:
+        jobs.put(_END_OF_QUEUE)
+        writer.join()
+
+    while not done.empty():
+        yield done.get_nowait()
+
+
+def _fill_batch_directory(template_path, output_dir_path, records, workers, write_mode,
+                          skip_unchanged, timed):
+    """Grava os PDFs do lote no diretório, pulando os que não mudaram desde a última execução"""
+    remove_stale_temp_files(output_dir_path)
+    if not skip_unchanged:
+        yield from _pipeline_writes(template_path, output_dir_path, enumerate(records),
+                                    workers, write_mode, timed)
+        return
+
+    template = load_template(template_path)
+    manifest = BatchManifest(output_dir_path)
+    hashes = {}
+    to_fill = []
+    for index, data_to_fill in enumerate(records):
+        content_hash = document_hash(template, data_to_fill, write_mode)
+        filename = output_filename(data_to_fill)
+        if manifest.is_current(content_hash, filename):
+            yield FillResult(index, data_to_fill, os.path.join(output_dir_path, filename),
+                             None, True)
+        else:
+            hashes[index] = content_hash
+            to_fill.append((index, data_to_fill))
+
+    try:
+        for result in _pipeline_writes(template_path, output_dir_path, to_fill,
+                                       workers, write_mode, timed):
+            if result.error is None:
+                manifest.record(hashes[result.index], os.path.basename(result.path))
+            yield result
+    finally:
+        manifest.save()
+
+
+def fill_pdf_batch(template_path, output_dir_path, records, workers=None, zip_path=None,
+                   skip_unchanged=True, write_mode=WRITE_PLAIN, stats=None):
+    """
+    Preenche vários documentos em paralelo usando um pool de processos.
+
+    Cada processo carrega o template uma única vez. Os PDFs são gerados em
+    memória e gravados no diretório por uma thread separada, de forma
+    atômica (arquivo temporário + rename), de modo que uma execução
+    interrompida não deixa PDFs pela metade. Os resultados são devolvidos
+    à medida que são gravados, não na ordem de entrada.
+
+    Args:
+        template_path (str): Caminho para o PDF de template.
+        output_dir_path (str): Diretório onde os PDFs preenchidos serão salvos.
+        records (iterable): Dicionários com os dados de cada empresa.
+        workers (int): Número de processos. Padrão: número de CPUs.
+        zip_path (str): Se informado, os PDFs são gravados diretamente dentro
+                        deste arquivo .zip, à medida que são gerados, em vez
+                        de arquivos soltos em output_dir_path.
+        skip_unchanged (bool): Mantém um manifesto no diretório de saída e pula
+                               os registros cujo PDF já existe com o mesmo
+                               conteúdo. Não se aplica ao modo ZIP.
+        write_mode (str): Modo de gravação: WRITE_PLAIN, WRITE_COMPRESSED ou
+                          WRITE_COMPACT (ver pdf_optimize).
+        stats (FillStats): Se informado, cada processo mede as etapas de cada
+                           documento e os tempos são agregados neste objeto
+                           (e registrados no seu log JSON-lines, se houver).
+
+    Yields:
+        FillResult: (index, data, path, error, skipped, size, saved, timings)
+                    para cada registro; 'error' é None em caso de sucesso,
+                    'skipped' indica que o PDF existente foi mantido,
+                    'size'/'saved' trazem os bytes gravados e os economizados
+                    pela otimização e 'timings' a duração de cada etapa.
+                    No modo ZIP, 'path' é o nome da entrada dentro do arquivo.
+    """
+    records = list(records)
+    template_path = os.path.abspath(template_path)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(records)))
+    timed = stats is not None
+
+    if zip_path is not None:
+        results = _fill_batch_zip(template_path, zip_path, records, workers, write_mode, timed)
+    else:
+        results = _fill_batch_directory(template_path, output_dir_path, records, workers,
+                                        write_mode, skip_unchanged, timed)
+
+    for result in results:
+        # Os tempos são agregados no processo principal, que também escreve o log
+        if result.timings is not None:
+            stats.add(result.timings, os.path.basename(result.path))
+        yield result
+
+
+def fill_pdf_merged(template_path, output_pdf_path, records, progress_callback=None,
+                    write_mode=WRITE_PLAIN, stats=None):
+    """
+    Gera um único PDF com uma página por empresa.
+
+    O conteúdo do template é gravado uma única vez, como um Form XObject
+    compartilhado por todas as páginas; cada página acrescenta apenas os
+    textos da empresa. O arquivo final fica muito menor que a soma dos PDFs
+    individuais.
+
+    Args:
+        template_path (str): Caminho para o PDF de template.
+        output_pdf_path (str): Caminho completo do PDF de saída.
+        records (iterable): Dicionários com os dados de cada empresa.
+        progress_callback (callable): Chamada como progress_callback(i, data)
+                                      após cada página adicionada (opcional).
+        write_mode (str): Modo de gravação (ver pdf_optimize).
+        stats (FillStats): Recebe os tempos de overlay e merge de cada página;
+                           template e gravação, compartilhados por todas as
+                           páginas, são registrados uma única vez (opcional).
+
+    Returns:
+        str: Caminho do PDF gerado.
+    """
+    shared_timer = StageTimer() if stats is not None else None
+    template = load_template(template_path)
+    if write_mode != WRITE_PLAIN:
+        template = template.optimized()
+    output = PdfWriter()
+    template_form = template.add_form_xobject(output)
+    font = output._add_object(_overlay_font())
+    if shared_timer is not None:
+        shared_timer.mark(STAGE_TEMPLATE)
+
+    for i, data_to_fill in enumerate(records):
+        timer = StageTimer() if stats is not None else None
+        overlay = _overlay_content(data_to_fill)
+        if timer is not None:
+            timer.mark(STAGE_OVERLAY)
+
+        page = template.add_blank_page(output)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({NameObject("/Template"): template_form}),
+            NameObject("/Font"): DictionaryObject({NameObject(OVERLAY_FONT_NAME): font}),
+        })
+        page[NameObject("/Contents")] = _add_stream(output, b"q /Template Do Q\n" + overlay)
+        if timer is not None:
+            timer.mark(STAGE_MERGE)
+            stats.add(timer.durations, output_filename(data_to_fill))
+
+        if progress_callback is not None:
+            progress_callback(i, data_to_fill)
+
+    if shared_timer is not None:
+        shared_timer.restart()
+    with open(output_pdf_path, "wb") as outputStream:
+        write_document(output, outputStream, write_mode, deduplicate=False)
+    if shared_timer is not None:
+        shared_timer.mark(STAGE_WRITE)
+        stats.add(shared_timer.durations, os.path.basename(output_pdf_path), documents=0)
+
+    return output_pdf_path
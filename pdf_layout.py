@@ -0,0 +1,185 @@
+# pdf_layout.py
+
+from functools import lru_cache
+import hashlib
+import json
+
+from reportlab.pdfbase.pdfmetrics import getFont
+
+# Importa o mapeamento dos campos do PDF
+from pdf_mapping import pdf_fields
+
+# Larguras dos glifos da Helvetica padrão (WinAnsi), em milésimos de em,
+# indexadas pelo código cp1252 do caractere
+_HELVETICA_WIDTHS = tuple(getFont("Helvetica").widths)
+
+ELLIPSIS = "…"
+
+
+def to_winansi(text):
+    """Substitui por '?' os caracteres que não existem na codificação WinAnsi"""
+    return text.encode("cp1252", errors="replace").decode("cp1252")
+
+
+@lru_cache(maxsize=65536)
+def text_units(text):
+    """
+    Mede a largura do texto em Helvetica, em milésimos do tamanho da fonte.
+
+    O resultado é memoizado: nomes e palavras repetidos em um lote grande
+    são medidos uma única vez.
+
+    Args:
+        text (str): Texto já restrito à codificação WinAnsi.
+
+    Returns:
+        int: Largura do texto para uma fonte de tamanho 1000.
+    """
+    widths = _HELVETICA_WIDTHS
+    return sum(widths[code] for code in text.encode("cp1252"))
+
+
+def text_width(text, font_size):
+    """Largura do texto, em pontos, no tamanho de fonte informado"""
+    return text_units(text) * font_size / 1000.0
+
+
+class FieldBox:
+    """Caixa de um campo do formulário: origem (linha de base) e dimensões"""
+
+    __slots__ = ("name", "x", "y", "width", "height")
+
+    def __init__(self, name, x, y, width, height):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+
+class CompiledLayout:
+    """
+    Mapeamento de campos compilado para desenhar textos dentro de suas caixas.
+
+    Textos que não cabem na largura do campo são reduzidos em passos de
+    meio ponto até o tamanho mínimo, e quebrados em linhas quando a altura
+    da caixa permite. Se ainda assim não couberem, a última linha é cortada
+    com reticências.
+    """
+
+    def __init__(self, fields, font_size=8, min_font_size=5, leading=1.15, step=0.5):
+        self.font_size = font_size
+        self.min_font_size = min_font_size
+        self.leading = leading
+        self.boxes = {
+            name: FieldBox(name, info["x"], info["y"], info["width"], info["height"])
+            for name, info in fields.items()
+        }
+        # Tamanhos de fonte testados, do maior para o menor
+        sizes = []
+        size = font_size
+        while size >= min_font_size:
+            sizes.append(size)
+            size -= step
+        self.sizes = tuple(sizes)
+
+        # Identifica o layout no manifesto do lote: qualquer mudança em
+        # coordenadas, caixas ou parâmetros invalida os PDFs já gerados
+        description = {
+            "fields": {name: [box.x, box.y, box.width, box.height]
+                       for name, box in sorted(self.boxes.items())},
+            "font_size": font_size,
+            "min_font_size": min_font_size,
+            "leading": leading,
+            "step": step,
+        }
+        self.fingerprint = hashlib.sha256(
+            json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def __contains__(self, field_name):
+        return field_name in self.boxes
+
+    def place(self, field_name, text):
+        """
+        Posiciona o texto dentro da caixa do campo.
+
+        Args:
+            field_name (str): Nome do campo em pdf_fields.
+            text (str): Valor a desenhar.
+
+        Returns:
+            list: Tuplas (tamanho_fonte, x, y, linha) a desenhar, com a última
+                  linha sobre a linha de base do campo e as demais acima dela.
+        """
+        box = self.boxes[field_name]
+        text = " ".join(to_winansi(text).split())
+
+        for size in self.sizes:
+            lines = _wrap(text, box.width, size)
+            if self._fits(len(lines), size, box):
+                return self._stack(box, size, lines)
+
+        # Nem no tamanho mínimo coube: manter as linhas possíveis e cortar a última
+        size = self.min_font_size
+        max_lines = max(1, int((box.height - size) // (size * self.leading)) + 1)
+        lines = _wrap(text, box.width, size)
+        if len(lines) > max_lines:
+            lines = lines[:max_lines]
+            lines[-1] = _truncate(lines[-1] + ELLIPSIS, box.width, size)
+        return self._stack(box, size, lines)
+
+    def _fits(self, line_count, size, box):
+        """Verifica se as linhas cabem na altura da caixa"""
+        return (line_count - 1) * size * self.leading + size <= box.height
+
+    def _stack(self, box, size, lines):
+        """Empilha as linhas de baixo para cima a partir da linha de base do campo"""
+        line_height = size * self.leading
+        last = len(lines) - 1
+        return [(size, box.x, box.y + (last - i) * line_height, line)
+                for i, line in enumerate(lines)]
+
+
+def _wrap(text, width, size):
+    """Quebra o texto em linhas que cabem na largura, preferindo os espaços"""
+    if text_width(text, size) <= width:
+        return [text]
+
+    space = text_width(" ", size)
+    lines = []
+    current = ""
+    current_width = 0.0
+    for word in text.split(" "):
+        word_width = text_width(word, size)
+        if current and current_width + space + word_width <= width:
+            current += " " + word
+            current_width += space + word_width
+            continue
+        if current:
+            lines.append(current)
+        # Palavras maiores que a caixa são quebradas por caractere
+        while word_width > width and len(word) > 1:
+            head = _truncate(word, width, size, suffix="")
+            lines.append(head)
+            word = word[len(head):]
+            word_width = text_width(word, size)
+        current = word
+        current_width = word_width
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _truncate(text, width, size, suffix=ELLIPSIS):
+    """Corta o texto para caber na largura, terminando com o sufixo informado"""
+    if text_width(text, size) <= width:
+        return text
+    body = text[:-len(suffix)] if suffix and text.endswith(suffix) else text
+    limit = width - text_width(suffix, size)
+    while len(body) > 1 and text_width(body, size) > limit:
+        body = body[:-1]
+    return body.rstrip() + suffix
+
+
+# Layout padrão do formulário, compilado uma única vez
+default_layout = CompiledLayout(pdf_fields)
@@ -0,0 +1,228 @@
+# pdf_optimize.py
+
+import io
+import struct
+
+from pypdf.generic import (ArrayObject, DecodedStreamObject, NameObject, NumberObject,
+                           StreamObject)
+
+# Modos de gravação dos PDFs gerados
+WRITE_PLAIN = "plain"            # PdfWriter.write padrão, sem otimização
+WRITE_COMPRESSED = "compressed"  # streams comprimidos + objetos duplicados removidos
+WRITE_COMPACT = "compact"        # além disso, object streams e xref stream (PDF 1.5)
+
+WRITE_MODES = (WRITE_PLAIN, WRITE_COMPRESSED, WRITE_COMPACT)
+
+# Quantidade máxima de objetos agrupados em cada object stream
+OBJECTS_PER_STREAM = 200
+
+# Tamanho de uma linha da tabela xref clássica ("0000000000 00000 n \n")
+_XREF_TABLE_ENTRY_SIZE = 20
+
+
+class _CountingWriter:
+    """Stream de escrita que apenas encaminha os dados e conta os bytes"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.position = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _serialized_size(obj):
+    """Tamanho do objeto serializado, em bytes"""
+    buffer = io.BytesIO()
+    obj.write_to_stream(buffer)
+    return buffer.tell()
+
+
+def compress_streams(output, level=-1):
+    """
+    Comprime com FlateDecode os streams ainda sem filtro do documento.
+
+    Args:
+        output (PdfWriter): Documento a otimizar.
+        level (int): Nível de compressão do zlib (-1 = padrão).
+
+    Returns:
+        int: Bytes economizados nos dados dos streams.
+    """
+    saved = 0
+    for i, obj in enumerate(output._objects):
+        if isinstance(obj, DecodedStreamObject) and "/Filter" not in obj:
+            raw_size = len(obj.get_data())
+            encoded = obj.flate_encode(level)
+            encoded.indirect_reference = obj.indirect_reference
+            output._objects[i] = encoded
+            saved += raw_size - len(encoded._data)
+    return saved
+
+
+def deduplicate_objects(output):
+    """
+    Remove objetos idênticos e objetos órfãos, redirecionando as referências.
+
+    Returns:
+        int: Bytes economizados (estimativa da gravação dos objetos removidos).
+    """
+    before = {i: obj for i, obj in enumerate(output._objects) if obj is not None}
+    output.compress_identical_objects(remove_duplicates=True, remove_unreferenced=True)
+    saved = 0
+    for i, obj in before.items():
+        if output._objects[i] is None:
+            saved += (_serialized_size(obj) + len(f"{i + 1} 0 obj\n\nendobj\n") +
+                      _XREF_TABLE_ENTRY_SIZE)
+    return saved
+
+
+def write_compact(output, stream):
+    """
+    Grava o documento com object streams e tabela de referências em xref stream.
+
+    Objetos que não são streams são agrupados e comprimidos em object streams
+    (/ObjStm); a tabela xref é gravada como um stream comprimido (/XRef).
+
+    Args:
+        output (PdfWriter): Documento a gravar (sem criptografia).
+        stream: Stream binário de saída; precisa apenas de write().
+
+    Returns:
+        tuple: (bytes gravados, bytes estimados de uma gravação clássica
+               equivalente, com tabela xref e objetos soltos).
+    """
+    output._resolve_links()
+    out = _CountingWriter(stream)
+    header = b"%PDF-1.5\n%\xE2\xE3\xCF\xD3\n"
+    out.write(header)
+
+    objects = output._objects
+    size = len(objects) + 1
+    # Entradas da xref: (tipo, campo2, campo3) por número de objeto
+    entries = {0: (0, 0, 65535)}
+    plain_size = len(header)
+    packed = []
+
+    for idnum, obj in enumerate(objects, start=1):
+        if obj is None:
+            entries[idnum] = (0, 0, 0)
+            continue
+        wrapper_size = len(f"{idnum} 0 obj\n\nendobj\n")
+        plain_size += wrapper_size + _XREF_TABLE_ENTRY_SIZE
+        if isinstance(obj, StreamObject):
+            # Streams não podem ficar dentro de object streams
+            entries[idnum] = (1, out.tell(), 0)
+            start = out.tell()
+            out.write(f"{idnum} 0 obj\n".encode())
+            obj.write_to_stream(out)
+            out.write(b"\nendobj\n")
+            plain_size += out.tell() - start - wrapper_size
+        else:
+            buffer = io.BytesIO()
+            obj.write_to_stream(buffer)
+            data = buffer.getvalue()
+            plain_size += len(data)
+            packed.append((idnum, data))
+
+    # Agrupar os demais objetos em object streams comprimidos
+    for chunk_start in range(0, len(packed), OBJECTS_PER_STREAM):
+        chunk = packed[chunk_start:chunk_start + OBJECTS_PER_STREAM]
+        stream_idnum = size
+        size += 1
+        offsets = []
+        body = []
+        position = 0
+        for index, (idnum, data) in enumerate(chunk):
+            offsets.append(b"%d %d" % (idnum, position))
+            body.append(data)
+            position += len(data) + 1
+            entries[idnum] = (2, stream_idnum, index)
+        first_line = b" ".join(offsets) + b"\n"
+        object_stream = DecodedStreamObject()
+        object_stream.set_data(first_line + b"\n".join(body))
+        object_stream = object_stream.flate_encode()
+        object_stream[NameObject("/Type")] = NameObject("/ObjStm")
+        object_stream[NameObject("/N")] = NumberObject(len(chunk))
+        object_stream[NameObject("/First")] = NumberObject(len(first_line))
+        entries[stream_idnum] = (1, out.tell(), 0)
+        out.write(f"{stream_idnum} 0 obj\n".encode())
+        object_stream.write_to_stream(out)
+        out.write(b"\nendobj\n")
+
+    # Tabela de referências como xref stream (inclui a si mesma)
+    xref_idnum = size
+    size += 1
+    xref_location = out.tell()
+    entries[xref_idnum] = (1, xref_location, 0)
+    xref_stream = DecodedStreamObject()
+    xref_stream.set_data(b"".join(struct.pack(">BIH", *entries[i]) for i in range(size)))
+    xref_stream = xref_stream.flate_encode()
+    xref_stream[NameObject("/Type")] = NameObject("/XRef")
+    xref_stream[NameObject("/Size")] = NumberObject(size)
+    xref_stream[NameObject("/W")] = ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)])
+    xref_stream[NameObject("/Root")] = output.root_object.indirect_reference
+    if output._info is not None:
+        xref_stream[NameObject("/Info")] = output._info.indirect_reference
+    if output._ID is not None:
+        xref_stream[NameObject("/ID")] = output._ID
+    out.write(f"{xref_idnum} 0 obj\n".encode())
+    xref_stream.write_to_stream(out)
+    out.write(f"\nendobj\nstartxref\n{xref_location}\n%%EOF\n".encode())
+
+    # Tabela xref clássica e trailer que a gravação padrão teria escrito
+    plain_size += (len(f"xref\n0 {len(objects) + 1}\n") + _XREF_TABLE_ENTRY_SIZE +
+                   _serialized_trailer_size(output, len(objects) + 1) +
+                   len(f"\nstartxref\n{xref_location}\n%%EOF\n"))
+    return out.tell(), plain_size
+
+
+def _serialized_trailer_size(output, size):
+    """Tamanho aproximado do trailer da gravação clássica"""
+    trailer = {"/Size": size, "/Root": output.root_object.indirect_reference}
+    if output._info is not None:
+        trailer["/Info"] = output._info.indirect_reference
+    estimate = len(b"trailer\n<<\n>>") + sum(len(key) + 12 for key in trailer)
+    if output._ID is not None:
+        estimate += _serialized_size(output._ID) + 5
+    return estimate
+
+
+def write_document(output, stream, write_mode=WRITE_PLAIN, deduplicate=True):
+    """
+    Grava o documento no modo escolhido.
+
+    Args:
+        output (PdfWriter): Documento a gravar.
+        stream: Stream binário de saída.
+        write_mode (str): WRITE_PLAIN, WRITE_COMPRESSED ou WRITE_COMPACT.
+        deduplicate (bool): Remove objetos duplicados (operação cara); pode ser
+                            desligado quando o conteúdo já foi deduplicado.
+
+    Returns:
+        tuple: (bytes gravados, bytes economizados em relação à gravação padrão).
+    """
+    if write_mode not in WRITE_MODES:
+        raise ValueError(f"Modo de gravação inválido: {write_mode}")
+
+    saved = 0
+    if write_mode != WRITE_PLAIN:
+        saved += compress_streams(output)
+        if deduplicate:
+            saved += deduplicate_objects(output)
+
+    if write_mode == WRITE_COMPACT and output._encryption is None:
+        written, plain_size = write_compact(output, stream)
+        return written, saved + max(0, plain_size - written)
+
+    counter = _CountingWriter(stream)
+    output.write(counter)
+    return counter.tell(), saved
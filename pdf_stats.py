@@ -0,0 +1,119 @@
+# pdf_stats.py
+
+import json
+import time
+
+# Etapas medidas na geração de cada documento, na ordem em que ocorrem
+STAGE_TEMPLATE = "template"  # cópia da página do template em cache
+STAGE_OVERLAY = "overlay"    # montagem do content stream com os textos
+STAGE_MERGE = "merge"        # anexação dos textos e recursos à página
+STAGE_WRITE = "write"        # serialização e gravação do PDF
+
+STAGES = (STAGE_TEMPLATE, STAGE_OVERLAY, STAGE_MERGE, STAGE_WRITE)
+
+
+class StageTimer:
+    """
+    Cronômetro de voltas das etapas de um único documento.
+
+    Cada chamada a mark() atribui à etapa informada o tempo decorrido desde
+    a marcação anterior (ou desde a criação do cronômetro).
+    """
+
+    __slots__ = ("durations", "_last")
+
+    def __init__(self):
+        self.durations = {}
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.durations[stage] = self.durations.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def restart(self):
+        """Descarta o tempo decorrido desde a última marcação"""
+        self._last = time.perf_counter()
+
+
+class FillStats:
+    """
+    Agrega os tempos por etapa dos documentos gerados.
+
+    Passada às funções de pdf_filler (parâmetro 'stats'), recebe a duração de
+    cada etapa de cada documento. Sem ela, nenhum tempo é medido. Se
+    'log_path' for informado, cada documento também é registrado como uma
+    linha JSON nesse arquivo.
+
+    Args:
+        log_path (str): Arquivo JSON-lines para o registro por documento (opcional).
+    """
+
+    def __init__(self, log_path=None):
+        self.documents = 0
+        self.samples = {stage: [] for stage in STAGES}
+        self.log_path = log_path
+        self._log = None
+
+    def add(self, durations, key=None, documents=1):
+        """
+        Registra as durações (em segundos) das etapas de um documento.
+
+        Args:
+            durations (dict): Duração de cada etapa, como em StageTimer.durations.
+            key: Identificação do documento no log (nome do arquivo, índice...).
+            documents (int): Documentos contabilizados; 0 para tempos
+                             compartilhados, como a gravação de um PDF único.
+        """
+        self.documents += documents
+        for stage, seconds in durations.items():
+            self.samples.setdefault(stage, []).append(seconds)
+
+        if self.log_path is not None:
+            if self._log is None:
+                self._log = open(self.log_path, "a", encoding="utf-8")
+            entry = {"document": key}
+            entry.update({f"{stage}_ms": round(seconds * 1000, 3)
+                          for stage, seconds in durations.items()})
+            self._log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def total(self, stage=None):
+        """Tempo total, em segundos, de uma etapa ou de todas"""
+        if stage is not None:
+            return sum(self.samples.get(stage, ()))
+        return sum(sum(values) for values in self.samples.values())
+
+    def summary(self):
+        """
+        Resumo dos tempos por etapa.
+
+        Returns:
+            dict: {"documents": n, "stages": {etapa: {"count", "total_ms",
+                  "mean_ms", "p50_ms", "p95_ms", "max_ms"}}}.
+        """
+        stages = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            stages[stage] = {
+                "count": len(ordered),
+                "total_ms": round(sum(ordered) * 1000, 3),
+                "mean_ms": round(sum(ordered) * 1000 / len(ordered), 3),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return {"documents": self.documents, "stages": stages}
+
+    def close(self):
+        """Fecha o arquivo de log, se aberto"""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,149 @@
+# query_executor.py
+
+import inspect
+import queue
+import threading
+
+# Intervalo (ms) entre as verificações de resultados prontos, feitas na
+# thread do Tk enquanto houver consultas pendentes
+POLL_MS = 20
+
+
+class _Superseded(Exception):
+    """Consulta interrompida por ter sido substituída por outra com a mesma chave"""
+
+
+class QueryExecutor:
+    """
+    Executa consultas ao banco (e buscas no índice em memória) em uma thread
+    de trabalho, entregando os resultados na thread do Tk.
+
+    O Tk só pode ser usado pela thread principal: o trabalho roda na thread
+    de trabalho e o resultado volta por uma fila, lida com master.after
+    enquanto houver consultas pendentes. Assim, uma busca lenta ou um banco
+    travado (ex.: em uma pasta de rede) não congela a janela.
+
+    As consultas rodam uma de cada vez, na ordem em que foram pedidas. Cada
+    uma tem uma chave (ex.: a tabela que a pediu); uma consulta nova com a
+    mesma chave substitui a anterior:
+      - se a anterior ainda não começou, ela é descartada;
+      - se é uma busca em etapas (gerador), é interrompida na próxima etapa;
+      - se terminar mesmo assim, o resultado é ignorado.
+
+    Args:
+        master: Widget usado para agendar as verificações (master.after).
+        poll_ms (int): Intervalo entre as verificações.
+    """
+
+    def __init__(self, master, poll_ms=POLL_MS):
+        self.master = master
+        self.poll_ms = poll_ms
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._generations = {}
+        self._active = set()
+        self._pending = 0
+        self._poll_job = None
+        self._thread = threading.Thread(target=self._work, name="QueryExecutor", daemon=True)
+        self._thread.start()
+
+    def submit(self, key, work, on_done, on_error=None):
+        """
+        Agenda uma consulta, substituindo a pendente com a mesma chave.
+
+        Args:
+            key: Identifica a consulta (ex.: o widget que a pediu).
+            work (callable): Função sem argumentos, chamada na thread de
+                             trabalho. Se devolver um gerador (busca em etapas,
+                             ver company_index.run_steps), ele é executado até o
+                             fim e o resultado é o valor devolvido por ele.
+            on_done (callable): Recebe o resultado, na thread do Tk.
+            on_error (callable): Recebe a exceção, na thread do Tk (None =
+                                 report_callback_exception do Tk).
+        """
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        self._active.add(key)
+        self._jobs.put((key, generation, work, on_done, on_error))
+        self._pending += 1
+        if self._poll_job is None:
+            self._poll_job = self.master.after(self.poll_ms, self._poll)
+
+    def cancel(self, key):
+        """Descarta a consulta pendente com a chave informada, se houver"""
+        if key in self._active:
+            self._generations[key] += 1
+            self._active.discard(key)
+
+    def busy(self, key):
+        """Indica se há uma consulta pendente (não descartada) com a chave informada"""
+        return key in self._active
+
+    def close(self):
+        """Encerra a thread de trabalho após a consulta em andamento"""
+        for key in list(self._active):
+            self.cancel(key)
+        self._jobs.put(None)
+        if self._poll_job is not None:
+            self.master.after_cancel(self._poll_job)
+            self._poll_job = None
+
+    def _is_current(self, key, generation):
+        return self._generations.get(key) == generation
+
+    def _work(self):
+        """Laço da thread de trabalho"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            key, generation, work, on_done, on_error = job
+            try:
+                if not self._is_current(key, generation):
+                    raise _Superseded
+                result = work()
+                if inspect.isgenerator(result):
+                    result = self._run_steps(result, key, generation)
+            except _Superseded:
+                self._results.put(None)
+            except Exception as exc:
+                self._results.put((key, generation, on_error, exc, True))
+            else:
+                self._results.put((key, generation, on_done, result, False))
+
+    def _run_steps(self, steps, key, generation):
+        """Executa uma busca em etapas, interrompendo-a se a consulta for substituída"""
+        try:
+            while True:
+                if not self._is_current(key, generation):
+                    raise _Superseded
+                next(steps)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            steps.close()
+
+    def _poll(self):
+        """Entrega, na thread do Tk, os resultados prontos das consultas atuais"""
+        self._poll_job = None
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if item is None:
+                continue
+            key, generation, callback, value, failed = item
+            if not self._is_current(key, generation):
+                continue
+            self._active.discard(key)
+            try:
+                if callback is not None:
+                    callback(value)
+                elif failed:
+                    raise value
+            except Exception as exc:
+                self.master.report_callback_exception(type(exc), exc, exc.__traceback__)
+        if self._pending:
+            self._poll_job = self.master.after(self.poll_ms, self._poll)
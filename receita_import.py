@@ -0,0 +1,387 @@
+# receita_import.py
+#
+# Importa empresas dos dados abertos do CNPJ da Receita Federal (arquivos
+# ESTABELE, EMPRE e MUNIC, em CSV ou dentro dos ZIPs publicados) para a
+# tabela empresas, filtrando por UF e município.
+#
+# Os arquivos são lidos linha a linha e gravados em lotes (executemany, um
+# lote por transação), então a memória usada não depende do tamanho dos
+# arquivos: cresce apenas com a quantidade de empresas selecionadas.
+#
+# Uso: python receita_import.py [--db empresas.db] [--uf PE] [--municipio PAULISTA]
+#                               [--batch-size 50000] arquivos...
+
+import argparse
+import collections
+import csv
+import io
+import itertools
+import os
+import sys
+import time
+import zipfile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from company_repository import CompanyRepository, DEFAULT_DB_PATH
+from migrations import normalize_cnpj, display_cnpj, clean_number, clean_text, municipio_key
+
+# Tipos de arquivo do layout da Receita, identificados pelo nome
+KIND_MUNICIPIOS = "MUNIC"
+KIND_ESTABELECIMENTOS = "ESTABELE"
+KIND_EMPRESAS = "EMPRE"
+
+# Ordem de processamento: os nomes dos municípios e os estabelecimentos
+# precisam estar disponíveis antes das razões sociais
+KIND_ORDER = (KIND_MUNICIPIOS, KIND_ESTABELECIMENTOS, KIND_EMPRESAS)
+
+# Os CSVs da Receita não têm cabeçalho, usam ';' e estão em ISO-8859-1
+CSV_ENCODING = "latin-1"
+CSV_DELIMITER = ";"
+
+DEFAULT_BATCH_SIZE = 50000
+
+# Posições das colunas do arquivo de estabelecimentos (30 colunas)
+EST_CNPJ_BASICO = 0
+EST_CNPJ_ORDEM = 1
+EST_CNPJ_DV = 2
+EST_NOME_FANTASIA = 4
+EST_TIPO_LOGRADOURO = 13
+EST_LOGRADOURO = 14
+EST_NUMERO = 15
+EST_COMPLEMENTO = 16
+EST_BAIRRO = 17
+EST_UF = 19
+EST_MUNICIPIO = 20
+EST_DDD1 = 21
+EST_TELEFONE1 = 22
+EST_DDD2 = 23
+EST_TELEFONE2 = 24
+EST_EMAIL = 27
+
+# Posições das colunas do arquivo de empresas
+EMP_CNPJ_BASICO, EMP_RAZAO_SOCIAL = 0, 1
+
+
+def file_kind(name):
+    """
+    Tipo de um arquivo da Receita pelo nome ("...D40511.ESTABELE",
+    "Estabelecimentos0.zip", "...MUNICCSV").
+
+    Returns:
+        str: Um dos KIND_*, ou None se o nome não for reconhecido.
+    """
+    name = os.path.basename(name).upper()
+    if "ESTABELE" in name:
+        return KIND_ESTABELECIMENTOS
+    if "MUNIC" in name:
+        return KIND_MUNICIPIOS
+    if "EMPRE" in name:
+        return KIND_EMPRESAS
+    return None
+
+
+def collect_sources(paths):
+    """
+    Lista os CSVs a importar, abrindo os ZIPs apenas para ler seus índices.
+
+    Returns:
+        list: Tuplas (tipo, caminho, membro do ZIP ou None), na ordem de KIND_ORDER.
+
+    Raises:
+        ValueError: Se o tipo de algum arquivo não puder ser identificado.
+    """
+    sources = []
+    for path in paths:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for member in archive.namelist():
+                    kind = file_kind(member) or file_kind(path)
+                    if kind is None:
+                        raise ValueError(f"Arquivo não reconhecido: {path}:{member}")
+                    sources.append((kind, path, member))
+        else:
+            kind = file_kind(path)
+            if kind is None:
+                raise ValueError(f"Arquivo não reconhecido: {path}")
+            sources.append((kind, path, None))
+    sources.sort(key=lambda source: KIND_ORDER.index(source[0]))
+    return sources
+
+
+def iter_csv_rows(path, member=None):
+    """Lê as linhas de um CSV da Receita, direto do disco ou de dentro do ZIP"""
+    if member is None:
+        with open(path, encoding=CSV_ENCODING, newline="") as f:
+            yield from csv.reader(f, delimiter=CSV_DELIMITER)
+    else:
+        with zipfile.ZipFile(path) as archive, archive.open(member) as raw:
+            text = io.TextIOWrapper(raw, encoding=CSV_ENCODING, newline="")
+            yield from csv.reader(text, delimiter=CSV_DELIMITER)
+
+
+def batches(iterable, size):
+    """Divide um iterável em listas de até 'size' itens, sem lê-lo inteiro"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def peak_rss_bytes():
+    """Pico de memória residente do processo, em bytes (None se indisponível)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KiB no Linux e em bytes no macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def establishment_values(row, municipio_names):
+    """
+    Converte uma linha do arquivo de estabelecimentos nos valores de
+    CompanyRepository.upsert_companies, com a mesma limpeza da migração 4.
+    """
+    cnpj = row[EST_CNPJ_BASICO] + row[EST_CNPJ_ORDEM] + row[EST_CNPJ_DV]
+    endereco = f"{row[EST_TIPO_LOGRADOURO].strip()} {row[EST_LOGRADOURO].strip()}"
+    return (
+        normalize_cnpj(cnpj),
+        display_cnpj(cnpj),
+        clean_text(row[EST_NOME_FANTASIA]),
+        clean_number(row[EST_DDD1]) + clean_number(row[EST_TELEFONE1]),
+        clean_number(row[EST_DDD2]) + clean_number(row[EST_TELEFONE2]),
+        clean_text(row[EST_EMAIL]).lower(),
+        clean_text(endereco),
+        clean_number(row[EST_NUMERO]),
+        clean_text(row[EST_COMPLEMENTO]),
+        clean_text(row[EST_BAIRRO]),
+        municipio_names.get(row[EST_MUNICIPIO], ""),
+    )
+
+
+class ImportReport:
+    """
+    Contadores de uma importação: linhas lidas, selecionadas e gravadas,
+    vazão e pico de memória.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows_read = 0
+        self.rows_selected = 0
+        self.companies_upserted = 0
+        self.razao_social_updated = 0
+
+    def elapsed(self):
+        """Segundos desde o início da importação"""
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        """
+        Resumo da importação.
+
+        Returns:
+            dict: Contadores, duração, linhas lidas por segundo e pico de
+                  memória residente (bytes, None se indisponível).
+        """
+        elapsed = self.elapsed()
+        return {
+            "rows_read": self.rows_read,
+            "rows_selected": self.rows_selected,
+            "companies_upserted": self.companies_upserted,
+            "razao_social_updated": self.razao_social_updated,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(self.rows_read / elapsed) if elapsed else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+
+class ReceitaImporter:
+    """
+    Importa os arquivos de dados abertos do CNPJ para o repositório.
+
+    Os estabelecimentos das UFs e municípios escolhidos são inseridos ou
+    atualizados pelo CNPJ; em seguida, os arquivos de empresas preenchem a
+    razão social de cada CNPJ básico já cadastrado. Sem filtros, todos os
+    estabelecimentos são importados.
+
+    Args:
+        repository (CompanyRepository): Destino das empresas.
+        ufs (iterable): Siglas das UFs aceitas (vazio = todas).
+        municipios (iterable): Códigos da Receita ou nomes dos municípios
+                               aceitos (vazio = todos); nomes exigem o
+                               arquivo MUNIC entre os arquivos importados.
+        batch_size (int): Linhas gravadas por transação.
+        progress (callable): Chamada como progress(report) após cada lote (opcional).
+    """
+
+    def __init__(self, repository, ufs=(), municipios=(), batch_size=DEFAULT_BATCH_SIZE,
+                 progress=None):
+        self.repository = repository
+        self.ufs = {uf.strip().upper() for uf in ufs}
+        self.municipios = {str(m).strip().upper() for m in municipios}
+        self.batch_size = batch_size
+        self.progress = progress
+        self.report = ImportReport()
+        # Código da Receita -> nome do município (arquivo MUNIC)
+        self.municipio_names = {}
+        self._municipio_codes = None
+        # CNPJs básicos dos estabelecimentos gravados nesta importação: só
+        # eles recebem a razão social dos arquivos EMPRE
+        self._imported_prefixes = set()
+
+    def run(self, paths):
+        """
+        Importa os arquivos informados, em CSV ou ZIP, em qualquer ordem.
+
+        Returns:
+            ImportReport: Contadores da importação.
+
+        Raises:
+            ValueError: Arquivo não reconhecido ou município desconhecido.
+        """
+        for kind, path, member in collect_sources(paths):
+            rows = iter_csv_rows(path, member)
+            if kind == KIND_MUNICIPIOS:
+                self._load_municipios(rows)
+            elif kind == KIND_ESTABELECIMENTOS:
+                self._import_establishments(rows)
+            else:
+                self._import_razao_social(rows)
+        return self.report
+
+    def _load_municipios(self, rows):
+        """
+        Lê a tabela de códigos de município (poucos milhares de linhas).
+
+        Os nomes da Receita vêm em maiúsculas e sem acentos; os municípios
+        já cadastrados mantêm a grafia do banco ("ILHA DE ITAMARACA" ->
+        "Ilha de Itamaracá"), e só os demais entram com o nome do arquivo.
+        """
+        stored = {municipio_key(nome): nome for nome in self.repository.municipio_names()}
+        for row in rows:
+            self.report.rows_read += 1
+            nome = row[1].strip()
+            self.municipio_names[row[0]] = stored.get(municipio_key(nome), nome)
+        self._municipio_codes = None
+
+    def _selected_codes(self):
+        """
+        Códigos dos municípios aceitos, resolvendo os nomes pelo arquivo MUNIC.
+
+        O arquivo MUNIC não tem UF e há nomes repetidos entre estados
+        (PAULISTA em PE e na PB): um nome aceita todos os códigos com ele, e
+        o filtro de UF dos estabelecimentos separa o estado certo.
+        """
+        if self._municipio_codes is None:
+            by_name = collections.defaultdict(set)
+            for code, name in self.municipio_names.items():
+                by_name[municipio_key(name)].add(code)
+            codes = set()
+            for municipio in self.municipios:
+                if municipio.isdigit():
+                    codes.add(municipio)
+                elif municipio_key(municipio) in by_name:
+                    codes.update(by_name[municipio_key(municipio)])
+                else:
+                    raise ValueError(f"Município desconhecido: {municipio} "
+                                     f"(informe o código ou importe também o arquivo MUNIC)")
+            self._municipio_codes = codes
+        return self._municipio_codes
+
+    def _selected_establishments(self, rows):
+        """Filtra as linhas por UF e município antes de qualquer conversão"""
+        codes = self._selected_codes()
+        for row in rows:
+            self.report.rows_read += 1
+            if len(row) <= EST_EMAIL:
+                continue  # linha incompleta
+            if self.ufs and row[EST_UF] not in self.ufs:
+                continue
+            if codes and row[EST_MUNICIPIO] not in codes:
+                continue
+            self.report.rows_selected += 1
+            yield establishment_values(row, self.municipio_names)
+
+    def _import_establishments(self, rows):
+        for batch in batches(self._selected_establishments(rows), self.batch_size):
+            self.report.companies_upserted += self.repository.upsert_companies(batch)
+            self._imported_prefixes.update(row[0][:8] for row in batch if row[0] and len(row[0]) == 14)
+            if self.progress is not None:
+                self.progress(self.report)
+
+    def _import_razao_social(self, rows):
+        """
+        Grava a razão social apenas dos CNPJs básicos dos estabelecimentos
+        importados nesta execução (os arquivos EMPRE vêm depois dos ESTABELE,
+        ver KIND_ORDER); as demais empresas do cadastro, inclusive as de
+        razão social corrigida à mão, não são alteradas.
+        """
+        # O conjunto cresce com as empresas selecionadas, não com o arquivo
+        prefixes = self._imported_prefixes
+
+        def selected():
+            for row in rows:
+                self.report.rows_read += 1
+                if len(row) > EMP_RAZAO_SOCIAL and row[EMP_CNPJ_BASICO] in prefixes:
+                    yield clean_text(row[EMP_RAZAO_SOCIAL]), row[EMP_CNPJ_BASICO]
+
+        for batch in batches(selected(), self.batch_size):
+            self.report.razao_social_updated += self.repository.set_razao_social(batch)
+            if self.progress is not None:
+                self.progress(self.report)
+
+
+def format_bytes(size):
+    """Tamanho em bytes como texto legível (ex.: 48.2 MiB)"""
+    if size is None:
+        return "indisponível"
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Importa empresas dos dados abertos do CNPJ da Receita Federal")
+    parser.add_argument("files", nargs="+", help="arquivos ESTABELE, EMPRE e MUNIC (CSV ou ZIP)")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--uf", action="append", default=[], help="UF aceita (repetível)")
+    parser.add_argument("--municipio", action="append", default=[],
+                        help="código da Receita ou nome do município aceito (repetível)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="linhas gravadas por transação")
+    args = parser.parse_args()
+
+    def progress(report):
+        print(f"\r{report.rows_read:12,d} linhas lidas  {report.rows_selected:10,d} selecionadas  "
+              f"{report.rows_read / report.elapsed():10,.0f} linhas/s", end="", file=sys.stderr)
+
+    repository = CompanyRepository(args.db)
+    try:
+        importer = ReceitaImporter(repository, args.uf, args.municipio, args.batch_size, progress)
+        try:
+            summary = importer.run(args.files).summary()
+        except ValueError as e:
+            parser.error(str(e))
+    finally:
+        repository.close()
+
+    print(file=sys.stderr)
+    print(f"Linhas lidas: {summary['rows_read']:,d} em {summary['elapsed_s']:.1f} s "
+          f"({summary['rows_per_s'] or 0:,d} linhas/s)")
+    print(f"Estabelecimentos selecionados: {summary['rows_selected']:,d} "
+          f"(gravados: {summary['companies_upserted']:,d})")
+    print(f"Razões sociais atualizadas: {summary['razao_social_updated']:,d}")
+    print(f"Pico de memória: {format_bytes(summary['peak_rss_bytes'])}")
+
+
+if __name__ == "__main__":
+    main()
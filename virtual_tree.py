@@ -0,0 +1,427 @@
+# virtual_tree.py
+
+from tkinter import ttk
+
+# Evento gerado pelo VirtualTreeview quando o conjunto de linhas selecionadas muda
+SELECTION_EVENT = "<<VirtualTreeviewSelect>>"
+
+# Linhas roladas por passo da roda do mouse
+WHEEL_UNITS = 3
+
+# Espera (ms) após a última mudança de filtro antes de filtrar: uma
+# sequência de teclas digitadas gera uma única busca
+FILTER_DELAY_MS = 150
+
+# Textos exibidos abaixo da tabela: durante uma releitura e depois dela
+SEARCHING_TEXT = "Pesquisando…"
+COUNT_TEXT = "{} empresas"
+
+
+class VirtualWindow:
+    """
+    Janela de linhas visíveis sobre uma fonte de dados paginada.
+
+    Guarda apenas as linhas exibidas e a posição (offset) da primeira
+    delas na listagem. Rolar uma linha ou uma página lê só as linhas novas,
+    vizinhas da primeira ou da última linha exibida; a fonte as localiza
+    pela posição que cada linha traz, então o custo não depende do tamanho
+    da listagem.
+
+    A fonte de dados (ex.: CompanyPageSource) oferece:
+      - count(): quantidade total de linhas;
+      - page(limit, after=None, before=None, offset=0): linhas em ordem,
+        logo depois da linha 'after', logo antes da linha 'before' ou a
+        partir da posição 'offset'; o id de cada linha é a coluna 0 e a
+        posição dela na listagem, a última.
+
+    Args:
+        source: Fonte de dados paginada.
+        size (int): Quantidade de linhas visíveis.
+    """
+
+    def __init__(self, source, size):
+        self.source = source
+        self.size = max(1, size)
+        self.rows = []
+        self.offset = 0
+        self.total = 0
+
+    def reload(self, keep_position=True):
+        """
+        Relê a janela após mudanças na fonte (filtros ou gravações).
+
+        Args:
+            keep_position (bool): Continuar a partir da primeira linha exibida
+                                  (False = voltar ao início da listagem).
+        """
+        self.total = self.source.count()
+        first = self.rows[0] if keep_position and self.rows else None
+        previous = self.source.page(1, before=first) if first is not None else []
+        if previous:
+            self.rows = self.source.page(self.size, after=previous[0])
+        else:
+            self.rows = self.source.page(self.size)
+            self.offset = 0
+        self._fill_backwards()
+
+    def _fill_backwards(self):
+        """Completa a janela com as linhas anteriores quando ela chega ao fim da listagem"""
+        missing = self.size - len(self.rows)
+        if missing > 0 and self.rows:
+            extra = self.source.page(missing, before=self.rows[0])
+            self.rows = extra + self.rows
+        # A posição é recalculada a partir do fim quando a janela encosta nele
+        if len(self.rows) < self.size:
+            self.offset = 0
+        else:
+            self.offset = min(self.offset, max(0, self.total - len(self.rows)))
+
+    def scroll(self, delta):
+        """
+        Rola a janela 'delta' linhas (negativo = para cima).
+
+        Returns:
+            bool: True se as linhas exibidas mudaram.
+        """
+        if not self.rows or delta == 0:
+            return False
+        if delta > 0:
+            extra = self.source.page(delta, after=self.rows[-1])
+            if not extra:
+                return False
+            combined = self.rows + extra
+            self.rows = combined[-self.size:]
+            self.offset += len(combined) - len(self.rows)
+        else:
+            extra = self.source.page(-delta, before=self.rows[0])
+            if not extra:
+                return False
+            self.rows = (extra + self.rows)[:self.size]
+            self.offset = max(0, self.offset - len(extra))
+        return True
+
+    def moveto(self, fraction):
+        """Posiciona a janela em uma fração (0 a 1) da listagem (barra de rolagem)"""
+        offset = int(float(fraction) * self.total)
+        offset = max(0, min(offset, self.total - self.size))
+        if self.rows and offset == self.offset:
+            return False
+        if self.rows and abs(offset - self.offset) <= self.size:
+            # Deslocamentos curtos: rolar a partir das linhas exibidas
+            return self.scroll(offset - self.offset)
+        self.rows = self.source.page(self.size, offset=offset)
+        self.offset = offset
+        return True
+
+    def resize(self, size):
+        """
+        Ajusta a quantidade de linhas visíveis (ex.: a janela foi redimensionada).
+
+        Returns:
+            bool: True se as linhas exibidas mudaram.
+        """
+        size = max(1, size)
+        if size == self.size:
+            return False
+        self.size = size
+        if len(self.rows) > size:
+            self.rows = self.rows[:size]
+        elif self.rows:
+            self.rows += self.source.page(size - len(self.rows), after=self.rows[-1])
+            self._fill_backwards()
+        return True
+
+    def fractions(self):
+        """Posição da janela para a barra de rolagem: (início, fim), entre 0 e 1"""
+        if not self.total:
+            return 0.0, 1.0
+        first = self.offset / self.total
+        last = min(1.0, (self.offset + len(self.rows)) / self.total)
+        return first, last
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    Tabela (ttk.Treeview) que exibe apenas as linhas visíveis de uma
+    listagem possivelmente muito grande, lidas sob demanda da fonte de dados.
+
+    O Treeview interno contém só as linhas da janela (ver VirtualWindow);
+    a barra de rolagem vertical, a roda do mouse e as setas do teclado
+    movem a janela. As linhas selecionadas são guardadas pelo id (coluna 0
+    das linhas da fonte), de modo que a seleção se mantém ao rolar; a
+    mudança da seleção gera o evento SELECTION_EVENT.
+
+    Além de count() e page() (ver VirtualWindow), a fonte oferece
+    reload_steps() (a releitura em etapas: um gerador que devolve a nova
+    listagem, com count() e page()), apply(listagem), ids() e rows_by_ids(ids).
+
+    As releituras rodam no QueryExecutor, fora da thread do Tk, junto com a
+    leitura das linhas da nova janela; só o redesenho é feito na thread do
+    Tk. Enquanto isso, a tabela continua mostrando a listagem anterior, com
+    o aviso SEARCHING_TEXT abaixo dela, e uma releitura mais nova descarta a
+    que estiver em andamento.
+
+    Args:
+        master: Widget pai.
+        source: Fonte de dados paginada (ex.: CompanyPageSource).
+        columns (tuple): Nomes das colunas exibidas (colunas 1.. das linhas).
+        executor (QueryExecutor): Executa as releituras em segundo plano.
+        height (int): Quantidade inicial de linhas visíveis.
+        selectmode (str): "browse" (uma linha) ou "extended" (várias).
+        on_error (callable): Recebe a exceção de uma releitura que falhou
+                             (None = report_callback_exception do Tk).
+    """
+
+    def __init__(self, master, source, columns, executor, height=10, selectmode="browse",
+                 on_error=None):
+        super().__init__(master)
+        self.source = source
+        self.columns = tuple(columns)
+        self.executor = executor
+        self.selectmode = selectmode
+        self.on_error = on_error
+        self.window = VirtualWindow(source, height)
+        self.selected = set()
+        self._pending_moveto = None
+        self._filter_job = None
+        self._reset_pending = False
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings", height=height,
+                                 selectmode=selectmode)
+        self.v_scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.h_scrollbar = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.h_scrollbar.set)
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.v_scrollbar.grid(row=0, column=1, sticky="ns")
+        self.h_scrollbar.grid(row=1, column=0, sticky="ew")
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.grid(row=2, column=0, columnspan=2, sticky="w")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self._scroll(-WHEEL_UNITS))
+        self.tree.bind("<Button-5>", lambda event: self._scroll(WHEEL_UNITS))
+        for key, delta in (("<Up>", -1), ("<Down>", 1)):
+            self.tree.bind(key, lambda event, delta=delta: self._move_focus(delta))
+        self.tree.bind("<Prior>", lambda event: self._move_focus(-self.window.size))
+        self.tree.bind("<Next>", lambda event: self._move_focus(self.window.size))
+        self.tree.bind("<Home>", lambda event: self._jump(0.0))
+        self.tree.bind("<End>", lambda event: self._jump(1.0))
+
+    # Configuração do Treeview interno
+
+    def heading(self, column, **kw):
+        """Configura o cabeçalho de uma coluna (como ttk.Treeview.heading)"""
+        return self.tree.heading(column, **kw)
+
+    def column(self, column, **kw):
+        """Configura uma coluna (como ttk.Treeview.column)"""
+        return self.tree.column(column, **kw)
+
+    # Dados
+
+    def refresh(self, reset=False):
+        """
+        Relê a fonte em segundo plano e redesenha as linhas visíveis.
+
+        Args:
+            reset (bool): Voltar ao início da listagem e limpar a seleção
+                          (ex.: os filtros mudaram).
+        """
+        self._cancel_filter()
+        self._start_filter(reset)
+
+    def refresh_later(self, delay=FILTER_DELAY_MS):
+        """
+        Agenda a releitura após uma mudança de filtro (ex.: tecla digitada),
+        voltando ao início da listagem.
+
+        Mudanças seguidas com menos de 'delay' ms entre si geram uma única
+        releitura, e uma releitura em andamento é abandonada quando outra é
+        agendada.
+        """
+        self._cancel_filter()
+        self._reset_pending = True
+        self._set_searching(True)
+        self._filter_job = self.after(delay, self._start_filter, True)
+
+    def _cancel_filter(self):
+        """Cancela a releitura agendada ou em andamento"""
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+            self._filter_job = None
+        self.executor.cancel(self)
+
+    def _start_filter(self, reset):
+        """Envia a releitura ao executor, com uma cópia da janela atual"""
+        self._filter_job = None
+        # Um reset pedido por uma releitura abandonada continua valendo
+        self._reset_pending = self._reset_pending or reset
+        keep_position = not self._reset_pending
+        window = VirtualWindow(None, self.window.size)
+        window.rows, window.offset = list(self.window.rows), self.window.offset
+        source = self.source
+
+        def work():
+            # Thread de trabalho: filtra e lê as linhas da nova janela
+            listing = yield from source.reload_steps()
+            window.source = listing
+            window.reload(keep_position)
+            return listing, window
+
+        self._set_searching(True)
+        self.executor.submit(self, work, self._show_reloaded, self._on_reload_error)
+
+    def _show_reloaded(self, result):
+        """Exibe a listagem relida (thread do Tk)"""
+        listing, window = result
+        reset, self._reset_pending = self._reset_pending, False
+        self.source.apply(listing)
+        size = self.window.size
+        window.source = self.source
+        self.window = window
+        # A tabela pode ter sido redimensionada durante a releitura
+        self.window.resize(size)
+        if reset and self.selected:
+            self.selected.clear()
+            self.event_generate(SELECTION_EVENT)
+        self._render()
+        self._set_searching(False)
+
+    def _on_reload_error(self, exc):
+        self._reset_pending = False
+        self._set_searching(False)
+        if self.on_error is None:
+            raise exc
+        self.on_error(exc)
+
+    def _set_searching(self, searching):
+        """Mostra o aviso de releitura em andamento, ou a quantidade de linhas"""
+        if searching:
+            self.status_label.configure(text=SEARCHING_TEXT)
+            self.tree.configure(cursor="watch")
+        else:
+            self.status_label.configure(text=COUNT_TEXT.format(self.window.total))
+            self.tree.configure(cursor="")
+
+    def _render(self):
+        """Substitui as linhas do Treeview pelas da janela, mantendo a seleção"""
+        self.tree.delete(*self.tree.get_children())
+        visible_selected = []
+        for row in self.window.rows:
+            iid = str(row[0])
+            self.tree.insert("", "end", iid=iid, values=row[1:1 + len(self.columns)])
+            if row[0] in self.selected:
+                visible_selected.append(iid)
+        self.tree.selection_set(visible_selected)
+        self.v_scrollbar.set(*self.window.fractions())
+
+    # Seleção
+
+    def _on_tree_select(self, event):
+        """Atualiza a seleção (por id) com o que está selecionado nas linhas visíveis"""
+        current = {int(iid) for iid in self.tree.selection()}
+        if self.selectmode == "browse":
+            # Uma linha só: a clicada substitui a que pode estar fora da janela
+            selected = current or (self.selected - self._visible_ids())
+        else:
+            selected = (self.selected - self._visible_ids()) | current
+        if selected != self.selected:
+            self.selected = selected
+            self.event_generate(SELECTION_EVENT)
+
+    def _visible_ids(self):
+        return {row[0] for row in self.window.rows}
+
+    def select_all(self):
+        """Seleciona todas as linhas da listagem, inclusive as não exibidas"""
+        self.selected = set(self.source.ids())
+        self._render()
+        self.event_generate(SELECTION_EVENT)
+
+    def clear_selection(self):
+        """Desmarca todas as linhas"""
+        self.selected.clear()
+        self._render()
+        self.event_generate(SELECTION_EVENT)
+
+    def selected_rows(self):
+        """Linhas selecionadas, lidas da fonte na ordem da listagem"""
+        return self.source.rows_by_ids(self.selected)
+
+    # Rolagem
+
+    def _scroll(self, delta):
+        if self.window.scroll(delta):
+            self._render()
+        return "break"
+
+    def _jump(self, fraction):
+        if self.window.moveto(fraction):
+            self._render()
+        rows = self.window.rows
+        if rows:
+            self._focus_row(rows[0] if fraction == 0.0 else rows[-1])
+        return "break"
+
+    def _on_scrollbar(self, action, value, unit=None):
+        """Comando da barra de rolagem: ('moveto', fração) ou ('scroll', n, 'units'/'pages')"""
+        if action == "moveto":
+            # Arrastar a barra gera muitos eventos: só a última posição é lida
+            if self._pending_moveto is None:
+                self.after_idle(self._apply_moveto)
+            self._pending_moveto = value
+        elif action == "scroll":
+            step = self.window.size if unit == "pages" else 1
+            self._scroll(int(value) * step)
+
+    def _apply_moveto(self):
+        fraction, self._pending_moveto = self._pending_moveto, None
+        if fraction is not None and self.window.moveto(fraction):
+            self._render()
+
+    def _on_mousewheel(self, event):
+        # Windows: múltiplos de 120 por passo; macOS: valores pequenos
+        steps = event.delta // 120 if abs(event.delta) >= 120 else (1 if event.delta > 0 else -1)
+        return self._scroll(-steps * WHEEL_UNITS)
+
+    def _move_focus(self, delta):
+        """Move o foco (e, em modo browse, a seleção) rolando a janela nas bordas"""
+        rows = self.window.rows
+        if not rows:
+            return "break"
+        focus = self.tree.focus()
+        ids = [str(row[0]) for row in rows]
+        index = ids.index(focus) if focus in ids else 0
+        target = index + delta
+        if target < 0 or target >= len(rows):
+            beyond = target - (len(rows) - 1) if target >= len(rows) else target
+            if self.window.scroll(beyond):
+                self._render()
+            target = max(0, min(target, len(self.window.rows) - 1))
+        self._focus_row(self.window.rows[target])
+        return "break"
+
+    def _focus_row(self, row):
+        iid = str(row[0])
+        self.tree.focus(iid)
+        self.tree.see(iid)
+        if self.selectmode == "browse":
+            self.tree.selection_set(iid)
+
+    def _on_configure(self, event):
+        """Recalcula quantas linhas cabem na altura atual do Treeview"""
+        children = self.tree.get_children()
+        if not children:
+            return
+        bbox = self.tree.bbox(children[0])
+        if not bbox:
+            return
+        _, y, _, row_height = bbox
+        size = max(1, (event.height - y) // max(1, row_height))
+        if self.window.resize(size):
+            self._render()